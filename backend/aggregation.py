@@ -0,0 +1,409 @@
+"""
+Single-pass aggregation engine
+Composable aggregators that either fold a row stream from DatabaseService in one
+pass (Python mode) or compile to SQL aggregates (SQL mode), e.g.
+
+    plan = AggregationPlan(
+        Count('total'),
+        CountIf('completed', In('status', ['completed', 'FINALIZED'])),
+        Distinct('unique_users', 'user_id'),
+        GroupBy('daily', 'audit_datetime', [Count('orders')], bucket='day'),
+    )
+    results = db.aggregate(plan, start_date='2024-01-01')
+"""
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+BUCKETS = ('hour', 'day', 'week', 'month')
+
+
+def parse_datetime(value) -> Optional[datetime]:
+    """
+    Parse an audit timestamp that may be a datetime or an ISO / 'YYYY-MM-DD HH:MM:SS'
+    string. Like CAST(... AS TIMESTAMP), the wall-clock time is kept and any zone dropped.
+    """
+    if value is None:
+        return None
+    if not isinstance(value, datetime):
+        try:
+            value = str(value)
+            if 'T' in value:
+                value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+            else:
+                value = datetime.strptime(value, '%Y-%m-%d %H:%M:%S')
+        except ValueError:
+            return None
+    return value.replace(tzinfo=None)
+
+
+def truncate_datetime(value: datetime, bucket: str) -> datetime:
+    """Python equivalent of date_trunc(bucket, value)"""
+    if bucket == 'hour':
+        return value.replace(minute=0, second=0, microsecond=0)
+    day = value.replace(hour=0, minute=0, second=0, microsecond=0)
+    if bucket == 'day':
+        return day
+    if bucket == 'week':
+        return datetime.fromordinal(day.toordinal() - day.weekday())
+    return day.replace(day=1)
+
+
+def to_float(value) -> Optional[float]:
+    if value is None or value == '':
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+# Conditions: row predicates with an equivalent SQL expression
+
+class Condition:
+    columns: Tuple[str, ...] = ()
+
+    def matches(self, row: Dict) -> bool:
+        raise NotImplementedError
+
+    def sql(self) -> Tuple[str, List]:
+        raise NotImplementedError
+
+
+class In(Condition):
+    """column is one of values"""
+
+    def __init__(self, column: str, values: Sequence):
+        self.columns = (column,)
+        self.column = column
+        self.values = list(values)
+
+    def matches(self, row: Dict) -> bool:
+        return row.get(self.column) in self.values
+
+    def sql(self) -> Tuple[str, List]:
+        placeholders = ', '.join(['%s'] * len(self.values))
+        return f"{self.column} IN ({placeholders})", list(self.values)
+
+
+class Contains(Condition):
+    """column contains text, case-insensitively"""
+
+    def __init__(self, column: str, text: str):
+        self.columns = (column,)
+        self.column = column
+        self.text = text.lower()
+
+    def matches(self, row: Dict) -> bool:
+        return self.text in str(row.get(self.column) or '').lower()
+
+    def sql(self) -> Tuple[str, List]:
+        return f"LOWER(CAST({self.column} AS TEXT)) LIKE %s", [f"%{self.text}%"]
+
+
+class NotEmpty(Condition):
+    """column is neither NULL nor an empty string"""
+
+    def __init__(self, column: str):
+        self.columns = (column,)
+        self.column = column
+
+    def matches(self, row: Dict) -> bool:
+        return row.get(self.column) not in (None, '')
+
+    def sql(self) -> Tuple[str, List]:
+        return f"NULLIF(CAST({self.column} AS TEXT), '') IS NOT NULL", []
+
+
+# Scalar aggregators: one value per group
+
+class Aggregator:
+    columns: Tuple[str, ...] = ()
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def new_state(self):
+        return None
+
+    def add(self, state, row: Dict):
+        """Fold one row into state and return the new state"""
+        raise NotImplementedError
+
+    def result(self, state):
+        return state
+
+    def sql(self) -> Tuple[str, List]:
+        """SQL aggregate expression and its parameters"""
+        raise NotImplementedError
+
+    def from_sql(self, value):
+        return value
+
+
+class Count(Aggregator):
+    def new_state(self):
+        return 0
+
+    def add(self, state, row):
+        return state + 1
+
+    def sql(self):
+        return "COUNT(*)", []
+
+    def from_sql(self, value):
+        return value or 0
+
+
+class CountIf(Aggregator):
+    def __init__(self, name: str, condition: Condition):
+        super().__init__(name)
+        self.condition = condition
+        self.columns = condition.columns
+
+    def new_state(self):
+        return 0
+
+    def add(self, state, row):
+        return state + 1 if self.condition.matches(row) else state
+
+    def sql(self):
+        expression, params = self.condition.sql()
+        return f"COUNT(*) FILTER (WHERE {expression})", params
+
+    def from_sql(self, value):
+        return value or 0
+
+
+class Distinct(Aggregator):
+    """Number of distinct non-NULL values; with bucket, distinct date_trunc buckets"""
+
+    def __init__(self, name: str, column: str, bucket: Optional[str] = None):
+        super().__init__(name)
+        self.column = column
+        self.bucket = bucket
+        self.columns = (column,)
+
+    def new_state(self):
+        return set()
+
+    def add(self, state, row):
+        value = row.get(self.column)
+        if self.bucket and value is not None:
+            value = parse_datetime(value)
+            value = truncate_datetime(value, self.bucket) if value else None
+        if value not in (None, ''):
+            state.add(value)
+        return state
+
+    def result(self, state):
+        return len(state)
+
+    def sql(self):
+        if self.bucket:
+            return f"COUNT(DISTINCT date_trunc('{self.bucket}', CAST({self.column} AS TIMESTAMP)))", []
+        return f"COUNT(DISTINCT NULLIF(CAST({self.column} AS TEXT), ''))", []
+
+    def from_sql(self, value):
+        return value or 0
+
+
+class Sum(Aggregator):
+    def __init__(self, name: str, column: str):
+        super().__init__(name)
+        self.column = column
+        self.columns = (column,)
+
+    def new_state(self):
+        return 0.0
+
+    def add(self, state, row):
+        value = to_float(row.get(self.column))
+        return state + value if value is not None else state
+
+    def sql(self):
+        return f"COALESCE(SUM(CAST({self.column} AS FLOAT)), 0)", []
+
+    def from_sql(self, value):
+        return float(value or 0.0)
+
+
+class Max(Aggregator):
+    def __init__(self, name: str, column: str):
+        super().__init__(name)
+        self.column = column
+        self.columns = (column,)
+
+    def add(self, state, row):
+        value = row.get(self.column)
+        if value is None:
+            return state
+        return value if state is None or value > state else state
+
+    def sql(self):
+        return f"MAX({self.column})", []
+
+
+# Grouping aggregators: a list of {key, <aggregator results>} rows
+
+class GroupBy:
+    """
+    Group rows by a column (or a date_trunc bucket of a timestamp column) and run
+    the given scalar aggregators per group. Groups are sorted by key unless
+    order_by names an aggregator to sort by descending; limit keeps the first N.
+    """
+
+    def __init__(self, name: str, column: str, aggregators: List[Aggregator],
+                 bucket: Optional[str] = None, order_by: Optional[str] = None,
+                 limit: Optional[int] = None, skip_empty: bool = True):
+        if bucket is not None and bucket not in BUCKETS:
+            raise ValueError(f"Unknown time bucket: {bucket}")
+        self.name = name
+        self.column = column
+        self.aggregators = aggregators
+        self.bucket = bucket
+        self.order_by = order_by
+        self.limit = limit
+        self.skip_empty = skip_empty
+        self.columns = (column,) + tuple(c for agg in aggregators for c in agg.columns)
+
+    def new_state(self):
+        return {}
+
+    def key(self, row: Dict):
+        value = row.get(self.column)
+        if self.bucket and value is not None:
+            value = parse_datetime(value)
+            return truncate_datetime(value, self.bucket) if value else None
+        return value
+
+    def add(self, state, row):
+        key = self.key(row)
+        if self.skip_empty and key in (None, ''):
+            return state
+        group = state.get(key)
+        if group is None:
+            group = state[key] = [agg.new_state() for agg in self.aggregators]
+        for i, agg in enumerate(self.aggregators):
+            group[i] = agg.add(group[i], row)
+        return state
+
+    def _finish(self, groups: List[Dict]) -> List[Dict]:
+        if self.order_by:
+            groups.sort(key=lambda g: (-(g[self.order_by] or 0), str(g['key'])))
+        else:
+            groups.sort(key=lambda g: (g['key'] is None, g['key']))
+        return groups[:self.limit] if self.limit else groups
+
+    def result(self, state):
+        groups = []
+        for key, values in state.items():
+            group = {'key': key}
+            for agg, value in zip(self.aggregators, values):
+                group[agg.name] = agg.result(value)
+            groups.append(group)
+        return self._finish(groups)
+
+    def key_sql(self) -> str:
+        if self.bucket:
+            return f"date_trunc('{self.bucket}', CAST({self.column} AS TIMESTAMP))"
+        return self.column
+
+    def compile(self, table: str, where: str, params: List) -> Tuple[str, List]:
+        select = [f"{self.key_sql()} as key"]
+        select_params: List = []
+        for agg in self.aggregators:
+            expression, agg_params = agg.sql()
+            select.append(f"{expression} as {agg.name}")
+            select_params.extend(agg_params)
+        where_sql = where
+        if self.skip_empty:
+            where_sql += f" AND NULLIF(CAST({self.column} AS TEXT), '') IS NOT NULL"
+        query = f"SELECT {', '.join(select)} FROM {table}{where_sql} GROUP BY 1"
+        return query, select_params + list(params)
+
+    def from_sql(self, rows: List[Dict]) -> List[Dict]:
+        groups = []
+        for row in rows:
+            group = {'key': row['key']}
+            for agg in self.aggregators:
+                group[agg.name] = agg.from_sql(row[agg.name])
+            groups.append(group)
+        return self._finish(groups)
+
+
+class TopK(GroupBy):
+    """The k groups with the largest value of the order_by aggregator"""
+
+    def __init__(self, name: str, column: str, aggregators: List[Aggregator],
+                 order_by: str, k: int):
+        super().__init__(name, column, aggregators, order_by=order_by, limit=k)
+
+    def compile(self, table: str, where: str, params: List) -> Tuple[str, List]:
+        query, query_params = super().compile(table, where, params)
+        query += f" ORDER BY {self.order_by} DESC, key LIMIT %s"
+        return query, query_params + [self.limit]
+
+
+class AggregationPlan:
+    """A set of aggregators evaluated together over the same filtered rows"""
+
+    def __init__(self, *aggregators):
+        names = [agg.name for agg in aggregators]
+        if len(names) != len(set(names)):
+            raise ValueError("Aggregator names must be unique within a plan")
+        self.aggregators = list(aggregators)
+
+    @property
+    def scalars(self) -> List[Aggregator]:
+        return [agg for agg in self.aggregators if isinstance(agg, Aggregator)]
+
+    @property
+    def groupings(self) -> List[GroupBy]:
+        return [agg for agg in self.aggregators if isinstance(agg, GroupBy)]
+
+    def columns(self) -> List[str]:
+        """Columns the Python mode needs from the row stream"""
+        return list(dict.fromkeys(c for agg in self.aggregators for c in agg.columns))
+
+    def run(self, rows: Iterable[Dict]) -> Dict[str, Any]:
+        """Feed every row to every aggregator in a single pass"""
+        states = [agg.new_state() for agg in self.aggregators]
+        pairs = list(enumerate(self.aggregators))
+        for row in rows:
+            for i, agg in pairs:
+                states[i] = agg.add(states[i], row)
+        return {agg.name: agg.result(state) for agg, state in zip(self.aggregators, states)}
+
+    def compile(self, table: str, where: str, params: List) -> List[Tuple[Any, str, List]]:
+        """
+        Compile to SQL: all scalar aggregators share one SELECT and each grouping
+        aggregator gets its own GROUP BY query. Returns (target, query, params) tuples
+        where target is None for the scalar query.
+        """
+        queries = []
+        if self.scalars:
+            select = []
+            select_params: List = []
+            for agg in self.scalars:
+                expression, agg_params = agg.sql()
+                select.append(f"{expression} as {agg.name}")
+                select_params.extend(agg_params)
+            queries.append((None, f"SELECT {', '.join(select)} FROM {table}{where}",
+                            select_params + list(params)))
+        for grouping in self.groupings:
+            query, query_params = grouping.compile(table, where, params)
+            queries.append((grouping, query, query_params))
+        return queries
+
+    def from_sql(self, fetch_one: Callable, fetch_all: Callable,
+                 queries: List[Tuple[Any, str, List]]) -> Dict[str, Any]:
+        """Run compiled queries with the given fetch functions and decode the results"""
+        results: Dict[str, Any] = {}
+        for target, query, params in queries:
+            if target is None:
+                row = fetch_one(query, params) or {}
+                for agg in self.scalars:
+                    results[agg.name] = agg.from_sql(row.get(agg.name))
+            else:
+                results[target.name] = target.from_sql(fetch_all(query, params))
+        return {agg.name: results[agg.name] for agg in self.aggregators}
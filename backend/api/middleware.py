@@ -0,0 +1,210 @@
+"""
+HTTP middleware for the API routes
+"""
+import asyncio
+import hashlib
+import time
+import zlib
+from datetime import date
+from typing import Any, Awaitable, Callable, Iterable, Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.middleware.base import BaseHTTPMiddleware
+
+try:
+    import brotli
+except ImportError:  # optional dependency: gzip only
+    brotli = None
+
+from result_cache import track_request
+
+
+class ETagMiddleware(BaseHTTPMiddleware):
+    """
+    Conditional GETs for data-backed endpoints.
+    The ETag hashes the path, the sorted query string, the current date (handlers
+    default to date windows ending today) and a data watermark that moves whenever
+    a load lands. A matching If-None-Match is answered with 304 before the route -
+    and therefore any database query - runs. When the routes sit behind a result
+    cache, the watermark should be that cache's version so a tag never moves ahead
+    of the cached bodies. It is looked up at most once per refresh_interval seconds
+    (0: every request). Error fallbacks (skip_cache()) and responses with their own
+    Cache-Control get no ETag.
+    """
+
+    def __init__(self, app, watermark_source: Callable[[], Awaitable[Any]],
+                 prefixes: Iterable[str] = ("/api/",), exclude: Iterable[str] = (),
+                 refresh_interval: float = 15.0):
+        super().__init__(app)
+        self.watermark_source = watermark_source
+        self.prefixes = tuple(prefixes)
+        self.exclude = set(exclude)
+        self.refresh_interval = refresh_interval
+        self._watermark: Optional[str] = None
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+        self.stats = {"checked": 0, "not_modified": 0}
+
+    async def watermark(self) -> Optional[str]:
+        if time.monotonic() - self._checked_at < self.refresh_interval:
+            return self._watermark
+        async with self._lock:
+            if time.monotonic() - self._checked_at >= self.refresh_interval:
+                try:
+                    watermark = await self.watermark_source()
+                    self._watermark = str(watermark) if watermark is not None else None
+                except Exception as e:
+                    print(f"Error reading data watermark: {e}")
+                    self._watermark = None
+                self._checked_at = time.monotonic()
+        return self._watermark
+
+    def applies(self, request: Request) -> bool:
+        path = request.url.path
+        return (request.method in ("GET", "HEAD") and path.startswith(self.prefixes)
+                and path not in self.exclude)
+
+    @staticmethod
+    def compute_etag(request: Request, watermark: str) -> str:
+        query = "&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items()))
+        digest = hashlib.sha1(
+            f"{request.url.path}?{query}|{date.today().isoformat()}|{watermark}".encode()
+        ).hexdigest()
+        return f'W/"{digest}"'
+
+    async def dispatch(self, request: Request, call_next):
+        if not self.applies(request):
+            return await call_next(request)
+
+        watermark = await self.watermark()
+        if watermark is None:
+            # Without a watermark there is no safe validator
+            return await call_next(request)
+
+        etag = self.compute_etag(request, watermark)
+        self.stats["checked"] += 1
+        if_none_match = request.headers.get("if-none-match", "")
+        if etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*":
+            self.stats["not_modified"] += 1
+            return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "private, no-cache"})
+
+        marker = track_request()
+        response = await call_next(request)
+        # Responses that set their own Cache-Control (e.g. streams) are left alone
+        if (response.status_code == 200 and not marker["degraded"]
+                and "cache-control" not in response.headers):
+            response.headers["ETag"] = etag
+            response.headers["Cache-Control"] = "private, no-cache"
+        return response
+
+
+class CompressionMiddleware:
+    """
+    Negotiated response compression: brotli when the client accepts it and the
+    optional brotli package is installed, otherwise gzip. Bodies smaller than
+    minimum_size are sent as-is, and streamed bodies are compressed chunk by chunk
+    (flushed after each chunk so clients can consume rows as they arrive).
+    Already-compressed media types (Parquet) are passed through.
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4,
+                 excluded_media_types: Iterable[str] = ("application/vnd.apache.parquet",)):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.excluded_media_types = tuple(excluded_media_types)
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def negotiate(self, accept_encoding: str) -> Optional[str]:
+        accepted = {}
+        for part in accept_encoding.split(","):
+            name, _, params = part.strip().partition(";")
+            quality = 1.0
+            params = params.strip()
+            if params.startswith("q="):
+                try:
+                    quality = float(params[2:])
+                except ValueError:
+                    quality = 0.0
+            if name:
+                accepted[name.strip().lower()] = quality
+        if brotli is not None and accepted.get("br", 0) > 0:
+            return "br"
+        if accepted.get("gzip", 0) > 0:
+            return "gzip"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = self.negotiate(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await _CompressionResponder(self, encoding, send)(scope, receive)
+
+
+class _CompressionResponder:
+    def __init__(self, options: CompressionMiddleware, encoding: str, send):
+        self.options = options
+        self.encoding = encoding
+        self.send = send
+        self.start_message = None
+        self.compressor = None
+        self.passthrough = False
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        if self.encoding == "br":
+            out = self.compressor.process(data)
+            return out + (self.compressor.finish() if final else self.compressor.flush())
+        out = self.compressor.compress(data)
+        return out + self.compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+    async def __call__(self, scope, receive):
+        await self.options.app(scope, receive, self.wrapped_send)
+
+    async def wrapped_send(self, message):
+        if message["type"] == "http.response.start":
+            # Hold the headers until the first body chunk shows whether to compress
+            self.start_message = message
+            return
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.start_message is not None:
+            start, self.start_message = self.start_message, None
+            headers = MutableHeaders(raw=start["headers"])
+            if ("content-encoding" in headers or start["status"] in (204, 304)
+                    or headers.get("content-type", "").startswith(self.options.excluded_media_types)
+                    or (not more_body and len(body) < self.options.minimum_size)):
+                self.passthrough = True
+                await self.send(start)
+                await self.send(message)
+                return
+
+            if self.encoding == "br":
+                self.compressor = brotli.Compressor(quality=self.options.brotli_quality)
+            else:
+                self.compressor = zlib.compressobj(self.options.gzip_level, zlib.DEFLATED, 31)
+            body = self.compress(body, final=not more_body)
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            if more_body:
+                if "content-length" in headers:
+                    del headers["content-length"]
+            else:
+                headers["Content-Length"] = str(len(body))
+            await self.send(start)
+            await self.send({"type": "http.response.body", "body": body, "more_body": more_body})
+            return
+
+        await self.send({"type": "http.response.body",
+                         "body": self.compress(body, final=not more_body),
+                         "more_body": more_body})
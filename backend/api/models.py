@@ -107,3 +107,10 @@ class UnsignedNoteItem(BaseModel):
     createdDate: str
     daysPending: int
 
+class DashboardBundle(BaseModel):
+    metrics: List[Metric]
+    topUsers: List[TopUser]
+    activeUsers: ActiveUsersData
+    staffSpeaking: StaffSpeakingData
+    times: List[TimesData]
+    consents: ConsentsData
@@ -0,0 +1,260 @@
+"""
+Response classes for large payloads
+FastJSONResponse encodes rows straight from the database (RealDictRow values
+including datetime / date / Decimal / UUID) in one pass, with orjson when it is
+installed and the standard library otherwise, bypassing jsonable_encoder.
+Return it directly from a route so FastAPI does not re-encode the content.
+ndjson_response streams rows as newline-delimited JSON in constant memory, and
+columnar_response streams Arrow IPC or Parquet record batches (optional pyarrow).
+"""
+import json
+import os
+import uuid
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from fastapi.responses import JSONResponse, StreamingResponse
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional dependency: format=arrow / parquet unavailable
+    pa = None
+    pq = None
+
+
+def encode_default(value: Any):
+    """Encode the non-JSON types psycopg2 returns the way jsonable_encoder does"""
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        # Whole numbers stay integers, like FastAPI's decimal encoder
+        return int(value) if value.as_tuple().exponent >= 0 else float(value)
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, (bytes, memoryview)):
+        return bytes(value).decode('utf-8', errors='replace')
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """Serialize content to compact UTF-8 JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(content, default=encode_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(
+        content, default=encode_default, ensure_ascii=False, separators=(',', ':')
+    ).encode('utf-8')
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def unavailable_response(content: Any, status_code: int = 503) -> FastJSONResponse:
+    """
+    Serve a handler's error fallback body with an error status. Together with
+    skip_cache() this keeps the fallback out of the result cache and, since it is
+    not a 200, the ETag middleware does not let clients revalidate it.
+    """
+    return FastJSONResponse(content, status_code=status_code, headers={"Cache-Control": "no-store"})
+
+
+def iter_ndjson(rows: Iterable[Dict], chunk_size: int) -> Iterator[bytes]:
+    """
+    Encode rows one per line, yielding chunks of about chunk_size bytes, then a
+    trailer line {"_trailer": {"count": n, "complete": bool}} so clients can tell a
+    complete stream from a truncated one (an error is reported in the trailer).
+    """
+    buffer = []
+    buffered = 0
+    count = 0
+    trailer = {"count": 0, "complete": False}
+    try:
+        for row in rows:
+            line = dumps(row) + b"\n"
+            buffer.append(line)
+            buffered += len(line)
+            count += 1
+            if buffered >= chunk_size:
+                yield b"".join(buffer)
+                buffer = []
+                buffered = 0
+        trailer["complete"] = True
+    except Exception as e:
+        print(f"Error streaming rows: {e}")
+        trailer["error"] = str(e)
+    finally:
+        # Return the pooled connection even when the client disconnects mid-stream
+        close = getattr(rows, "close", None)
+        if close is not None:
+            close()
+    trailer["count"] = count
+    buffer.append(dumps({"_trailer": trailer}) + b"\n")
+    yield b"".join(buffer)
+
+
+def ndjson_response(rows: Iterable[Dict], chunk_size: Optional[int] = None) -> StreamingResponse:
+    """
+    Stream rows (e.g. DatabaseService.iter_all_data) as application/x-ndjson.
+    The sync iterator is consumed on Starlette's thread pool, so the event loop
+    never blocks on the server-side cursor. Streams are not given an ETag.
+    """
+    chunk_size = chunk_size or int(os.getenv('NDJSON_CHUNK_SIZE', '65536'))
+    return StreamingResponse(
+        iter_ndjson(rows, chunk_size),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-store"}
+    )
+
+
+COLUMNAR_MEDIA_TYPES = {
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def _arrow_type(type_code: int):
+    """Arrow type and value converter for a PostgreSQL type OID (pg_type.oid)"""
+    if type_code == 16:
+        return pa.bool_(), None
+    if type_code == 21:
+        return pa.int16(), None
+    if type_code == 23:
+        return pa.int32(), None
+    if type_code == 20:
+        return pa.int64(), None
+    if type_code == 700:
+        return pa.float32(), None
+    if type_code == 701:
+        return pa.float64(), None
+    if type_code == 1700:
+        # numeric without a declared precision: Decimal -> float64
+        return pa.float64(), float
+    if type_code == 1082:
+        return pa.date32(), None
+    if type_code == 1114:
+        return pa.timestamp("us"), None
+    if type_code == 1184:
+        return pa.timestamp("us", tz="UTC"), None
+    if type_code in (25, 1042, 1043, 19):
+        return pa.string(), None
+    # uuid, json, interval, arrays, ...: text representation
+    return pa.string(), _to_text
+
+
+def _to_text(value) -> str:
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (dict, list)):
+        return dumps(value).decode("utf-8")
+    return str(value)
+
+
+def arrow_schema(description) -> Tuple[Any, List[Optional[Callable]]]:
+    """Arrow schema and per-column converters built from a psycopg2 cursor.description"""
+    fields = []
+    converters = []
+    for column in description:
+        # (name, type_code, ...) entries: psycopg2 Columns or DuckDBBackend.describe() tuples
+        arrow_type, converter = _arrow_type(column[1])
+        fields.append(pa.field(column[0], arrow_type))
+        converters.append(converter)
+    return pa.schema(fields), converters
+
+
+def record_batch(schema, converters: List[Optional[Callable]], rows: List[tuple]):
+    """Transpose a batch of row tuples into an Arrow RecordBatch"""
+    columns = list(zip(*rows)) if rows else [()] * len(schema)
+    arrays = []
+    for field, converter, values in zip(schema, converters, columns):
+        if converter is not None:
+            values = [None if value is None else converter(value) for value in values]
+        arrays.append(pa.array(values, type=field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+class _ChunkSink:
+    """Write-only file object that collects writer output until it is drained"""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def iter_columnar(batches: Iterable[Tuple[tuple, List[tuple]]], format: str) -> Iterator[bytes]:
+    """
+    Encode (cursor.description, rows) batches as an Arrow IPC stream or a Parquet
+    file (one row group per batch), yielding the bytes written for each batch
+    """
+    sink = _ChunkSink()
+    writer = None
+    try:
+        for description, rows in batches:
+            if writer is None:
+                schema, converters = arrow_schema(description)
+                if format == "parquet":
+                    writer = pq.ParquetWriter(sink, schema, compression="snappy")
+                else:
+                    writer = pa.ipc.new_stream(sink, schema)
+            batch = record_batch(schema, converters, rows)
+            if format == "parquet":
+                writer.write_table(pa.Table.from_batches([batch], schema=schema))
+            else:
+                writer.write_batch(batch)
+            data = sink.drain()
+            if data:
+                yield data
+        if writer is not None:
+            writer.close()
+            yield sink.drain()
+    finally:
+        close = getattr(batches, "close", None)
+        if close is not None:
+            close()
+
+
+def columnar_response(batches: Iterable[Tuple[tuple, List[tuple]]], format: str) -> StreamingResponse:
+    """
+    Stream DatabaseService.iter_data_batches output as format=arrow (IPC stream,
+    read with pyarrow.ipc.open_stream) or format=parquet (pandas.read_parquet)
+    """
+    if pa is None:
+        raise RuntimeError(f"format={format} requires the pyarrow package")
+    headers = {"Cache-Control": "no-store"}
+    if format == "parquet":
+        headers["Content-Disposition"] = 'attachment; filename="audit_trail.parquet"'
+    return StreamingResponse(
+        iter_columnar(batches, format),
+        media_type=COLUMNAR_MEDIA_TYPES[format],
+        headers=headers
+    )
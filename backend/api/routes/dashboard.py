@@ -2,97 +2,176 @@
 Dashboard API routes - Updated to use PostgreSQL instead of Athena
 All endpoints now connect to PostgreSQL database
 """
+import os
 from fastapi import APIRouter
 from typing import List, Optional
 from datetime import datetime, timedelta
-from collections import defaultdict
 
 from api.models import (
     Metric, TopUser, ActiveUsersData, StaffSpeakingData, TimesData, ConsentsData,
     SalesData, RevenueData, UserActivity, AuditItem, PatientAccessItem,
     ServiceUsageItem, RecommendationItem, DeliveryScheduleItem, SignedNoteItem,
-    PractitionerUsageItem, SyncIssueItem, UnsignedNoteItem
+    PractitionerUsageItem, SyncIssueItem, UnsignedNoteItem, DashboardBundle
 )
-from database_service import DatabaseService
+from api.responses import FastJSONResponse, ndjson_response, unavailable_response
+from aggregation import AggregationPlan, Count, CountIf, Contains, Distinct, GroupBy, Max, NotEmpty, Sum
+from database_service import DatabaseService, AsyncDatabaseService
+from result_cache import ResultCache, cache_ttl, skip_cache
+
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:  # Python 3.8: time zones are left to PostgreSQL to check
+    ZoneInfo = None
 
 router = APIRouter()
+
+MONTH_NAMES = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+
 db_service = DatabaseService()
+async_db = AsyncDatabaseService(db_service)
+
+# Results are cached per endpoint and filter set, and dropped whenever a load completes.
+# Expired entries are served for CACHE_STALE_TTL more seconds while they refresh in the
+# background, and warm=True endpoints have their default view refreshed by main.py
+result_cache = ResultCache(
+    max_entries=int(os.getenv('CACHE_MAX_ENTRIES', '512')),
+    default_ttl=float(os.getenv('CACHE_DEFAULT_TTL', '300')),
+    version_check_interval=float(os.getenv('CACHE_VERSION_CHECK_INTERVAL', '15')),
+    version_source=async_db.get_data_version,
+    stale_ttl=float(os.getenv('CACHE_STALE_TTL', '600'))
+)
+
+# Aggregation plans: each evaluates all of its aggregators in a single pass or query
+ACTIVE_USERS_PLAN = AggregationPlan(
+    Count('total'),
+    Distinct('unique_users', 'user_id')
+)
+STAFF_SPEAKING_PLAN = AggregationPlan(
+    Count('total'),
+    CountIf('staff', NotEmpty('user_id'))
+)
+CONSENTS_PLAN = AggregationPlan(
+    CountIf('listening', Contains('event_name', 'listening')),
+    CountIf('dictation', Contains('event_name', 'dictation'))
+)
+SERVICE_USAGE_PLAN = AggregationPlan(
+    GroupBy('services', 'note_format', [
+        Count('count'),
+        Sum('duration', 'audio_duration'),
+        Max('last_used', 'audit_datetime')
+    ], order_by='count', skip_empty=False)
+)
+DELIVERY_SCHEDULE_PLAN = AggregationPlan(
+    Count('total'),
+    Distinct('unique_dates', 'audit_datetime', bucket='day'),
+    Distinct('unique_patients', 'patient_id')
+)
+
+def resolve_month_range(start_date: Optional[str], end_date: Optional[str],
+                        start_month: Optional[str], end_month: Optional[str]):
+    """Convert a YYYY-MM month range to a date range when no explicit dates are given"""
+    if start_month and end_month and not start_date and not end_date:
+        start_date = f"{start_month}-01"
+        try:
+            year, month = end_month.split('-')
+            if month == '12':
+                last_day = 31
+            else:
+                next_month = datetime(int(year), int(month) + 1, 1)
+                last_day = (next_month - timedelta(days=1)).day
+            end_date = f"{end_month}-{last_day:02d}"
+        except:
+            end_date = f"{end_month}-31"
+    return start_date, end_date
+
+def is_valid_timezone(name: str) -> bool:
+    """Whether name is a known IANA time zone (always True without zoneinfo)"""
+    if ZoneInfo is None:
+        return True
+    try:
+        ZoneInfo(name)
+        return True
+    except (KeyError, ValueError):
+        return False
+
+def month_label(bucket: datetime) -> str:
+    """Format a month bucket as 'Jan 2024'"""
+    return f"{MONTH_NAMES[bucket.month - 1]} {bucket.year}"
+
+def metric_cards(total_count: int, completed: int, unique_patients: int, unique_users: int):
+    """Build the metric card list shown at the top of the dashboard"""
+    return [
+        {"label": "Total Records", "value": total_count, "change": 0.0, "trend": "neutral"},
+        {"label": "Completed Notes", "value": completed, "change": 0.0, "trend": "neutral"},
+        {"label": "Pending Notes", "value": total_count - completed, "change": 0.0, "trend": "neutral"},
+        {"label": "Unique Patients", "value": unique_patients, "change": 0.0, "trend": "neutral"},
+        {"label": "Total Users", "value": unique_users, "change": 0.0, "trend": "neutral"}
+    ]
 
 @router.get("/metrics", response_model=List[Metric])
+@result_cache.cached('metrics', ttl=cache_ttl('metrics', 300), warm=True)
 async def get_metrics(
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
     start_month: Optional[str] = None,
     end_month: Optional[str] = None
 ):
-    """Get dashboard metrics from PostgreSQL database"""
+    """Get dashboard metrics from a single PostgreSQL aggregate query"""
     try:
-        # Convert month range to date range if provided
-        if start_month and end_month and not start_date and not end_date:
-            start_date = f"{start_month}-01"
-            try:
-                year, month = end_month.split('-')
-                if month == '12':
-                    last_day = 31
-                else:
-                    next_month = datetime(int(year), int(month) + 1, 1)
-                    last_day = (next_month - timedelta(days=1)).day
-                end_date = f"{end_month}-{last_day:02d}"
-            except:
-                end_date = f"{end_month}-31"
-        
-        data = db_service.get_all_data(start_date=start_date, end_date=end_date)
-        total_count = len(data)
-        completed = len([d for d in data if d.get('status') in ['completed', 'FINALIZED']])
-        unique_patients = len(set([d.get('patient_id') for d in data if d.get('patient_id')]))
-        
-        return [
-            {"label": "Total Records", "value": total_count, "change": 0.0, "trend": "neutral"},
-            {"label": "Completed Notes", "value": completed, "change": 0.0, "trend": "neutral"},
-            {"label": "Pending Notes", "value": total_count - completed, "change": 0.0, "trend": "neutral"},
-            {"label": "Unique Patients", "value": unique_patients, "change": 0.0, "trend": "neutral"},
-            {"label": "Total Users", "value": len(set([d.get('user_id') for d in data if d.get('user_id')])), "change": 0.0, "trend": "neutral"}
-        ]
+        start_date, end_date = resolve_month_range(start_date, end_date, start_month, end_month)
+        
+        result = await async_db.get_metrics(start_date=start_date, end_date=end_date)
+        metrics = result[0] if result else {}
+        total_count = metrics.get('total_visits') or 0
+        completed = metrics.get('completed_notes') or 0
+        
+        return metric_cards(
+            total_count,
+            completed,
+            metrics.get('unique_patients') or 0,
+            metrics.get('unique_users') or 0
+        )
     except Exception as e:
         print(f"Error in get_metrics: {e}")
-        return [
-            {"label": "Total Records", "value": 0, "change": 0.0, "trend": "neutral"},
-            {"label": "Completed Notes", "value": 0, "change": 0.0, "trend": "neutral"},
-            {"label": "Pending Notes", "value": 0, "change": 0.0, "trend": "neutral"},
-            {"label": "Unique Patients", "value": 0, "change": 0.0, "trend": "neutral"},
-            {"label": "Total Users", "value": 0, "change": 0.0, "trend": "neutral"}
-        ]
+        skip_cache()
+        return unavailable_response(metric_cards(0, 0, 0, 0))
 
 @router.get("/top-users", response_model=List[TopUser])
+@result_cache.cached('top-users', ttl=cache_ttl('top-users', 300), warm=True)
 async def get_top_users(
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
     start_month: Optional[str] = None,
-    end_month: Optional[str] = None
+    end_month: Optional[str] = None,
+    practitioner: Optional[str] = None,
+    program: Optional[str] = None,
+    location: Optional[str] = None
 ):
-    """Get top users data from PostgreSQL"""
+    """Get top users data from a grouped PostgreSQL query"""
     try:
-        data = db_service.get_all_data(start_date=start_date, end_date=end_date, limit=10000)
-        # Group by user_id and count visits
-        user_counts = {}
-        for record in data:
-            user_id = record.get('user_id', 'Unknown')
-            if user_id and user_id != 'Unknown':
-                if user_id not in user_counts:
-                    user_counts[user_id] = 0
-                user_counts[user_id] += 1
-        
-        # Sort and return top 8
-        top_users = sorted(user_counts.items(), key=lambda x: x[1], reverse=True)[:8]
+        start_date, end_date = resolve_month_range(start_date, end_date, start_month, end_month)
+        top_users = await async_db.get_top_users(
+            limit=8,
+            start_date=start_date,
+            end_date=end_date,
+            user_id=practitioner,
+            tenant_ids=[program, location]
+        )
         return [
-            {"name": f"User {user_id}", "visits": count, "totalTime": "0 min"}
-            for user_id, count in top_users
+            {
+                "name": f"User {row['user_id']}",
+                "visits": row['visits'],
+                "totalTime": f"{int(row['total_duration'] / 60)} min"
+            }
+            for row in top_users
         ]
     except Exception as e:
         print(f"Error in get_top_users: {e}")
-        return []
+        skip_cache()
+        return unavailable_response([])
 
 @router.get("/active-users", response_model=ActiveUsersData)
+@result_cache.cached('active-users', ttl=cache_ttl('active-users', 300), warm=True)
 async def get_active_users(
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
@@ -101,15 +180,16 @@ async def get_active_users(
 ):
     """Get active vs enabled users from PostgreSQL"""
     try:
-        data = db_service.get_all_data(start_date=start_date, end_date=end_date, limit=10000)
-        unique_users = len(set([d.get('user_id') for d in data if d.get('user_id')]))
-        total_records = len(data)
-        return {"active": unique_users, "enabled": total_records}
+        start_date, end_date = resolve_month_range(start_date, end_date, start_month, end_month)
+        result = await async_db.aggregate(ACTIVE_USERS_PLAN, start_date=start_date, end_date=end_date)
+        return {"active": result['unique_users'], "enabled": result['total']}
     except Exception as e:
         print(f"Error in get_active_users: {e}")
-        return {"active": 0, "enabled": 0}
+        skip_cache()
+        return unavailable_response({"active": 0, "enabled": 0})
 
 @router.get("/staff-speaking", response_model=StaffSpeakingData)
+@result_cache.cached('staff-speaking', ttl=cache_ttl('staff-speaking', 300), warm=True)
 async def get_staff_speaking(
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
@@ -118,62 +198,46 @@ async def get_staff_speaking(
 ):
     """Get staff speaking data from PostgreSQL"""
     try:
-        data = db_service.get_all_data(start_date=start_date, end_date=end_date, limit=10000)
+        start_date, end_date = resolve_month_range(start_date, end_date, start_month, end_month)
+        result = await async_db.aggregate(STAFF_SPEAKING_PLAN, start_date=start_date, end_date=end_date)
         # Simple logic: count records with user_id as staff, others as non-staff
-        staff_count = len([d for d in data if d.get('user_id')])
-        non_staff_count = len([d for d in data if not d.get('user_id')])
-        return {"staff": staff_count, "nonStaff": non_staff_count}
+        return {"staff": result['staff'], "nonStaff": result['total'] - result['staff']}
     except Exception as e:
         print(f"Error in get_staff_speaking: {e}")
-        return {"staff": 0, "nonStaff": 0}
+        skip_cache()
+        return unavailable_response({"staff": 0, "nonStaff": 0})
 
 @router.get("/times", response_model=List[TimesData])
+@result_cache.cached('times', ttl=cache_ttl('times', 300), warm=True)
 async def get_times(
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
     start_month: Optional[str] = None,
     end_month: Optional[str] = None
 ):
-    """Get times data from PostgreSQL"""
+    """Get times data from PostgreSQL (monthly buckets grouped in the database)"""
     try:
-        data = db_service.get_all_data(start_date=start_date, end_date=end_date, limit=10000)
-        # Group by month
-        monthly_data = defaultdict(lambda: {'count': 0})
+        start_date, end_date = resolve_month_range(start_date, end_date, start_month, end_month)
+        buckets = await async_db.get_time_series('month', start_date=start_date, end_date=end_date)
         
-        for record in data:
-            if record.get('audit_datetime'):
-                try:
-                    dt_str = str(record.get('audit_datetime'))
-                    if 'T' in dt_str:
-                        dt = datetime.fromisoformat(dt_str.replace('Z', '+00:00'))
-                    else:
-                        dt = datetime.strptime(dt_str, '%Y-%m-%d %H:%M:%S')
-                    month_key = dt.strftime('%Y-%m')
-                    monthly_data[month_key]['count'] += 1
-                except:
-                    pass
-        
-        month_names = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
-        times_data = []
-        for month_key, values in sorted(monthly_data.items()):
-            try:
-                year, month = month_key.split('-')
-                month_name = month_names[int(month) - 1]
-                times_data.append({
-                    "month": f"{month_name} {year}",
-                    "recording": 0.0,
-                    "processing": 0.0,
-                    "createdToSign": 0.0
-                })
-            except:
-                pass
+        times_data = [
+            {
+                "month": month_label(row['bucket']),
+                "recording": 0.0,
+                "processing": 0.0,
+                "createdToSign": 0.0
+            }
+            for row in buckets
+        ]
         
         return times_data[-12:]  # Return last 12 months
     except Exception as e:
         print(f"Error in get_times: {e}")
-        return []
+        skip_cache()
+        return unavailable_response([])
 
 @router.get("/consents", response_model=ConsentsData)
+@result_cache.cached('consents', ttl=cache_ttl('consents', 300), warm=True)
 async def get_consents(
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
@@ -182,16 +246,89 @@ async def get_consents(
 ):
     """Get consents data from PostgreSQL"""
     try:
-        data = db_service.get_all_data(start_date=start_date, end_date=end_date, limit=10000)
-        # Count based on event types or status
-        listening = len([d for d in data if 'listening' in str(d.get('event_name', '')).lower()])
-        dictation = len([d for d in data if 'dictation' in str(d.get('event_name', '')).lower()])
-        return {"listening": listening, "dictation": dictation}
+        start_date, end_date = resolve_month_range(start_date, end_date, start_month, end_month)
+        # Count based on event types
+        result = await async_db.aggregate(CONSENTS_PLAN, start_date=start_date, end_date=end_date)
+        return {"listening": result['listening'], "dictation": result['dictation']}
     except Exception as e:
         print(f"Error in get_consents: {e}")
-        return {"listening": 0, "dictation": 0}
+        skip_cache()
+        return unavailable_response({"listening": 0, "dictation": 0})
+
+@router.get("/dashboard-bundle", response_model=DashboardBundle)
+@result_cache.cached('dashboard-bundle', ttl=cache_ttl('dashboard-bundle', 300), warm=True)
+async def get_dashboard_bundle(
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    start_month: Optional[str] = None,
+    end_month: Optional[str] = None,
+    practitioner: Optional[str] = None,
+    program: Optional[str] = None,
+    location: Optional[str] = None
+):
+    """
+    Get every dashboard widget (metrics, top users, active users, staff speaking,
+    times and consents) from a single aggregate query over the filtered range
+    """
+    try:
+        start_date, end_date = resolve_month_range(start_date, end_date, start_month, end_month)
+        bundle = await async_db.get_dashboard_bundle(
+            start_date=start_date,
+            end_date=end_date,
+            user_id=practitioner,
+            tenant_ids=[program, location]
+        )
+        totals = bundle["totals"] or {}
+        total_count = totals.get('total') or 0
+        
+        return {
+            "metrics": metric_cards(
+                total_count,
+                totals.get('completed') or 0,
+                totals.get('unique_patients') or 0,
+                totals.get('unique_users') or 0
+            ),
+            "topUsers": [
+                {
+                    "name": f"User {row['user_id']}",
+                    "visits": row['total'],
+                    "totalTime": f"{int(row['total_duration'] / 60)} min"
+                }
+                for row in bundle["users"][:8]
+            ],
+            "activeUsers": {"active": totals.get('unique_users') or 0, "enabled": total_count},
+            "staffSpeaking": {
+                "staff": totals.get('staff') or 0,
+                "nonStaff": total_count - (totals.get('staff') or 0)
+            },
+            "times": [
+                {
+                    "month": month_label(row['month']),
+                    "recording": 0.0,
+                    "processing": 0.0,
+                    "createdToSign": 0.0
+                }
+                for row in bundle["months"][-12:]
+            ],
+            "consents": {
+                "listening": totals.get('listening') or 0,
+                "dictation": totals.get('dictation') or 0
+            }
+        }
+    except Exception as e:
+        print(f"Error in get_dashboard_bundle: {e}")
+        skip_cache()
+        return unavailable_response({
+            "metrics": metric_cards(0, 0, 0, 0),
+            "topUsers": [],
+            "activeUsers": {"active": 0, "enabled": 0},
+            "staffSpeaking": {"staff": 0, "nonStaff": 0},
+            "times": [],
+            "consents": {"listening": 0, "dictation": 0}
+        })
 
 @router.get("/sales", response_model=List[SalesData])
+@result_cache.cached('sales', ttl=cache_ttl('sales', 300), warm=True)
 async def get_sales_data(
     start_date: Optional[str] = None,
     end_date: Optional[str] = None
@@ -203,44 +340,23 @@ async def get_sales_data(
             end_date = datetime.now().strftime("%Y-%m-%d")
             start_date = (datetime.now() - timedelta(days=30)).strftime("%Y-%m-%d")
         
-        data = db_service.get_all_data(start_date=start_date, end_date=end_date, limit=100000)
-        
-        # Group by date
-        daily_data = defaultdict(lambda: {'orders': 0, 'sales': 0.0})
-        
-        for record in data:
-            if record.get('audit_datetime'):
-                try:
-                    dt_str = str(record.get('audit_datetime'))
-                    if 'T' in dt_str:
-                        dt = datetime.fromisoformat(dt_str.replace('Z', '+00:00'))
-                    else:
-                        dt = datetime.strptime(dt_str, '%Y-%m-%d %H:%M:%S')
-                    date_key = dt.strftime('%Y-%m-%d')
-                    daily_data[date_key]['orders'] += 1
-                    # Add audio duration if available
-                    audio_dur = record.get('audio_duration')
-                    if audio_dur:
-                        try:
-                            daily_data[date_key]['sales'] += float(audio_dur) / 60.0
-                        except:
-                            pass
-                except:
-                    pass
+        buckets = await async_db.get_time_series('day', start_date=start_date, end_date=end_date)
         
         return [
             {
-                "date": date_key,
-                "sales": round(values['sales'], 2),
-                "orders": values['orders']
+                "date": row['bucket'].strftime('%Y-%m-%d'),
+                "sales": round(float(row['audio_minutes']), 2),
+                "orders": row['count']
             }
-            for date_key, values in sorted(daily_data.items())
+            for row in buckets
         ]
     except Exception as e:
         print(f"Error in get_sales_data: {e}")
-        return []
+        skip_cache()
+        return unavailable_response([])
 
 @router.get("/revenue", response_model=List[RevenueData])
+@result_cache.cached('revenue', ttl=cache_ttl('revenue', 300), warm=True)
 async def get_revenue_data(
     start_date: Optional[str] = None,
     end_date: Optional[str] = None
@@ -252,112 +368,78 @@ async def get_revenue_data(
             end_date = datetime.now().strftime("%Y-%m-%d")
             start_date = (datetime.now() - timedelta(days=365)).strftime("%Y-%m-%d")
         
-        data = db_service.get_all_data(start_date=start_date, end_date=end_date, limit=100000)
+        buckets = await async_db.get_time_series('month', start_date=start_date, end_date=end_date)
         
-        # Group by month
-        monthly_data = defaultdict(lambda: {'revenue': 0, 'profit': 0})
-        
-        for record in data:
-            if record.get('audit_datetime'):
-                try:
-                    dt_str = str(record.get('audit_datetime'))
-                    if 'T' in dt_str:
-                        dt = datetime.fromisoformat(dt_str.replace('Z', '+00:00'))
-                    else:
-                        dt = datetime.strptime(dt_str, '%Y-%m-%d %H:%M:%S')
-                    month_key = dt.strftime('%Y-%m')
-                    monthly_data[month_key]['revenue'] += 1
-                    if record.get('status') in ['FINALIZED', 'completed']:
-                        monthly_data[month_key]['profit'] += 1
-                except:
-                    pass
-        
-        month_names = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
-        revenue_data = []
-        for month_key, values in sorted(monthly_data.items()):
-            try:
-                year, month = month_key.split('-')
-                month_name = month_names[int(month) - 1]
-                revenue_data.append({
-                    "month": f"{month_name} {year}",
-                    "revenue": round(float(values['revenue']), 2),
-                    "profit": round(float(values['profit']), 2)
-                })
-            except:
-                pass
-        
-        return revenue_data
+        return [
+            {
+                "month": month_label(row['bucket']),
+                "revenue": round(float(row['count']), 2),
+                "profit": round(float(row['completed_count']), 2)
+            }
+            for row in buckets
+        ]
     except Exception as e:
         print(f"Error in get_revenue_data: {e}")
-        return []
+        skip_cache()
+        return unavailable_response([])
 
 @router.get("/activity", response_model=List[UserActivity])
+@result_cache.cached('activity', ttl=cache_ttl('activity', 300), warm=True)
 async def get_user_activity(
     start_date: Optional[str] = None,
-    end_date: Optional[str] = None
+    end_date: Optional[str] = None,
+    timezone: Optional[str] = None
 ):
-    """Get hourly user activity from PostgreSQL"""
+    """Get hourly user activity from PostgreSQL (distinct users per hour of day)"""
+    if timezone and not is_valid_timezone(timezone):
+        skip_cache()
+        return unavailable_response({"error": f"Unknown time zone: {timezone}"}, 400)
     try:
         # Default to last 7 days if no dates provided
         if not start_date or not end_date:
             end_date = datetime.now().strftime("%Y-%m-%d")
             start_date = (datetime.now() - timedelta(days=7)).strftime("%Y-%m-%d")
         
-        data = db_service.get_all_data(start_date=start_date, end_date=end_date, limit=100000)
-        
-        # Group by hour
-        hour_users = defaultdict(set)
-        
-        for record in data:
-            user_id = record.get('user_id')
-            if user_id and record.get('audit_datetime'):
-                try:
-                    dt_str = str(record.get('audit_datetime'))
-                    if 'T' in dt_str:
-                        dt = datetime.fromisoformat(dt_str.replace('Z', '+00:00'))
-                    else:
-                        dt = datetime.strptime(dt_str, '%Y-%m-%d %H:%M:%S')
-                    hour = dt.hour
-                    hour_users[hour].add(user_id)
-                except:
-                    pass
+        rows = await async_db.get_hourly_active_users(
+            start_date=start_date,
+            end_date=end_date,
+            timezone=timezone
+        )
+        hour_users = {row['hour']: row['active_users'] for row in rows}
         
         # Fill in all 24 hours
-        activity_data = []
-        for hour in range(24):
-            activity_data.append({
-                "hour": hour,
-                "active_users": len(hour_users.get(hour, set()))
-            })
-        
-        return activity_data
+        return [
+            {"hour": hour, "active_users": hour_users.get(hour, 0)}
+            for hour in range(24)
+        ]
     except Exception as e:
         print(f"Error in get_user_activity: {e}")
-        return []
+        skip_cache()
+        return unavailable_response([])
 
 @router.get("/filter-options")
 async def get_filter_options():
-    """Get unique values for filters from PostgreSQL data"""
+    """Get unique values for filters from the cached PostgreSQL dimension catalog"""
     try:
-        data = db_service.get_all_data(limit=10000)
-        practitioners = sorted(set([d.get('user_id') for d in data if d.get('user_id')]))
-        programs = sorted(set([d.get('tenant_id') for d in data if d.get('tenant_id')]))
-        locations = sorted(set([d.get('tenant_id') for d in data if d.get('tenant_id')]))
+        dimensions = await async_db.get_dimension_values()
         
         return {
-            "practitioners": practitioners,
-            "programs": programs,
-            "locations": locations
+            "practitioners": dimensions['user_id'],
+            "programs": dimensions['tenant_id'],
+            "locations": dimensions['tenant_id'],
+            "version": dimensions['version']
         }
     except Exception as e:
         print(f"Error in get_filter_options: {e}")
-        return {
+        skip_cache()
+        return unavailable_response({
             "practitioners": [],
             "programs": [],
             "locations": []
-        }
+        })
 
 @router.get("/audit-summary", response_model=List[AuditItem])
+@result_cache.cached('audit-summary', ttl=cache_ttl('audit-summary', 120))
 async def get_audit_summary(
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
@@ -369,12 +451,13 @@ async def get_audit_summary(
 ):
     """Get audit summary data from PostgreSQL"""
     try:
-        data = db_service.get_all_data(
+        data = await async_db.get_all_data(
             start_date=start_date,
             end_date=end_date,
             status=None,
             user_id=practitioner,
-            limit=100
+            limit=100,
+            columns=['care_record_id', 'audit_datetime', 'user_id', 'patient_id', 'patient_name', 'event_name', 'status', 'tenant_id']
         )
         
         # Apply additional filters
@@ -410,9 +493,11 @@ async def get_audit_summary(
         return unique_data[:100]
     except Exception as e:
         print(f"Error in get_audit_summary: {e}")
-        return []
+        skip_cache()
+        return unavailable_response([])
 
 @router.get("/patient-access", response_model=List[PatientAccessItem])
+@result_cache.cached('patient-access', ttl=cache_ttl('patient-access', 120))
 async def get_patient_access(
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
@@ -424,11 +509,12 @@ async def get_patient_access(
 ):
     """Get patient access data from PostgreSQL"""
     try:
-        data = db_service.get_all_data(
+        data = await async_db.get_all_data(
             start_date=start_date,
             end_date=end_date,
             user_id=practitioner,
-            limit=10000
+            limit=10000,
+            columns=['patient_id', 'patient_name', 'audit_datetime', 'event_name', 'audio_duration', 'tenant_id']
         )
         
         # Filter for patient records
@@ -452,50 +538,38 @@ async def get_patient_access(
         ]
     except Exception as e:
         print(f"Error in get_patient_access: {e}")
-        return []
+        skip_cache()
+        return unavailable_response([])
 
 @router.get("/patient-service-usage", response_model=List[ServiceUsageItem])
+@result_cache.cached('patient-service-usage', ttl=cache_ttl('patient-service-usage', 120))
 async def get_patient_service_usage():
-    """Get patient service usage data from PostgreSQL"""
+    """Get patient service usage data from PostgreSQL (grouped by note_format)"""
     try:
-        data = db_service.get_all_data(limit=10000)
-        
-        # Group by note_format
-        service_counts = defaultdict(lambda: {'count': 0, 'duration': 0.0, 'last_used': None})
-        
-        for record in data:
-            service = record.get('note_format', 'Unknown')
-            service_counts[service]['count'] += 1
-            audio_dur = record.get('audio_duration')
-            if audio_dur:
-                try:
-                    service_counts[service]['duration'] += float(audio_dur)
-                except:
-                    pass
-            audit_dt = record.get('audit_datetime')
-            if audit_dt:
-                service_counts[service]['last_used'] = str(audit_dt)
+        result = await async_db.aggregate(SERVICE_USAGE_PLAN)
         
         services = []
-        for service, values in sorted(service_counts.items(), key=lambda x: x[1]['count'], reverse=True):
-            duration_sec = values['duration']
+        for group in result['services']:
+            duration_sec = group['duration']
             hours = int(duration_sec / 3600)
             mins = int((duration_sec % 3600) / 60)
             total_time = f"{hours}h {mins}m" if hours > 0 else f"{mins}m"
             
             services.append({
-                "serviceName": service,
-                "usageCount": values['count'],
+                "serviceName": str(group['key']) if group['key'] not in (None, '') else 'Unknown',
+                "usageCount": group['count'],
                 "totalTime": total_time,
-                "lastUsed": values['last_used'] or ''
+                "lastUsed": str(group['last_used']) if group['last_used'] else ''
             })
         
         return services
     except Exception as e:
         print(f"Error in get_patient_service_usage: {e}")
-        return []
+        skip_cache()
+        return unavailable_response([])
 
 @router.get("/recommendation-summary", response_model=List[RecommendationItem])
+@result_cache.cached('recommendation-summary', ttl=cache_ttl('recommendation-summary', 120))
 async def get_recommendation_summary(
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
@@ -504,7 +578,7 @@ async def get_recommendation_summary(
 ):
     """Get recommendation summary from PostgreSQL (based on similarity scores)"""
     try:
-        data = db_service.get_all_data(start_date=start_date, end_date=end_date, limit=10000)
+        data = await async_db.get_all_data(start_date=start_date, end_date=end_date, limit=10000, columns=['similarity', 'care_record_id', 'pk', 'status', 'creation_datetime'])
         
         # Filter records with similarity data
         recommendations = []
@@ -527,15 +601,17 @@ async def get_recommendation_summary(
         return sorted(recommendations, key=lambda x: x.get('priority', 'low'))[:100]
     except Exception as e:
         print(f"Error in get_recommendation_summary: {e}")
-        return []
+        skip_cache()
+        return unavailable_response([])
 
 @router.get("/delivery-schedules", response_model=List[DeliveryScheduleItem])
+@result_cache.cached('delivery-schedules', ttl=cache_ttl('delivery-schedules', 120))
 async def get_delivery_schedules():
     """Get report delivery schedules based on actual data patterns from PostgreSQL"""
     try:
-        data = db_service.get_all_data(limit=10000)
+        result = await async_db.aggregate(DELIVERY_SCHEDULE_PLAN)
         
-        if not data:
+        if not result['total']:
             return [{
                 "reportName": "No Reports Available",
                 "frequency": "N/A",
@@ -553,7 +629,7 @@ async def get_delivery_schedules():
         schedules = []
         
         # Check if we have daily data
-        unique_dates = len(set([str(d.get('audit_datetime', ''))[:10] for d in data if d.get('audit_datetime')]))
+        unique_dates = result['unique_dates']
         
         if unique_dates > 0:
             schedules.append({
@@ -564,7 +640,7 @@ async def get_delivery_schedules():
             })
         
         # Check for patient data
-        unique_patients = len(set([d.get('patient_id') for d in data if d.get('patient_id')]))
+        unique_patients = result['unique_patients']
         if unique_patients > 0:
             schedules.append({
                 "reportName": "Patient Access Report",
@@ -581,14 +657,16 @@ async def get_delivery_schedules():
         }]
     except Exception as e:
         print(f"Error in get_delivery_schedules: {e}")
-        return [{
+        skip_cache()
+        return unavailable_response([{
             "reportName": "Audit Summary",
             "frequency": "Daily",
             "nextDelivery": (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d"),
             "status": "Active"
-        }]
+        }])
 
 @router.get("/signed-notes", response_model=List[SignedNoteItem])
+@result_cache.cached('signed-notes', ttl=cache_ttl('signed-notes', 120))
 async def get_signed_notes(
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
@@ -600,12 +678,13 @@ async def get_signed_notes(
 ):
     """Get signed notes data from PostgreSQL (FINALIZED status)"""
     try:
-        data = db_service.get_all_data(
+        data = await async_db.get_all_data(
             start_date=start_date,
             end_date=end_date,
             status='FINALIZED',
             user_id=practitioner,
-            limit=100
+            limit=100,
+            columns=['care_record_id', 'patient_name', 'user_id', 'completed_datetime', 'status', 'tenant_id']
         )
         
         # Apply additional filters
@@ -626,61 +705,46 @@ async def get_signed_notes(
         ]
     except Exception as e:
         print(f"Error in get_signed_notes: {e}")
-        return []
+        skip_cache()
+        return unavailable_response([])
 
 @router.get("/practitioner-service-usage", response_model=List[PractitionerUsageItem])
+@result_cache.cached('practitioner-service-usage', ttl=cache_ttl('practitioner-service-usage', 120))
 async def get_practitioner_service_usage(
     practitioner: Optional[str] = None,
     program: Optional[str] = None,
     location: Optional[str] = None
 ):
-    """Get practitioner service usage from PostgreSQL"""
+    """Get practitioner service usage from a grouped PostgreSQL query"""
     try:
-        data = db_service.get_all_data(user_id=practitioner, limit=10000)
-        
-        # Apply filters
-        if program:
-            data = [d for d in data if d.get('tenant_id') == program]
-        if location:
-            data = [d for d in data if d.get('tenant_id') == location]
-        
-        # Group by user_id
-        practitioner_data = defaultdict(lambda: {'visits': 0, 'duration': 0.0, 'last_active': None})
-        
-        for record in data:
-            user_id = record.get('user_id')
-            if user_id:
-                practitioner_data[user_id]['visits'] += 1
-                audio_dur = record.get('audio_duration')
-                if audio_dur:
-                    try:
-                        practitioner_data[user_id]['duration'] += float(audio_dur)
-                    except:
-                        pass
-                audit_dt = record.get('audit_datetime')
-                if audit_dt:
-                    practitioner_data[user_id]['last_active'] = str(audit_dt)
+        top_practitioners = await async_db.get_top_users(
+            limit=50,
+            user_id=practitioner,
+            tenant_ids=[program, location]
+        )
         
         practitioners = []
-        for user_id, values in sorted(practitioner_data.items(), key=lambda x: x[1]['visits'], reverse=True)[:50]:
-            duration_sec = values['duration']
+        for row in top_practitioners:
+            duration_sec = row['total_duration']
             hours = int(duration_sec / 3600)
             mins = int((duration_sec % 3600) / 60)
             total_time = f"{hours}h {mins}m" if hours > 0 else f"{mins}m"
             
             practitioners.append({
-                "practitionerName": f"User {user_id}",
-                "visits": values['visits'],
+                "practitionerName": f"User {row['user_id']}",
+                "visits": row['visits'],
                 "totalTime": total_time,
-                "lastActive": values['last_active'] or ''
+                "lastActive": str(row['last_active']) if row['last_active'] else ''
             })
         
         return practitioners
     except Exception as e:
         print(f"Error in get_practitioner_service_usage: {e}")
-        return []
+        skip_cache()
+        return unavailable_response([])
 
 @router.get("/sync-issues", response_model=List[SyncIssueItem])
+@result_cache.cached('sync-issues', ttl=cache_ttl('sync-issues', 120))
 async def get_sync_issues(
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
@@ -689,7 +753,7 @@ async def get_sync_issues(
 ):
     """Get sync issues from PostgreSQL (sessions with errors or issues)"""
     try:
-        data = db_service.get_all_data(start_date=start_date, end_date=end_date, limit=10000)
+        data = await async_db.get_all_data(start_date=start_date, end_date=end_date, limit=10000, columns=['care_record_id', 'pk', 'event_name', 'status', 'completed_datetime', 'audio_duration', 'audit_datetime'])
         
         # Find records with potential issues
         issues = []
@@ -708,9 +772,11 @@ async def get_sync_issues(
         return issues[:100]
     except Exception as e:
         print(f"Error in get_sync_issues: {e}")
-        return []
+        skip_cache()
+        return unavailable_response([])
 
 @router.get("/unsigned-notes", response_model=List[UnsignedNoteItem])
+@result_cache.cached('unsigned-notes', ttl=cache_ttl('unsigned-notes', 120))
 async def get_unsigned_notes(
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
@@ -722,11 +788,12 @@ async def get_unsigned_notes(
 ):
     """Get unsigned notes data from PostgreSQL (non-FINALIZED status)"""
     try:
-        data = db_service.get_all_data(
+        data = await async_db.get_all_data(
             start_date=start_date,
             end_date=end_date,
             user_id=practitioner,
-            limit=10000
+            limit=10000,
+            columns=['care_record_id', 'patient_name', 'user_id', 'status', 'creation_datetime', 'tenant_id']
         )
         
         # Filter non-FINALIZED records
@@ -765,7 +832,22 @@ async def get_unsigned_notes(
         return sorted(unsigned_notes, key=lambda x: x['daysPending'], reverse=True)[:100]
     except Exception as e:
         print(f"Error in get_unsigned_notes: {e}")
-        return []
+        skip_cache()
+        return unavailable_response([])
+
+@router.get("/cache/stats")
+async def get_cache_stats():
+    """Get dashboard result cache statistics (hits, misses, entries, data version)"""
+    stats = result_cache.stats()
+    columnar = AsyncDatabaseService.columnar_cache()
+    stats["columnar"] = columnar.stats() if columnar is not None else None
+    return stats
+
+@router.post("/cache/invalidate")
+async def invalidate_cache(endpoint: Optional[str] = None):
+    """Drop cached dashboard results, e.g. after a parquet load completes"""
+    removed = result_cache.invalidate(endpoint)
+    return {"success": True, "removed": removed}
 
 @router.get("/all-data")
 async def get_all_dashboard_data(
@@ -773,27 +855,50 @@ async def get_all_dashboard_data(
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
     status: Optional[str] = None,
-    user_id: Optional[str] = None
+    user_id: Optional[str] = None,
+    fields: Optional[str] = None,
+    format: Optional[str] = None
 ):
-    """Get all dashboard data from PostgreSQL"""
+    """
+    Get all dashboard data from PostgreSQL.
+    Use fields=col1,col2 to return only those columns (validated against the table schema).
+    Use format=ndjson to stream one row per line, ending with a {"_trailer": {"count": n}} line.
+    """
     try:
-        data = db_service.get_all_data(
+        if format not in (None, 'json', 'ndjson'):
+            raise ValueError(f"Unknown format: {format}")
+        if format == 'ndjson':
+            rows = await async_db.iter_all_data(
+                limit=limit,
+                start_date=start_date,
+                end_date=end_date,
+                status=status,
+                user_id=user_id,
+                columns=fields,
+                strict_columns=True
+            )
+            return ndjson_response(rows)
+        
+        data = await async_db.get_all_data(
             limit=limit,
             start_date=start_date,
             end_date=end_date,
             status=status,
-            user_id=user_id
+            user_id=user_id,
+            columns=fields,
+            strict_columns=True
         )
-        return {
+        return FastJSONResponse({
             "success": True,
             "count": len(data),
             "data": data
-        }
+        })
     except Exception as e:
-        return {
+        skip_cache()
+        return unavailable_response({
             "success": False,
             "error": str(e),
             "count": 0,
             "data": []
-        }
+        }, 400 if isinstance(e, ValueError) else 503)
 
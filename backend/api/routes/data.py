@@ -3,7 +3,9 @@ Data API routes - Get all data from PostgreSQL
 """
 from fastapi import APIRouter
 from typing import List, Dict, Optional
-from database_service import DatabaseService
+from database_service import DatabaseService, AsyncDatabaseService
+from api.responses import FastJSONResponse, columnar_response, ndjson_response, unavailable_response
+from result_cache import skip_cache
 
 router = APIRouter()
 
@@ -13,45 +15,138 @@ async def get_all_data(
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
     status: Optional[str] = None,
-    user_id: Optional[str] = None
+    user_id: Optional[str] = None,
+    fields: Optional[str] = None,
+    cursor: Optional[str] = None,
+    page_size: Optional[int] = None,
+    format: Optional[str] = None
 ):
-    """Get all data from PostgreSQL audit_trail_data table"""
+    """
+    Get all data from PostgreSQL audit_trail_data table.
+    Use fields=col1,col2 to return only those columns (validated against the table schema).
+    Pass page_size and/or cursor for keyset pagination; follow next_cursor until it is null.
+    Use format=ndjson to stream one row per line, ending with a {"_trailer": {"count": n}} line,
+    or format=arrow / format=parquet for a columnar stream of record batches (requires pyarrow).
+    """
     try:
-        db = DatabaseService()
-        data = db.get_all_data(
+        db = AsyncDatabaseService()
+        if format not in (None, 'json', 'ndjson', 'arrow', 'parquet'):
+            raise ValueError(f"Unknown format: {format}")
+        if format in ('ndjson', 'arrow', 'parquet') and (cursor or page_size):
+            raise ValueError(f"format={format} streams the whole result and cannot be paginated")
+        if format in ('arrow', 'parquet'):
+            batches = await db.iter_data_batches(
+                limit=limit,
+                start_date=start_date,
+                end_date=end_date,
+                status=status,
+                user_id=user_id,
+                columns=fields,
+                strict_columns=True
+            )
+            return columnar_response(batches, format)
+        if format == 'ndjson':
+            rows = await db.iter_all_data(
+                limit=limit,
+                start_date=start_date,
+                end_date=end_date,
+                status=status,
+                user_id=user_id,
+                columns=fields,
+                strict_columns=True
+            )
+            return ndjson_response(rows)
+        
+        if cursor or page_size:
+            page = await db.get_page(
+                page_size=page_size,
+                cursor=cursor,
+                start_date=start_date,
+                end_date=end_date,
+                status=status,
+                user_id=user_id,
+                columns=fields
+            )
+            return FastJSONResponse({
+                "success": True,
+                "count": len(page["data"]),
+                "data": page["data"],
+                "page_size": page["page_size"],
+                "next_cursor": page["next_cursor"]
+            })
+        
+        data = await db.get_all_data(
             limit=limit,
             start_date=start_date,
             end_date=end_date,
             status=status,
-            user_id=user_id
+            user_id=user_id,
+            columns=fields,
+            strict_columns=True
         )
-        return {
+        return FastJSONResponse({
             "success": True,
             "count": len(data),
             "data": data
-        }
+        })
     except Exception as e:
-        return {
+        skip_cache()
+        return unavailable_response({
             "success": False,
             "error": str(e),
             "count": 0,
             "data": []
-        }
+        }, 400 if isinstance(e, ValueError) else 503)
 
 @router.get("/count")
-async def get_count():
-    """Get total count of records"""
+async def get_count(
+    mode: str = "exact",
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    status: Optional[str] = None,
+    user_id: Optional[str] = None
+):
+    """
+    Get total count of records.
+    mode=estimate returns the planner's instant estimate, mode=exact the row count
+    maintained by the loaders; any filter (or mode=filtered) counts matching rows.
+    """
     try:
-        db = DatabaseService()
-        count = db.get_count()
+        db = AsyncDatabaseService()
+        count = await db.get_count(
+            mode=mode,
+            start_date=start_date,
+            end_date=end_date,
+            status=status,
+            user_id=user_id
+        )
         return {
             "success": True,
+            "mode": "filtered" if any([start_date, end_date, status, user_id]) else mode,
             "count": count
         }
     except Exception as e:
-        return {
+        skip_cache()
+        return unavailable_response({
             "success": False,
             "error": str(e),
             "count": 0
-        }
+        }, 400 if isinstance(e, ValueError) else 503)
 
+@router.get("/pool-stats")
+async def get_pool_stats():
+    """Get database connection pool and request coalescing statistics"""
+    try:
+        db = DatabaseService()
+        return {
+            "success": True,
+            "pool": db.get_pool_stats(),
+            "coalescing": AsyncDatabaseService.coalescing_stats()
+        }
+    except Exception as e:
+        return {
+            "success": False,
+            "error": str(e),
+            "pool": {},
+            "coalescing": {}
+        }
@@ -0,0 +1,79 @@
+"""
+Concurrent load test for the Dashboard API
+Fires requests from N concurrent clients and reports throughput and latency percentiles
+
+Usage (API running on localhost:8000):
+    python benchmarks/load_test.py --concurrency 50 --requests 1000
+    python benchmarks/load_test.py --paths /api/sales /api/metrics --concurrency 100
+"""
+import argparse
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
+
+DEFAULT_PATHS = [
+    "/api/metrics",
+    "/api/top-users",
+    "/api/active-users",
+    "/api/staff-speaking",
+    "/api/times",
+    "/api/consents",
+    "/api/sales",
+]
+
+
+def fetch(url: str, timeout: float) -> Tuple[float, bool]:
+    """Fetch a URL and return (latency in ms, success)"""
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            response.read()
+            ok = response.status == 200
+    except Exception:
+        ok = False
+    return (time.perf_counter() - started) * 1000, ok
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run(base_url: str, paths: List[str], concurrency: int, total: int, timeout: float):
+    urls = [f"{base_url}{paths[i % len(paths)]}" for i in range(total)]
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda url: fetch(url, timeout), urls))
+    elapsed = time.perf_counter() - started
+
+    latencies = [latency for latency, ok in results if ok]
+    failures = len(results) - len(latencies)
+
+    print(f"Concurrency:   {concurrency}")
+    print(f"Requests:      {total} ({failures} failed)")
+    print(f"Elapsed:       {elapsed:.2f}s")
+    print(f"Throughput:    {len(latencies) / elapsed:.1f} req/s")
+    print(f"Latency p50:   {percentile(latencies, 50):.1f} ms")
+    print(f"Latency p95:   {percentile(latencies, 95):.1f} ms")
+    print(f"Latency p99:   {percentile(latencies, 99):.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent load test for the Dashboard API")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--paths", nargs="+", default=DEFAULT_PATHS)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args()
+
+    run(args.base_url, args.paths, args.concurrency, args.requests, args.timeout)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Peak memory comparison of get_all_data (fetchall) and iter_all_data (server-side cursor)
+Each mode runs in its own subprocess so peak RSS readings do not interfere
+
+Usage (from the backend directory, with .env configured):
+    python benchmarks/memory_profile.py --rows 100000
+    python benchmarks/memory_profile.py --rows 1000000 --itersize 5000
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in MB (ru_maxrss is KB on Linux, bytes on macOS)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def measure(mode: str, rows: int, itersize: int) -> dict:
+    from database_service import DatabaseService
+
+    db = DatabaseService()
+    baseline = peak_rss_mb()
+    started = time.perf_counter()
+
+    count = 0
+    audio_seconds = 0.0
+    if mode == "fetchall":
+        for row in db.get_all_data(limit=rows):
+            count += 1
+            audio_seconds += float(row.get("audio_duration") or 0)
+    else:
+        for row in db.iter_all_data(limit=rows, itersize=itersize):
+            count += 1
+            audio_seconds += float(row.get("audio_duration") or 0)
+
+    return {
+        "mode": mode,
+        "rows": count,
+        "seconds": round(time.perf_counter() - started, 2),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "baseline_rss_mb": round(baseline, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare peak RSS of fetchall vs streaming")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--itersize", type=int, default=2000)
+    parser.add_argument("--mode", choices=["fetchall", "stream"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(measure(args.mode, args.rows, args.itersize)))
+        return
+
+    print(f"{'Mode':<10} {'Rows':>10} {'Seconds':>9} {'Peak RSS (MB)':>14}")
+    for mode in ("fetchall", "stream"):
+        output = subprocess.run(
+            [sys.executable, __file__, "--mode", mode,
+             "--rows", str(args.rows), "--itersize", str(args.itersize)],
+            capture_output=True, text=True, check=True
+        ).stdout.strip().splitlines()[-1]
+        result = json.loads(output)
+        print(f"{result['mode']:<10} {result['rows']:>10,} {result['seconds']:>9} {result['peak_rss_mb']:>14}")
+
+
+if __name__ == "__main__":
+    main()
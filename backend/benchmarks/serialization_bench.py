@@ -0,0 +1,105 @@
+"""
+Serialization and compression benchmark for the all-data response path
+Encodes synthetic audit rows (datetime / Decimal values, like psycopg2 returns) with
+FastAPI's jsonable_encoder + json and with the FastJSONResponse encoder, then reports
+encode time and bytes on the wire uncompressed, gzip and brotli (when installed)
+
+Usage (from the backend directory):
+    python benchmarks/serialization_bench.py
+    python benchmarks/serialization_bench.py --rows 10000 100000 --columns 30
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api.responses import dumps, orjson
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def make_rows(count: int, extra_columns: int):
+    """Wide rows shaped like audit_trail_data"""
+    started = datetime(2024, 1, 1)
+    rows = []
+    for i in range(count):
+        row = {
+            "pk": i,
+            "audit_datetime": started + timedelta(seconds=37 * i),
+            "user_id": f"user-{i % 250}",
+            "tenant_id": f"tenant-{i % 12}",
+            "patient_id": f"patient-{i % 5000}",
+            "status": random.choice(["completed", "FINALIZED", "pending"]),
+            "event_name": random.choice(["listening", "dictation", "note_signed"]),
+            "note_format": random.choice(["SOAP", "DAP", "BIRP"]),
+            "audio_duration": Decimal(f"{random.uniform(10, 900):.3f}"),
+        }
+        for column in range(extra_columns):
+            row[f"field_{column}"] = f"value {i % 97} {column}"
+        rows.append(row)
+    return rows
+
+
+def timed(func, repeat: int):
+    best = None
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best * 1000
+
+
+def encoders():
+    yield "fast (" + ("orjson" if orjson else "json") + ")", dumps
+    try:
+        from fastapi.encoders import jsonable_encoder
+    except ImportError:
+        return
+    yield "jsonable_encoder+json", lambda content: json.dumps(
+        jsonable_encoder(content), ensure_ascii=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def run(row_counts, extra_columns: int, repeat: int):
+    print(f"{'Rows':>8} {'Encoder':<24} {'Encode ms':>10} {'Raw KB':>10} "
+          f"{'Gzip KB':>9} {'Gzip ms':>8} {'Brotli KB':>10} {'Brotli ms':>10}")
+    for count in row_counts:
+        content = {"success": True, "count": count, "data": make_rows(count, extra_columns)}
+        for name, encode in encoders():
+            body, encode_ms = timed(lambda: encode(content), repeat)
+            gzipped, gzip_ms = timed(lambda: gzip.compress(body, compresslevel=6), repeat)
+            line = (f"{count:>8,} {name:<24} {encode_ms:>10.1f} {len(body) / 1024:>10.1f} "
+                    f"{len(gzipped) / 1024:>9.1f} {gzip_ms:>8.1f}")
+            if brotli is not None:
+                compressed, brotli_ms = timed(lambda: brotli.compress(body, quality=4), repeat)
+                line += f" {len(compressed) / 1024:>10.1f} {brotli_ms:>10.1f}"
+            else:
+                line += f" {'-':>10} {'-':>10}"
+            print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark all-data JSON encoding and compression")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--columns", type=int, default=20, help="extra text columns per row")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    random.seed(0)
+    run(args.rows, args.columns, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
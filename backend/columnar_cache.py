@@ -0,0 +1,389 @@
+"""
+In-process columnar snapshot of the audit table
+Keeps the columns behind the dashboard aggregates as NumPy arrays: audit_datetime
+as int64 epoch microseconds and user_id / tenant_id / status / event_name /
+patient_id dictionary-encoded to int32 codes. The metrics, time series, hourly
+activity and top-user queries then run as vectorized filters and group-bys.
+
+The snapshot is refreshed incrementally: rows newer than the snapshot's
+audit_datetime watermark are appended, and a full rebuild happens whenever the
+row count no longer matches the table (late or deleted rows). While a newer data
+version than the snapshot's has been observed, the cache reports itself stale and
+AsyncDatabaseService sends queries to PostgreSQL instead.
+
+NumPy is optional; enable with COLUMNAR_CACHE_ENABLED=true.
+"""
+import asyncio
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Dict, List, Optional
+
+try:
+    import numpy as np
+except ImportError:  # optional dependency
+    np = None
+
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:  # Python 3.8: only UTC hours are served from the snapshot
+    ZoneInfo = None
+
+EPOCH = datetime(1970, 1, 1)
+US_PER_HOUR = 3600 * 1000000
+US_PER_DAY = 24 * US_PER_HOUR
+
+DICTIONARY_COLUMNS = ('user_id', 'tenant_id', 'status', 'event_name', 'patient_id')
+COMPLETED_STATUSES = ('completed', 'FINALIZED')
+
+
+class Dictionary:
+    """Append-only value <-> int32 code mapping; NULL is code -1"""
+
+    def __init__(self, values: Optional[List[str]] = None):
+        self.values: List[str] = list(values or [])
+        self.codes: Dict[str, int] = {value: code for code, value in enumerate(self.values)}
+
+    def copy(self) -> "Dictionary":
+        return Dictionary(self.values)
+
+    def encode(self, values) -> "np.ndarray":
+        codes = self.codes
+        encoded = np.empty(len(values), dtype=np.int32)
+        for i, value in enumerate(values):
+            if value is None:
+                encoded[i] = -1
+                continue
+            code = codes.get(value)
+            if code is None:
+                code = codes[value] = len(self.values)
+                self.values.append(value)
+            encoded[i] = code
+        return encoded
+
+    def code(self, value) -> int:
+        return self.codes.get(value, -1)
+
+    def __len__(self):
+        return len(self.values)
+
+
+def parse_bound(value: str) -> int:
+    """A start/end filter value as epoch microseconds (same wall clock as the SQL comparison)"""
+    parsed = datetime.fromisoformat(value.strip().replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(dt_timezone.utc).replace(tzinfo=None)
+    return (parsed - EPOCH) // timedelta(microseconds=1)
+
+
+def to_datetime(microseconds: int) -> datetime:
+    return EPOCH + timedelta(microseconds=int(microseconds))
+
+
+class ColumnarSnapshot:
+    """Immutable set of column arrays; refreshes build a new snapshot"""
+
+    def __init__(self, columns: Dict[str, "np.ndarray"], dictionaries: Dict[str, Dictionary],
+                 version=None):
+        self.columns = columns
+        self.dictionaries = dictionaries
+        self.version = version
+        self.size = len(columns['audit_datetime'])
+        ts = columns['audit_datetime']
+        self.valid_ts = ts != np.iinfo(np.int64).min
+        self.watermark: Optional[int] = int(ts[self.valid_ts].max()) if self.valid_ts.any() else None
+
+    @classmethod
+    def empty(cls) -> "ColumnarSnapshot":
+        columns = {name: np.empty(0, dtype=np.int32) for name in DICTIONARY_COLUMNS}
+        columns['audit_datetime'] = np.empty(0, dtype=np.int64)
+        columns['audio_duration'] = np.empty(0, dtype=np.float64)
+        return cls(columns, {name: Dictionary() for name in DICTIONARY_COLUMNS})
+
+    def append(self, batches: List[Dict[str, "np.ndarray"]], dictionaries: Dict[str, Dictionary],
+               version=None) -> "ColumnarSnapshot":
+        columns = {
+            name: np.concatenate([values] + [batch[name] for batch in batches])
+            for name, values in self.columns.items()
+        }
+        return ColumnarSnapshot(columns, dictionaries, version)
+
+    def nbytes(self) -> int:
+        return sum(values.nbytes for values in self.columns.values())
+
+    # Filters
+
+    def _equals(self, column: str, value) -> "np.ndarray":
+        code = self.dictionaries[column].code(value)
+        if code < 0:
+            return np.zeros(self.size, dtype=bool)
+        return self.columns[column] == code
+
+    def mask(self, start_date: Optional[str] = None, end_date: Optional[str] = None,
+             status: Optional[str] = None, user_id: Optional[str] = None,
+             tenant_ids: Optional[List[str]] = None) -> "np.ndarray":
+        """Boolean row mask equivalent to DatabaseService._build_filters"""
+        mask = np.ones(self.size, dtype=bool)
+        ts = self.columns['audit_datetime']
+        if start_date:
+            mask &= self.valid_ts & (ts >= parse_bound(start_date))
+        if end_date:
+            mask &= self.valid_ts & (ts <= parse_bound(end_date))
+        if status:
+            mask &= self._equals('status', status)
+        if user_id:
+            mask &= self._equals('user_id', user_id)
+        for tenant_id in tenant_ids or []:
+            if tenant_id:
+                mask &= self._equals('tenant_id', tenant_id)
+        return mask
+
+    def _completed(self, mask: "np.ndarray") -> "np.ndarray":
+        codes = [self.dictionaries['status'].code(value) for value in COMPLETED_STATUSES]
+        return mask & np.isin(self.columns['status'], [code for code in codes if code >= 0])
+
+    def _present(self, column: str) -> "np.ndarray":
+        """Rows where a dictionary column is neither NULL nor ''"""
+        codes = self.columns[column]
+        present = codes >= 0
+        empty = self.dictionaries[column].code('')
+        if empty >= 0:
+            present &= codes != empty
+        return present
+
+    def _distinct(self, column: str, mask: "np.ndarray") -> int:
+        """COUNT(DISTINCT NULLIF(column, '')) over the masked rows"""
+        return int(np.unique(self.columns[column][mask & self._present(column)]).size)
+
+    # Queries (same arguments and result shapes as DatabaseService)
+
+    def get_metrics(self, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                    status: Optional[str] = None, user_id: Optional[str] = None) -> List[Dict]:
+        mask = self.mask(start_date, end_date, status, user_id)
+        durations = self.columns['audio_duration'][mask]
+        durations = durations[~np.isnan(durations)]
+        return [{
+            "total_visits": int(mask.sum()),
+            "unique_patients": self._distinct('patient_id', mask),
+            "unique_users": self._distinct('user_id', mask),
+            "completed_notes": int(self._completed(mask).sum()),
+            "avg_duration": float(durations.mean()) if durations.size else None,
+        }]
+
+    def get_time_series(self, bucket: str = 'day', start_date: Optional[str] = None,
+                        end_date: Optional[str] = None, status: Optional[str] = None,
+                        user_id: Optional[str] = None) -> List[Dict]:
+        if bucket not in ('day', 'week', 'month'):
+            raise ValueError(f"Unknown time bucket: {bucket}")
+        mask = self.mask(start_date, end_date, status, user_id) & self.valid_ts
+        ts = self.columns['audit_datetime'][mask]
+        days = ts // US_PER_DAY
+        if bucket == 'day':
+            keys = days
+        elif bucket == 'week':
+            # 1970-01-01 was a Thursday; weeks start on Monday like date_trunc('week')
+            keys = days - (days + 3) % 7
+        else:
+            keys = ts.astype('datetime64[us]').astype('datetime64[M]').astype(np.int64)
+
+        buckets, inverse = np.unique(keys, return_inverse=True)
+        counts = np.bincount(inverse, minlength=buckets.size)
+        completed = np.bincount(inverse, weights=self._completed(mask)[mask], minlength=buckets.size)
+        durations = np.nan_to_num(self.columns['audio_duration'][mask])
+        duration_sums = np.bincount(inverse, weights=durations, minlength=buckets.size)
+
+        rows = []
+        for i, key in enumerate(buckets.tolist()):
+            if bucket == 'month':
+                start = datetime(1970 + key // 12, key % 12 + 1, 1)
+            else:
+                start = EPOCH + timedelta(days=key)
+            rows.append({
+                "bucket": start,
+                "count": int(counts[i]),
+                "completed_count": int(completed[i]),
+                "audio_minutes": float(duration_sums[i]) / 60.0,
+            })
+        return rows
+
+    def get_hourly_active_users(self, start_date: Optional[str] = None,
+                                end_date: Optional[str] = None,
+                                timezone: Optional[str] = None) -> List[Dict]:
+        users = self.columns['user_id']
+        mask = self.mask(start_date, end_date) & self.valid_ts & self._present('user_id')
+        hours, inverse = np.unique(self.columns['audit_datetime'][mask] // US_PER_HOUR, return_inverse=True)
+
+        if timezone and timezone.upper() != 'UTC':
+            if ZoneInfo is None:
+                raise ValueError("Time zone conversion needs zoneinfo (Python 3.9+)")
+            zone = ZoneInfo(timezone)
+            offsets = np.array([
+                (EPOCH + timedelta(hours=hour)).replace(tzinfo=dt_timezone.utc)
+                .astimezone(zone).utcoffset().total_seconds()
+                for hour in hours.tolist()
+            ], dtype=np.int64)
+            local_hours = (hours * 3600 + offsets) // 3600 % 24
+        else:
+            local_hours = hours % 24
+
+        row_hours = local_hours[inverse]
+        pairs = np.unique(row_hours * (len(self.dictionaries['user_id']) + 1) + users[mask])
+        active = np.bincount(pairs // (len(self.dictionaries['user_id']) + 1), minlength=24)
+        return [{"hour": hour, "active_users": int(active[hour])} for hour in range(24) if active[hour]]
+
+    def get_top_users(self, limit: int = 10, start_date: Optional[str] = None,
+                      end_date: Optional[str] = None, user_id: Optional[str] = None,
+                      tenant_ids: Optional[List[str]] = None) -> List[Dict]:
+        dictionary = self.dictionaries['user_id']
+        users = self.columns['user_id']
+        mask = self.mask(start_date, end_date, user_id=user_id, tenant_ids=tenant_ids) & (users >= 0)
+        empty = dictionary.code('')
+        if empty >= 0:
+            mask &= users != empty
+
+        codes = users[mask]
+        visits = np.bincount(codes, minlength=len(dictionary))
+        durations = np.bincount(codes, weights=np.nan_to_num(self.columns['audio_duration'][mask]),
+                                minlength=len(dictionary))
+        last_active = np.full(len(dictionary), np.iinfo(np.int64).min, dtype=np.int64)
+        np.maximum.at(last_active, codes, self.columns['audit_datetime'][mask])
+
+        candidates = np.nonzero(visits)[0].tolist()
+        candidates.sort(key=lambda code: (-int(visits[code]), dictionary.values[code]))
+        return [
+            {
+                "user_id": dictionary.values[code],
+                "visits": int(visits[code]),
+                "total_duration": float(durations[code]),
+                "last_active": None if last_active[code] == np.iinfo(np.int64).min
+                else to_datetime(last_active[code]),
+            }
+            for code in candidates[:limit]
+        ]
+
+
+class ColumnarCache:
+    """
+    Holds the current ColumnarSnapshot for one table and keeps it up to date.
+    Query methods named in SERVED run against the snapshot.
+    """
+    SERVED = ('get_metrics', 'get_time_series', 'get_hourly_active_users', 'get_top_users')
+
+    def __init__(self, batch_size: int = 50000):
+        if np is None:
+            raise RuntimeError("The columnar cache requires numpy")
+        self.batch_size = batch_size
+        self.snapshot: Optional[ColumnarSnapshot] = None
+        self.latest_version = None
+        self._refresh_lock = threading.Lock()
+        self._stats = {"full_builds": 0, "incremental_refreshes": 0, "rows_appended": 0,
+                       "served": 0, "fallbacks": 0, "last_refresh_ms": None, "last_refreshed_at": None}
+
+    @property
+    def current(self) -> bool:
+        """Whether the snapshot reflects the newest data version observed so far"""
+        return self.snapshot is not None and self.snapshot.version == self.latest_version
+
+    def observe_version(self, version):
+        """Record the data version seen by any caller (e.g. the result cache's check)"""
+        self.latest_version = version
+
+    def serves(self, name: str) -> bool:
+        return name in self.SERVED and self.current
+
+    def query(self, name: str, *args, **kwargs):
+        self._stats["served"] += 1
+        return getattr(self.snapshot, name)(*args, **kwargs)
+
+    def record_fallback(self):
+        self._stats["fallbacks"] += 1
+
+    # Loading
+
+    def _select(self, db) -> str:
+        available = set(db.get_table_columns())
+        select = [
+            "CAST(audit_datetime AS TIMESTAMP)",
+            "CAST(audio_duration AS FLOAT)" if 'audio_duration' in available else "NULL",
+        ]
+        for name in DICTIONARY_COLUMNS:
+            select.append(f"CAST({name} AS TEXT)" if name in available else "NULL")
+        return ", ".join(select)
+
+    def _load(self, db, dictionaries: Dict[str, Dictionary], after: Optional[int]) -> List[Dict]:
+        """Read rows (newer than the after watermark) into per-batch column arrays"""
+        query = f"SELECT {self._select(db)} FROM {db.table_name}"
+        params = []
+        if after is not None:
+            query += " WHERE CAST(audit_datetime AS TIMESTAMP) > %s"
+            params.append(to_datetime(after))
+        batches = []
+        for _, rows in db._iter_batches(query, params, self.batch_size):
+            if not rows:
+                continue
+            values = list(zip(*rows))
+            batch = {
+                'audit_datetime': np.array(values[0], dtype='datetime64[us]').astype(np.int64),
+                'audio_duration': np.array(values[1], dtype=np.float64),
+            }
+            for i, name in enumerate(DICTIONARY_COLUMNS):
+                batch[name] = dictionaries[name].encode(values[i + 2])
+            batches.append(batch)
+        return batches
+
+    def refresh(self, db) -> str:
+        """
+        Bring the snapshot up to date with the table: append rows past the watermark,
+        or rebuild from scratch when there is no snapshot or the counts disagree.
+        Returns 'full', 'incremental' or 'current'.
+        """
+        with self._refresh_lock:
+            started = time.perf_counter()
+            version = db.get_data_version()
+            self.observe_version(version)
+            snapshot = self.snapshot
+            if snapshot is not None and version is not None and snapshot.version == version:
+                return 'current'
+
+            kind = 'full'
+            if snapshot is not None and snapshot.watermark is not None:
+                dictionaries = {name: d.copy() for name, d in snapshot.dictionaries.items()}
+                batches = self._load(db, dictionaries, snapshot.watermark)
+                candidate = snapshot.append(batches, dictionaries, version)
+                if candidate.size == db.get_count('exact'):
+                    kind = 'incremental'
+                    self._stats["rows_appended"] += candidate.size - snapshot.size
+                    self.snapshot = candidate
+
+            if kind == 'full':
+                dictionaries = {name: Dictionary() for name in DICTIONARY_COLUMNS}
+                batches = self._load(db, dictionaries, None)
+                self.snapshot = ColumnarSnapshot.empty().append(batches, dictionaries, version)
+
+            self._stats["full_builds" if kind == 'full' else "incremental_refreshes"] += 1
+            self._stats["last_refresh_ms"] = round((time.perf_counter() - started) * 1000, 1)
+            self._stats["last_refreshed_at"] = datetime.now().isoformat()
+            return kind
+
+    async def run_refresher(self, async_db, interval: float):
+        """Background loop: build the snapshot, then refresh it every interval seconds"""
+        while True:
+            try:
+                await async_db.run(self.refresh, async_db.db)
+            except Exception as e:
+                print(f"Error refreshing columnar cache: {e}")
+            await asyncio.sleep(interval)
+
+    def stats(self) -> Dict:
+        snapshot = self.snapshot
+        stats = dict(self._stats)
+        stats.update({
+            "ready": snapshot is not None,
+            "current": self.current,
+            "rows": snapshot.size if snapshot else 0,
+            "memory_mb": round(snapshot.nbytes() / (1024 * 1024), 1) if snapshot else 0.0,
+            "version": snapshot.version if snapshot else None,
+            "watermark": to_datetime(snapshot.watermark).isoformat()
+            if snapshot and snapshot.watermark is not None else None,
+        })
+        return stats
@@ -0,0 +1,199 @@
+"""
+PostgreSQL Connection Pool
+Thread-safe pool of psycopg2 connections with bounded size, checkout timeouts,
+health checks, idle recycling and a maximum connection lifetime
+"""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict
+
+import psycopg2
+from psycopg2 import extensions
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes available within the checkout timeout"""
+
+
+class ConnectionPool:
+    def __init__(self, minconn: int = 1, maxconn: int = 10, timeout: float = 30.0,
+                 max_idle: float = 300.0, max_lifetime: float = 3600.0,
+                 health_check_after: float = 30.0, **connect_kwargs):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError(f"Invalid pool size: min={minconn}, max={maxconn}")
+
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.health_check_after = health_check_after
+        self.connect_kwargs = connect_kwargs
+
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(maxconn)
+        # Idle connections as (connection, created_at, last_used_at), most recent last
+        self._idle = deque()
+        self._created_at: Dict[int, float] = {}
+        self._in_use = 0
+        self._stats = {
+            "checkouts": 0,
+            "timeouts": 0,
+            "total_wait_ms": 0.0,
+            "max_wait_ms": 0.0,
+            "connections_created": 0,
+            "connections_closed": 0,
+            "health_check_failures": 0,
+        }
+        self._prefilled = False
+
+    def _connect(self):
+        conn = psycopg2.connect(**self.connect_kwargs)
+        with self._lock:
+            self._created_at[id(conn)] = time.monotonic()
+            self._stats["connections_created"] += 1
+        return conn
+
+    def _discard(self, conn):
+        with self._lock:
+            self._created_at.pop(id(conn), None)
+            self._stats["connections_closed"] += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _prefill(self):
+        """Open the minimum number of connections on first use"""
+        with self._lock:
+            if self._prefilled:
+                return
+            self._prefilled = True
+            missing = self.minconn - len(self._idle)
+        for _ in range(max(missing, 0)):
+            conn = self._connect()
+            now = time.monotonic()
+            with self._lock:
+                self._idle.append((conn, now, now))
+
+    def _is_usable(self, conn, created_at: float, last_used: float) -> bool:
+        now = time.monotonic()
+        if conn.closed:
+            return False
+        if self.max_lifetime and now - created_at > self.max_lifetime:
+            return False
+        if self.max_idle and now - last_used > self.max_idle:
+            return False
+        if self.health_check_after is not None and now - last_used > self.health_check_after:
+            try:
+                cursor = conn.cursor()
+                cursor.execute("SELECT 1")
+                cursor.fetchone()
+                cursor.close()
+                conn.rollback()
+            except Exception:
+                with self._lock:
+                    self._stats["health_check_failures"] += 1
+                return False
+        return True
+
+    def getconn(self):
+        """Check out a connection, waiting up to the pool timeout for a free slot"""
+        if not self._prefilled:
+            self._prefill()
+
+        started = time.monotonic()
+        if not self._slots.acquire(timeout=self.timeout):
+            with self._lock:
+                self._stats["timeouts"] += 1
+            raise PoolTimeout(
+                f"Timed out after {self.timeout}s waiting for a database connection "
+                f"(pool max size {self.maxconn})"
+            )
+        wait_ms = (time.monotonic() - started) * 1000
+
+        try:
+            conn = None
+            while conn is None:
+                with self._lock:
+                    entry = self._idle.pop() if self._idle else None
+                if entry is None:
+                    conn = self._connect()
+                elif self._is_usable(*entry):
+                    conn = entry[0]
+                else:
+                    self._discard(entry[0])
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._in_use += 1
+            self._stats["checkouts"] += 1
+            self._stats["total_wait_ms"] += wait_ms
+            self._stats["max_wait_ms"] = max(self._stats["max_wait_ms"], wait_ms)
+        return conn
+
+    def putconn(self, conn, close: bool = False):
+        """Return a connection to the pool, resetting any open transaction"""
+        try:
+            if not close and not conn.closed:
+                status = conn.get_transaction_status()
+                if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                    close = True
+                elif status != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+        except Exception:
+            close = True
+
+        with self._lock:
+            self._in_use -= 1
+            created_at = self._created_at.get(id(conn), time.monotonic())
+            expired = self.max_lifetime and time.monotonic() - created_at > self.max_lifetime
+        if close or conn.closed or expired:
+            self._discard(conn)
+        else:
+            with self._lock:
+                self._idle.append((conn, created_at, time.monotonic()))
+        self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """Context manager that checks out a connection and always returns it"""
+        conn = self.getconn()
+        broken = False
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            raise
+        finally:
+            self.putconn(conn, close=broken)
+
+    def stats(self) -> Dict:
+        """Return pool usage counters for sizing under load"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({
+                "min_size": self.minconn,
+                "max_size": self.maxconn,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "size": self._in_use + len(self._idle),
+            })
+        checkouts = stats["checkouts"]
+        stats["avg_wait_ms"] = round(stats["total_wait_ms"] / checkouts, 3) if checkouts else 0.0
+        stats["total_wait_ms"] = round(stats["total_wait_ms"], 3)
+        stats["max_wait_ms"] = round(stats["max_wait_ms"], 3)
+        return stats
+
+    def closeall(self):
+        """Close every idle connection; checked-out connections close when returned"""
+        with self._lock:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._prefilled = False
+        for conn, _, _ in idle:
+            self._discard(conn)
@@ -1,16 +1,45 @@
 """
 PostgreSQL Database Service
-Connects to RDS PostgreSQL and provides data access methods
+Connects to RDS PostgreSQL and provides data access methods.
+With DATABASE_BACKEND=duckdb the same methods run on an embedded DuckDB
+database over a directory of parquet files instead (see duckdb_backend.py).
 """
 import os
+import asyncio
+import base64
+import functools
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 import psycopg2
 from psycopg2.extras import RealDictCursor
-from typing import List, Dict, Optional
+from datetime import date, datetime
+from typing import List, Dict, Iterator, Optional, Tuple, Union
 from dotenv import load_dotenv
 
+from aggregation import AggregationPlan, Count, Max, Sum, TopK
+from columnar_cache import ColumnarCache
+from duckdb_backend import DuckDBBackend, duckdb
+from connection_pool import ConnectionPool
+from single_flight import SingleFlight
+
 load_dotenv()
 
 class DatabaseService:
+    # Pools are shared by every DatabaseService instance with the same connection settings
+    _pools: Dict[tuple, ConnectionPool] = {}
+    _pools_lock = threading.Lock()
+    # Column names per table, read once from information_schema
+    _table_columns: Dict[str, List[str]] = {}
+    # Filter option values per table: (version, values, checked_at)
+    _dimension_cache: Dict[str, tuple] = {}
+    _dimension_lock = threading.Lock()
+    # Whether the loader-maintained rollups cover a table: (ready, checked_at)
+    _rollup_state: Dict[str, tuple] = {}
+
     def __init__(self):
         self.db_host = os.getenv('DB_HOST')
         self.db_port = os.getenv('DB_PORT', '5432')
@@ -18,6 +47,32 @@ class DatabaseService:
         self.db_user = os.getenv('DB_USER')
         self.db_password = os.getenv('DB_PASSWORD')
         self.table_name = os.getenv('TABLE_NAME', 'audittrail_firehose')
+        self.itersize = int(os.getenv('DB_STREAM_ITERSIZE', '2000'))
+        self.aggregation_mode = os.getenv('AGGREGATION_MODE', 'sql')
+        self.timezone = os.getenv('DASHBOARD_TIMEZONE', 'UTC')
+        self.load_stats_table = os.getenv('LOAD_STATS_TABLE', 'table_load_stats')
+        self.dimensions_table = os.getenv('DIMENSIONS_TABLE', 'table_dimensions')
+        self.rollup_table = os.getenv('ROLLUP_TABLE', 'table_rollups')
+        self.use_rollups = os.getenv('USE_ROLLUPS', 'true').lower() in ('1', 'true', 'yes')
+        self.dimension_cache_ttl = float(os.getenv('DIMENSION_CACHE_TTL', '30'))
+        self.default_page_size = int(os.getenv('DATA_PAGE_SIZE', '1000'))
+        self.max_page_size = int(os.getenv('DATA_MAX_PAGE_SIZE', '10000'))
+        
+        self.backend = os.getenv('DATABASE_BACKEND', 'postgres').lower()
+        if self.backend not in ('postgres', 'duckdb'):
+            raise ValueError(f"Unknown DATABASE_BACKEND: {self.backend}")
+        # Errors that mean "this query cannot run here" (e.g. a bookkeeping table is missing)
+        self.query_errors: tuple = (psycopg2.Error,)
+        self.duckdb: Optional[DuckDBBackend] = None
+        if self.backend == 'duckdb':
+            parquet_dir = os.getenv('PARQUET_DIR')
+            if not parquet_dir and not os.getenv('PARQUET_GLOB'):
+                raise ValueError("DATABASE_BACKEND=duckdb requires PARQUET_DIR (or PARQUET_GLOB)")
+            self.duckdb = DuckDBBackend.shared(parquet_dir or '', self.table_name)
+            self.query_errors = (psycopg2.Error, duckdb.Error)
+            # The loaders' bookkeeping tables only exist in PostgreSQL
+            self.use_rollups = False
+            return
         
         # Validate required environment variables
         if not all([self.db_host, self.db_name, self.db_user, self.db_password]):
@@ -27,8 +82,35 @@ class DatabaseService:
                 "See env.example for reference."
             )
     
+    @property
+    def pool(self) -> ConnectionPool:
+        """Shared connection pool for these connection settings, created on first use"""
+        key = (self.db_host, self.db_port, self.db_name, self.db_user)
+        pool = DatabaseService._pools.get(key)
+        if pool is None:
+            with DatabaseService._pools_lock:
+                pool = DatabaseService._pools.get(key)
+                if pool is None:
+                    pool = ConnectionPool(
+                        minconn=int(os.getenv('DB_POOL_MIN_SIZE', '1')),
+                        maxconn=int(os.getenv('DB_POOL_MAX_SIZE', '10')),
+                        timeout=float(os.getenv('DB_POOL_TIMEOUT', '30')),
+                        max_idle=float(os.getenv('DB_POOL_MAX_IDLE', '300')),
+                        max_lifetime=float(os.getenv('DB_POOL_MAX_LIFETIME', '3600')),
+                        health_check_after=float(os.getenv('DB_POOL_HEALTH_CHECK_AFTER', '30')),
+                        host=self.db_host,
+                        port=self.db_port,
+                        database=self.db_name,
+                        user=self.db_user,
+                        password=self.db_password
+                    )
+                    DatabaseService._pools[key] = pool
+        return pool
+    
     def get_connection(self):
-        """Create and return a PostgreSQL database connection"""
+        """Create and return a new, unpooled PostgreSQL database connection"""
+        if self.duckdb is not None:
+            return self.duckdb.database.cursor()
         return psycopg2.connect(
             host=self.db_host,
             port=self.db_port,
@@ -37,103 +119,763 @@ class DatabaseService:
             password=self.db_password
         )
     
+    @contextmanager
+    def connection(self):
+        """Check out a pooled connection for the duration of the block"""
+        if self.duckdb is not None:
+            with self.duckdb.connection() as conn:
+                yield conn
+            return
+        with self.pool.connection() as conn:
+            yield conn
+    
+    def _fetch_all(self, query: str, params: Optional[list] = None) -> List[Dict]:
+        """Run a query on a pooled connection and return all rows as dicts"""
+        if self.duckdb is not None:
+            return self.duckdb.fetch_all(query, params)
+        with self.connection() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                cursor.execute(query, params or [])
+                # RealDictRow is already a dict, so rows are returned without copying
+                return cursor.fetchall()
+    
+    def _fetch_one(self, query: str, params: Optional[list] = None) -> Optional[Dict]:
+        """Run a query on a pooled connection and return the first row as a dict"""
+        if self.duckdb is not None:
+            return self.duckdb.fetch_one(query, params)
+        with self.connection() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                cursor.execute(query, params or [])
+                return cursor.fetchone()
+    
+    def _iter_rows(self, query: str, params: Optional[list] = None,
+                   itersize: Optional[int] = None) -> Iterator[Dict]:
+        """
+        Stream rows through a named server-side cursor, fetching itersize rows per round trip.
+        The pooled connection is held until the iterator is exhausted or closed.
+        """
+        if self.duckdb is not None:
+            yield from self.duckdb.iter_rows(query, params, itersize or self.itersize)
+            return
+        with self.connection() as conn:
+            with conn.cursor(name=f"stream_{uuid.uuid4().hex}", cursor_factory=RealDictCursor) as cursor:
+                cursor.itersize = itersize or self.itersize
+                cursor.execute(query, params or [])
+                for row in cursor:
+                    yield row
+    
+    def _iter_batches(self, query: str, params: Optional[list] = None,
+                      batch_size: Optional[int] = None) -> Iterator[Tuple[tuple, List[tuple]]]:
+        """
+        Stream (cursor.description, rows) batches of plain tuples from a named
+        server-side cursor, for columnar consumers that need the result's column
+        names and type OIDs. At least one (possibly empty) batch is yielded.
+        """
+        batch_size = batch_size or self.itersize
+        if self.duckdb is not None:
+            yield from self.duckdb.iter_batches(query, params, batch_size)
+            return
+        with self.connection() as conn:
+            with conn.cursor(name=f"batches_{uuid.uuid4().hex}") as cursor:
+                cursor.itersize = batch_size
+                cursor.execute(query, params or [])
+                # A named cursor only has a description after its first fetch
+                rows = cursor.fetchmany(batch_size)
+                description = cursor.description
+                yield description, rows
+                while len(rows) == batch_size:
+                    rows = cursor.fetchmany(batch_size)
+                    if rows:
+                        yield description, rows
+    
+    def get_pool_stats(self) -> Dict:
+        """Get connection pool usage counters (checkouts, wait times, size)"""
+        if self.duckdb is not None:
+            return self.duckdb.stats()
+        return self.pool.stats()
+    
+    def get_table_columns(self) -> List[str]:
+        """Get the column names of the audit table in ordinal order (cached per process)"""
+        columns = DatabaseService._table_columns.get(self.table_name)
+        if columns is None:
+            rows = self._fetch_all(
+                """
+                SELECT column_name FROM information_schema.columns
+                WHERE table_schema = current_schema() AND table_name = %s
+                ORDER BY ordinal_position
+                """,
+                [self.table_name]
+            )
+            columns = [row['column_name'] for row in rows]
+            if columns:
+                DatabaseService._table_columns[self.table_name] = columns
+        return columns
+    
+    def resolve_columns(self, columns: Union[str, List[str], None],
+                        strict: bool = True) -> Optional[List[str]]:
+        """
+        Validate a column projection against the table schema.
+        Accepts a list or a comma-separated string; None means all columns.
+        Unknown columns raise ValueError when strict, otherwise they are dropped.
+        """
+        if columns is None:
+            return None
+        if isinstance(columns, str):
+            columns = [c.strip() for c in columns.split(',')]
+        requested = list(dict.fromkeys(c for c in columns if c))
+        if not requested:
+            return None
+        
+        known = set(self.get_table_columns())
+        unknown = [c for c in requested if c not in known]
+        if unknown and strict:
+            raise ValueError(f"Unknown column(s) for {self.table_name}: {', '.join(unknown)}")
+        
+        return [c for c in requested if c in known] or None
+    
+    def _select_list(self, columns: Optional[List[str]]) -> str:
+        """Render a validated column list as a quoted SELECT list"""
+        if not columns:
+            return "*"
+        return ", ".join(f'"{c}"' for c in columns)
+    
+    def _build_filters(self, start_date: Optional[str] = None,
+                       end_date: Optional[str] = None,
+                       status: Optional[str] = None,
+                       user_id: Optional[str] = None,
+                       tenant_ids: Optional[List[str]] = None):
+        """
+        Build the WHERE clause and parameters shared by the data queries.
+        Every entry in tenant_ids must match (program and location both filter tenant_id).
+        """
+        query = " WHERE 1=1"
+        params = []
+        
+        if start_date:
+            query += " AND audit_datetime >= %s"
+            params.append(start_date)
+        if end_date:
+            query += " AND audit_datetime <= %s"
+            params.append(end_date)
+        if status:
+            query += " AND status = %s"
+            params.append(status)
+        if user_id:
+            query += " AND user_id = %s"
+            params.append(user_id)
+        for tenant_id in tenant_ids or []:
+            if tenant_id:
+                query += " AND tenant_id = %s"
+                params.append(tenant_id)
+        
+        return query, params
+    
+    def _build_data_query(self, limit: Optional[int] = None,
+                          start_date: Optional[str] = None,
+                          end_date: Optional[str] = None,
+                          status: Optional[str] = None,
+                          user_id: Optional[str] = None,
+                          columns: Optional[List[str]] = None):
+        """Build the SELECT used by get_all_data and iter_all_data"""
+        where, params = self._build_filters(start_date, end_date, status, user_id)
+        query = (
+            f"SELECT {self._select_list(columns)} FROM {self.table_name}{where} "
+            "ORDER BY audit_datetime DESC"
+        )
+        
+        if limit:
+            query += " LIMIT %s"
+            params.append(limit)
+        
+        return query, params
+    
     def get_all_data(self, limit: Optional[int] = None, 
                     start_date: Optional[str] = None,
                     end_date: Optional[str] = None,
                     status: Optional[str] = None,
-                    user_id: Optional[str] = None) -> List[Dict]:
-        """Get all data from audit_trail_data table"""
+                    user_id: Optional[str] = None,
+                    columns: Union[str, List[str], None] = None,
+                    strict_columns: bool = False) -> List[Dict]:
+        """
+        Get all data from audit_trail_data table.
+        Pass columns to select only those fields instead of SELECT *; unknown
+        columns are dropped, or raise ValueError when strict_columns is set.
+        """
+        columns = self.resolve_columns(columns, strict=strict_columns)
+        query, params = self._build_data_query(limit, start_date, end_date, status, user_id, columns)
+        return self._fetch_all(query, params)
+    
+    def iter_all_data(self, limit: Optional[int] = None,
+                      start_date: Optional[str] = None,
+                      end_date: Optional[str] = None,
+                      status: Optional[str] = None,
+                      user_id: Optional[str] = None,
+                      columns: Union[str, List[str], None] = None,
+                      strict_columns: bool = False,
+                      itersize: Optional[int] = None) -> Iterator[Dict]:
+        """
+        Stream the same rows as get_all_data from a server-side cursor.
+        Memory stays constant in the number of rows, so callers can fold
+        large ranges into aggregates. Errors propagate to the caller.
+        """
+        columns = self.resolve_columns(columns, strict=strict_columns)
+        query, params = self._build_data_query(limit, start_date, end_date, status, user_id, columns)
+        return self._iter_rows(query, params, itersize)
+    
+    def iter_data_batches(self, limit: Optional[int] = None,
+                          start_date: Optional[str] = None,
+                          end_date: Optional[str] = None,
+                          status: Optional[str] = None,
+                          user_id: Optional[str] = None,
+                          columns: Union[str, List[str], None] = None,
+                          strict_columns: bool = False,
+                          batch_size: Optional[int] = None) -> Iterator[Tuple[tuple, List[tuple]]]:
+        """
+        Stream the same rows as get_all_data as (cursor.description, tuples) batches,
+        e.g. for Arrow / Parquet output. Errors propagate to the caller.
+        """
+        columns = self.resolve_columns(columns, strict=strict_columns)
+        query, params = self._build_data_query(limit, start_date, end_date, status, user_id, columns)
+        return self._iter_batches(query, params, batch_size)
+    
+    @staticmethod
+    def encode_cursor(audit_datetime, pk) -> str:
+        """Encode a keyset position as an opaque, URL-safe cursor token"""
+        if isinstance(audit_datetime, (datetime, date)):
+            audit_datetime = audit_datetime.isoformat()
+        payload = json.dumps([audit_datetime, pk], default=str, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+    
+    @staticmethod
+    def decode_cursor(cursor: str):
+        """Decode a cursor token into its (audit_datetime, pk) keyset position"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor(cursor_factory=RealDictCursor)
-            
-            query = f"SELECT * FROM {self.table_name} WHERE 1=1"
-            params = []
-            
-            if start_date:
-                query += f" AND audit_datetime >= %s"
-                params.append(start_date)
-            if end_date:
-                query += f" AND audit_datetime <= %s"
-                params.append(end_date)
-            if status:
-                query += f" AND status = %s"
-                params.append(status)
-            if user_id:
-                query += f" AND user_id = %s"
-                params.append(user_id)
-            
-            query += " ORDER BY audit_datetime DESC"
-            
-            if limit:
-                query += f" LIMIT %s"
-                params.append(limit)
-            
-            cursor.execute(query, params)
-            results = cursor.fetchall()
-            
-            cursor.close()
-            conn.close()
-            
-            return [dict(row) for row in results]
-        except Exception as e:
-            print(f"Error getting data: {e}")
-            return []
+            padded = cursor + '=' * (-len(cursor) % 4)
+            audit_datetime, pk = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            return audit_datetime, pk
+        except Exception:
+            raise ValueError("Invalid cursor")
+    
+    def get_page(self, page_size: Optional[int] = None,
+                 cursor: Optional[str] = None,
+                 start_date: Optional[str] = None,
+                 end_date: Optional[str] = None,
+                 status: Optional[str] = None,
+                 user_id: Optional[str] = None,
+                 columns: Union[str, List[str], None] = None,
+                 strict_columns: bool = True) -> Dict:
+        """
+        Get one page of data using keyset pagination on (audit_datetime, pk).
+        Rows are ordered newest first; pass the returned next_cursor to fetch the
+        following page. Every page costs one index range scan regardless of depth.
+        Rows without an audit_datetime have no keyset position and are skipped.
+        """
+        page_size = min(max(int(page_size or self.default_page_size), 1), self.max_page_size)
+        columns = self.resolve_columns(columns, strict=strict_columns)
+        select_columns = None
+        if columns:
+            select_columns = columns + [c for c in ('audit_datetime', 'pk') if c not in columns]
+        
+        where, params = self._build_filters(start_date, end_date, status, user_id)
+        where += " AND audit_datetime IS NOT NULL"
+        if cursor:
+            after_datetime, after_pk = self.decode_cursor(cursor)
+            if self.duckdb is not None:
+                # DuckDB compares row values as typed structs, so expand the comparison
+                where += " AND (audit_datetime < %s OR (audit_datetime = %s AND pk < %s))"
+                params.extend([after_datetime, after_datetime, after_pk])
+            else:
+                where += " AND (audit_datetime, pk) < (%s, %s)"
+                params.extend([after_datetime, after_pk])
+        
+        query = (
+            f"SELECT {self._select_list(select_columns)} FROM {self.table_name}{where} "
+            "ORDER BY audit_datetime DESC, pk DESC LIMIT %s"
+        )
+        # Fetch one extra row to learn whether another page exists
+        params.append(page_size + 1)
+        rows = self._fetch_all(query, params)
+        
+        next_cursor = None
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            last = rows[-1]
+            next_cursor = self.encode_cursor(last['audit_datetime'], last['pk'])
+        
+        if columns and select_columns != columns:
+            rows = [{c: row[c] for c in columns} for row in rows]
+        
+        return {
+            "data": rows,
+            "page_size": page_size,
+            "next_cursor": next_cursor
+        }
     
-    def get_count(self) -> int:
-        """Get total count of records"""
+    def get_load_stats(self) -> Optional[Dict]:
+        """
+        Get the maintained load statistics (row_count, load_count, last_loaded_at)
+        written by the parquet loaders, or None if they have not run yet
+        """
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            cursor.execute(f"SELECT COUNT(*) FROM {self.table_name}")
-            count = cursor.fetchone()[0]
-            cursor.close()
-            conn.close()
-            return count
-        except Exception as e:
-            print(f"Error getting count: {e}")
-            return 0
+            return self._fetch_one(
+                f"SELECT row_count, load_count, last_loaded_at FROM {self.load_stats_table} "
+                "WHERE table_name = %s",
+                [self.table_name]
+            )
+        except self.query_errors:
+            return None
+    
+    def get_count(self, mode: str = 'exact',
+                  start_date: Optional[str] = None,
+                  end_date: Optional[str] = None,
+                  status: Optional[str] = None,
+                  user_id: Optional[str] = None) -> int:
+        """
+        Get total count of records.
+        mode='estimate' reads the planner's row estimate from pg_class, summed over the
+        monthly partitions when the table is partitioned (instant, approximate).
+        mode='exact' reads the row count maintained by the parquet loaders, falling back
+        to COUNT(*) when it is not available.
+        mode='filtered' (or any filter argument) runs COUNT(*) with the get_all_data filters.
+        """
+        if mode not in ('estimate', 'exact', 'filtered'):
+            raise ValueError(f"Unknown count mode: {mode}")
+        has_filters = any([start_date, end_date, status, user_id])
+        
+        if mode == 'estimate' and not has_filters and self.duckdb is None:
+            # A partitioned parent's own reltuples already covers its partitions once
+            # it has been analyzed, so only plain tables and the partitions are summed
+            result = self._fetch_one(
+                "SELECT COALESCE(SUM(GREATEST(reltuples, 0)), 0)::BIGINT AS count FROM pg_class "
+                "WHERE (oid = to_regclass(%s) AND relkind = 'r') "
+                "OR oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = to_regclass(%s))",
+                [self.table_name, self.table_name]
+            )
+            # reltuples is -1 (or 0) until the table has been vacuumed/analyzed
+            if result and result['count'] > 0:
+                return result['count']
+        
+        if mode in ('estimate', 'exact') and not has_filters:
+            stats = self.get_load_stats()
+            if stats is not None:
+                return stats['row_count']
+        
+        where, params = self._build_filters(start_date, end_date, status, user_id)
+        result = self._fetch_one(f"SELECT COUNT(*) AS count FROM {self.table_name}{where}", params)
+        return result['count'] if result else 0
     
     def get_metrics(self, start_date: Optional[str] = None, 
-                   end_date: Optional[str] = None) -> List[Dict]:
-        """Get dashboard metrics"""
+                   end_date: Optional[str] = None,
+                   status: Optional[str] = None,
+                   user_id: Optional[str] = None) -> List[Dict]:
+        """Get dashboard metrics as a single aggregate row"""
+        where, params = self._build_filters(start_date, end_date, status, user_id)
+        query = f"""
+            SELECT 
+                COUNT(*) as total_visits,
+                COUNT(DISTINCT NULLIF(CAST(patient_id AS TEXT), '')) as unique_patients,
+                COUNT(DISTINCT NULLIF(CAST(user_id AS TEXT), '')) as unique_users,
+                COALESCE(SUM(CASE WHEN status = 'completed' OR status = 'FINALIZED' THEN 1 ELSE 0 END), 0) as completed_notes,
+                AVG(CAST(audio_duration AS FLOAT)) as avg_duration
+            FROM {self.table_name}{where}
+        """
+        
+        result = self._fetch_one(query, params)
+        
+        if result:
+            return [result]
+        return []
+    
+    def rollups_ready(self) -> bool:
+        """Whether loader-maintained rollups exist for this table (rechecked every minute)"""
+        if not self.use_rollups:
+            return False
+        cached = DatabaseService._rollup_state.get(self.table_name)
+        if cached and time.monotonic() - cached[1] < 60:
+            return cached[0]
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor(cursor_factory=RealDictCursor)
-            
-            query = f"""
-                SELECT 
-                    COUNT(*) as total_visits,
-                    COUNT(DISTINCT patient_id) as unique_patients,
-                    COUNT(DISTINCT user_id) as unique_users,
-                    SUM(CASE WHEN status = 'completed' OR status = 'FINALIZED' THEN 1 ELSE 0 END) as completed_notes,
-                    AVG(CAST(audio_duration AS FLOAT)) as avg_duration
-                FROM {self.table_name}
-                WHERE 1=1
+            result = self._fetch_one(
+                f"SELECT EXISTS (SELECT 1 FROM {self.rollup_table} WHERE table_name = %s) as ready",
+                [self.table_name]
+            )
+            ready = bool(result and result['ready'])
+        except self.query_errors:
+            ready = False
+        DatabaseService._rollup_state[self.table_name] = (ready, time.monotonic())
+        return ready
+    
+    @staticmethod
+    def _is_day_aligned(value: Optional[str]) -> bool:
+        """True for missing bounds and plain YYYY-MM-DD dates"""
+        if not value:
+            return True
+        try:
+            datetime.strptime(value, '%Y-%m-%d')
+            return True
+        except ValueError:
+            return False
+    
+    def _time_series_from_rollups(self, bucket: str,
+                                  start_date: Optional[str] = None,
+                                  end_date: Optional[str] = None,
+                                  status: Optional[str] = None,
+                                  user_id: Optional[str] = None) -> List[Dict]:
+        """
+        Time series from the daily rollups. Daily buckets cover [start_date, end_date);
+        events stamped exactly at end_date midnight (included by the raw <= filter)
+        are added from the audit table with an indexed equality lookup.
+        """
+        rollup_where = " WHERE table_name = %s AND grain = 'day'"
+        rollup_params = [self.table_name]
+        if start_date:
+            rollup_where += " AND bucket >= %s"
+            rollup_params.append(start_date)
+        if end_date:
+            rollup_where += " AND bucket < %s"
+            rollup_params.append(end_date)
+        if status:
+            rollup_where += " AND status = %s"
+            rollup_params.append(status)
+        if user_id:
+            rollup_where += " AND user_id = %s"
+            rollup_params.append(user_id)
+        
+        boundary = ""
+        boundary_params = []
+        if end_date:
+            where, boundary_params = self._build_filters(status=status, user_id=user_id)
+            boundary = f"""
+                UNION ALL
+                SELECT CAST(audit_datetime AS TIMESTAMP), CAST(status AS TEXT), 1,
+                       COALESCE(CAST(audio_duration AS FLOAT), 0)
+                FROM {self.table_name}{where} AND audit_datetime = %s
             """
-            params = []
-            
-            if start_date:
-                query += " AND audit_datetime >= %s"
-                params.append(start_date)
-            if end_date:
-                query += " AND audit_datetime <= %s"
-                params.append(end_date)
-            
-            cursor.execute(query, params)
-            result = cursor.fetchone()
-            
-            cursor.close()
-            conn.close()
+            boundary_params.append(end_date)
+        
+        query = f"""
+            SELECT
+                date_trunc(%s, bucket) as bucket,
+                CAST(SUM(event_count) AS BIGINT) as count,
+                CAST(COALESCE(SUM(event_count) FILTER (WHERE status IN ('completed', 'FINALIZED')), 0) AS BIGINT) as completed_count,
+                COALESCE(SUM(audio_duration_sum), 0) / 60.0 as audio_minutes
+            FROM (
+                SELECT bucket, status, event_count, audio_duration_sum
+                FROM {self.rollup_table}{rollup_where}
+                {boundary}
+            ) as events
+            GROUP BY 1
+            ORDER BY 1
+        """
+        return self._fetch_all(query, [bucket] + rollup_params + boundary_params)
+    
+    def get_time_series(self, bucket: str = 'day',
+                        start_date: Optional[str] = None,
+                        end_date: Optional[str] = None,
+                        status: Optional[str] = None,
+                        user_id: Optional[str] = None) -> List[Dict]:
+        """
+        Get event counts bucketed by day, week or month, grouped in the database.
+        Each row has bucket (timestamp), count, completed_count and audio_minutes.
+        Day-aligned ranges are served from the daily rollups when the loaders maintain them.
+        """
+        if bucket not in ('day', 'week', 'month'):
+            raise ValueError(f"Unknown time bucket: {bucket}")
+        if (self._is_day_aligned(start_date) and self._is_day_aligned(end_date)
+                and self.rollups_ready()):
+            return self._time_series_from_rollups(bucket, start_date, end_date, status, user_id)
+        
+        where, params = self._build_filters(start_date, end_date, status, user_id)
+        query = f"""
+            SELECT
+                date_trunc(%s, CAST(audit_datetime AS TIMESTAMP)) as bucket,
+                COUNT(*) as count,
+                COUNT(*) FILTER (WHERE status IN ('completed', 'FINALIZED')) as completed_count,
+                COALESCE(SUM(CAST(audio_duration AS FLOAT)), 0) / 60.0 as audio_minutes
+            FROM {self.table_name}{where} AND audit_datetime IS NOT NULL
+            GROUP BY 1
+            ORDER BY 1
+        """
+        return self._fetch_all(query, [bucket] + params)
+    
+    def get_hourly_active_users(self, start_date: Optional[str] = None,
+                                end_date: Optional[str] = None,
+                                timezone: Optional[str] = None) -> List[Dict]:
+        """
+        Get distinct active users per hour of day, computed in the database.
+        Stored timestamps are treated as UTC and the hour is taken in the given
+        IANA timezone (default DASHBOARD_TIMEZONE). Rows have hour and active_users.
+        """
+        where, params = self._build_filters(start_date, end_date)
+        query = f"""
+            SELECT
+                CAST(EXTRACT(HOUR FROM CAST(audit_datetime AS TIMESTAMP)
+                    AT TIME ZONE 'UTC' AT TIME ZONE %s) AS INTEGER) as hour,
+                COUNT(DISTINCT NULLIF(CAST(user_id AS TEXT), '')) as active_users
+            FROM {self.table_name}{where} AND audit_datetime IS NOT NULL
+                AND NULLIF(CAST(user_id AS TEXT), '') IS NOT NULL
+            GROUP BY 1
+            ORDER BY 1
+        """
+        return self._fetch_all(query, [timezone or self.timezone] + params)
+    
+    def get_top_users(self, limit: int = 10,
+                      start_date: Optional[str] = None,
+                      end_date: Optional[str] = None,
+                      user_id: Optional[str] = None,
+                      tenant_ids: Optional[List[str]] = None) -> List[Dict]:
+        """
+        Get the top users by visit count over the whole filtered range.
+        Rows have user_id, visits, total_duration (seconds) and last_active.
+        """
+        where, params = self._build_filters(start_date, end_date, user_id=user_id, tenant_ids=tenant_ids)
+        top_users = TopK('top_users', 'user_id', [
+            Count('visits'),
+            Sum('total_duration', 'audio_duration'),
+            Max('last_active', 'audit_datetime')
+        ], order_by='visits', k=limit)
+        query, query_params = top_users.compile(self.table_name, where, params)
+        return [
+            {'user_id': group['key'], 'visits': group['visits'],
+             'total_duration': group['total_duration'], 'last_active': group['last_active']}
+            for group in top_users.from_sql(self._fetch_all(query, query_params))
+        ]
+    
+    def aggregate(self, plan: AggregationPlan, mode: Optional[str] = None,
+                  start_date: Optional[str] = None,
+                  end_date: Optional[str] = None,
+                  status: Optional[str] = None,
+                  user_id: Optional[str] = None,
+                  tenant_ids: Optional[List[str]] = None) -> Dict:
+        """
+        Evaluate an aggregation plan over the filtered rows.
+        mode='sql' compiles the plan into aggregate queries; mode='python' streams
+        only the columns the plan needs and feeds every aggregator in one pass.
+        Defaults to AGGREGATION_MODE.
+        """
+        mode = mode or self.aggregation_mode
+        where, params = self._build_filters(start_date, end_date, status, user_id, tenant_ids)
+        if mode == 'sql':
+            queries = plan.compile(self.table_name, where, params)
+            return plan.from_sql(self._fetch_one, self._fetch_all, queries)
+        if mode == 'python':
+            # A plan of plain counts needs no column values, just one row per match
+            columns = plan.columns()
+            select = self._select_list(columns) if columns else "1 as one"
+            query = f"SELECT {select} FROM {self.table_name}{where}"
+            return plan.run(self._iter_rows(query, params))
+        raise ValueError(f"Unknown aggregation mode: {mode}")
+    
+    def get_dashboard_bundle(self, start_date: Optional[str] = None,
+                             end_date: Optional[str] = None,
+                             user_id: Optional[str] = None,
+                             tenant_ids: Optional[List[str]] = None) -> Dict:
+        """
+        Compute the aggregates behind every dashboard widget in one scan of the range.
+        GROUPING SETS produce the overall totals, per-user totals and per-month totals
+        from a single query; the result has 'totals', 'users' and 'months'.
+        """
+        where, params = self._build_filters(start_date, end_date, user_id=user_id, tenant_ids=tenant_ids)
+        query = f"""
+            SELECT
+                GROUPING(user_id) as by_user,
+                GROUPING(month) as by_month,
+                user_id,
+                month,
+                COUNT(*) as total,
+                COUNT(*) FILTER (WHERE status IN ('completed', 'FINALIZED')) as completed,
+                COUNT(DISTINCT NULLIF(CAST(patient_id AS TEXT), '')) as unique_patients,
+                COUNT(DISTINCT NULLIF(CAST(user_id AS TEXT), '')) as unique_users,
+                COUNT(*) FILTER (WHERE NULLIF(CAST(user_id AS TEXT), '') IS NOT NULL) as staff,
+                COUNT(*) FILTER (WHERE LOWER(CAST(event_name AS TEXT)) LIKE '%%listening%%') as listening,
+                COUNT(*) FILTER (WHERE LOWER(CAST(event_name AS TEXT)) LIKE '%%dictation%%') as dictation,
+                COALESCE(SUM(CAST(audio_duration AS FLOAT)), 0) as total_duration
+            FROM (
+                SELECT *, date_trunc('month', CAST(audit_datetime AS TIMESTAMP)) as month
+                FROM {self.table_name}{where}
+            ) as events
+            GROUP BY GROUPING SETS ((), (user_id), (month))
+        """
+        rows = self._fetch_all(query, params)
+        
+        bundle = {"totals": None, "users": [], "months": []}
+        for row in rows:
+            if row['by_user'] and row['by_month']:
+                bundle["totals"] = row
+            elif not row['by_user']:
+                if row['user_id'] not in (None, ''):
+                    bundle["users"].append(row)
+            elif row['month'] is not None:
+                bundle["months"].append(row)
+        
+        bundle["users"].sort(key=lambda r: (-r['total'], str(r['user_id'])))
+        bundle["months"].sort(key=lambda r: r['month'])
+        return bundle
+    
+    def get_data_version(self) -> Optional[Union[int, str]]:
+        """
+        Get the number of completed loads, which changes whenever new data lands
+        (on DuckDB, a token derived from the parquet files' count and mtimes)
+        """
+        if self.duckdb is not None:
+            return self.duckdb.data_version()
+        stats = self.get_load_stats()
+        return stats['load_count'] if stats else None
+    
+    def _query_dimension_values(self) -> Dict[str, List[str]]:
+        """Read distinct user_id / tenant_id values from the catalog, or the table itself"""
+        values = {'user_id': [], 'tenant_id': []}
+        try:
+            rows = self._fetch_all(
+                f"SELECT dimension, value FROM {self.dimensions_table} "
+                "WHERE table_name = %s ORDER BY dimension, value",
+                [self.table_name]
+            )
+        except self.query_errors:
+            rows = []
+        for row in rows:
+            if row['dimension'] in values:
+                values[row['dimension']].append(row['value'])
+        if not rows:
+            # Catalog not created or not backfilled for this table yet: DISTINCT scans instead
+            for dimension in values:
+                rows = self._fetch_all(
+                    f"SELECT DISTINCT CAST({dimension} AS TEXT) as value FROM {self.table_name} "
+                    f"WHERE NULLIF(CAST({dimension} AS TEXT), '') IS NOT NULL ORDER BY 1"
+                )
+                values[dimension] = [row['value'] for row in rows]
+        return values
+    
+    def get_dimension_values(self) -> Dict:
+        """
+        Get every distinct user_id and tenant_id with a version stamp, served from
+        an in-process cache. After DIMENSION_CACHE_TTL seconds the data version is
+        rechecked and the values are only re-read when a load has happened since.
+        """
+        now = time.monotonic()
+        cached = DatabaseService._dimension_cache.get(self.table_name)
+        if cached and now - cached[2] < self.dimension_cache_ttl:
+            return {"version": cached[0], **cached[1]}
+        
+        with DatabaseService._dimension_lock:
+            cached = DatabaseService._dimension_cache.get(self.table_name)
+            if cached and now - cached[2] < self.dimension_cache_ttl:
+                return {"version": cached[0], **cached[1]}
             
-            if result:
-                return [dict(result)]
-            return []
-        except Exception as e:
-            print(f"Error getting metrics: {e}")
-            return []
+            version = self.get_data_version()
+            if cached and version is not None and cached[0] == version:
+                values = cached[1]
+            else:
+                values = self._query_dimension_values()
+            DatabaseService._dimension_cache[self.table_name] = (version, values, time.monotonic())
+            return {"version": version, **values}
     
     def get_recent_data(self, limit: int = 100) -> List[Dict]:
         """Get recent data"""
         return self.get_all_data(limit=limit)
 
+
+class AsyncDatabaseService:
+    """
+    Awaitable facade over DatabaseService.
+    Every method call runs on a bounded thread pool so blocking psycopg2 work
+    never stalls the event loop, e.g. ``await async_db.get_all_data(limit=10)``.
+    Concurrent calls with identical arguments share one execution and its result.
+    With COLUMNAR_CACHE_ENABLED, the aggregate queries listed in ColumnarCache.SERVED
+    run against the in-process columnar snapshot while it is current.
+    """
+    _executor: Optional[ThreadPoolExecutor] = None
+    _executor_lock = threading.Lock()
+    # Shared by every instance so per-request facades coalesce with each other
+    _single_flight = SingleFlight()
+    # Methods whose results are iterators, connections or live counters are never shared
+    _uncoalesced = {'get_connection', 'connection', 'get_pool_stats', 'iter_all_data', 'iter_data_batches'}
+    _columnar: Optional[ColumnarCache] = None
+    _columnar_unavailable = False
+    _columnar_lock = threading.Lock()
+
+    def __init__(self, db: Optional[DatabaseService] = None):
+        self.db = db or DatabaseService()
+
+    @classmethod
+    def executor(cls) -> ThreadPoolExecutor:
+        """Shared executor, sized to the connection pool so workers never queue on it"""
+        if cls._executor is None:
+            with cls._executor_lock:
+                if cls._executor is None:
+                    workers = int(os.getenv('DB_EXECUTOR_WORKERS', os.getenv('DB_POOL_MAX_SIZE', '10')))
+                    cls._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='db')
+        return cls._executor
+
+    @classmethod
+    def columnar_cache(cls) -> Optional[ColumnarCache]:
+        """Shared columnar snapshot, or None unless COLUMNAR_CACHE_ENABLED is set"""
+        if os.getenv('COLUMNAR_CACHE_ENABLED', 'false').lower() != 'true':
+            return None
+        if cls._columnar is None and not cls._columnar_unavailable:
+            with cls._columnar_lock:
+                if cls._columnar is None and not cls._columnar_unavailable:
+                    try:
+                        cls._columnar = ColumnarCache(batch_size=int(os.getenv('COLUMNAR_BATCH_SIZE', '50000')))
+                    except RuntimeError as e:
+                        print(f"Columnar cache disabled: {e}")
+                        cls._columnar_unavailable = True
+        return cls._columnar
+
+    async def run(self, func, *args, **kwargs):
+        """Run a blocking callable on the database executor and await its result"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor(), functools.partial(func, *args, **kwargs))
+
+    def coalesces(self, name: str) -> bool:
+        return (os.getenv('DB_COALESCE_REQUESTS', 'true').lower() == 'true'
+                and not name.startswith('_') and name not in self._uncoalesced)
+
+    @classmethod
+    def coalescing_stats(cls) -> Dict:
+        """Calls, executions and collapsed (coalesced) calls across all instances"""
+        return cls._single_flight.stats()
+
+    def _target(self, name: str, attr):
+        """The blocking callable behind a method: PostgreSQL or the columnar snapshot"""
+        cache = self.columnar_cache()
+        if cache is None:
+            return attr
+        if name == 'get_data_version':
+            # Every version check tells the snapshot whether it has fallen behind
+            @functools.wraps(attr)
+            def observed(*args, **kwargs):
+                version = attr(*args, **kwargs)
+                cache.observe_version(version)
+                return version
+            return observed
+        if name not in cache.SERVED:
+            return attr
+
+        @functools.wraps(attr)
+        def columnar(*args, **kwargs):
+            if cache.serves(name):
+                try:
+                    return cache.query(name, *args, **kwargs)
+                except Exception as e:
+                    print(f"Error in columnar {name}, using PostgreSQL: {e}")
+            cache.record_fallback()
+            return attr(*args, **kwargs)
+        return columnar
+
+    def __getattr__(self, name):
+        attr = getattr(self.db, name)
+        if not callable(attr):
+            return attr
+        attr = self._target(name, attr)
+
+        if not self.coalesces(name):
+            @functools.wraps(attr)
+            async def call(*args, **kwargs):
+                return await self.run(attr, *args, **kwargs)
+            return call
+
+        @functools.wraps(attr)
+        async def call(*args, **kwargs):
+            key = SingleFlight.make_key(name, args, kwargs)
+            return await self._single_flight.do(key, lambda: self.run(attr, *args, **kwargs))
+        return call
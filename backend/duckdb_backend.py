@@ -0,0 +1,149 @@
+"""
+Embedded DuckDB backend
+Runs DatabaseService's queries directly against a directory of Firehose parquet
+files (the same files virtualScribeDataExtraction loads into PostgreSQL) with no
+database server. The files are exposed as a view named after TABLE_NAME, so the
+PostgreSQL query text is reused; only %s placeholders become ? and %% becomes %.
+
+Enable with DATABASE_BACKEND=duckdb and PARQUET_DIR (duckdb is optional).
+"""
+import glob
+import os
+import re
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+try:
+    import duckdb
+except ImportError:  # optional dependency
+    duckdb = None
+
+_PLACEHOLDER = re.compile(r"%(%|s)")
+
+# DuckDB column types as the PostgreSQL type OIDs psycopg2 reports in cursor.description
+_TYPE_OIDS = {
+    'BOOLEAN': 16, 'SMALLINT': 21, 'INTEGER': 23, 'BIGINT': 20, 'FLOAT': 700, 'DOUBLE': 701,
+    'DATE': 1082, 'TIMESTAMP': 1114, 'TIMESTAMP WITH TIME ZONE': 1184, 'VARCHAR': 25,
+}
+
+
+def translate(query: str) -> str:
+    """Convert a psycopg2 (pyformat) query to DuckDB's qmark style"""
+    return _PLACEHOLDER.sub(lambda match: "%" if match.group(1) == "%" else "?", query)
+
+
+def describe(cursor) -> tuple:
+    """cursor.description with psycopg2-style (name, type OID, ...) entries"""
+    description = []
+    for column in cursor.description:
+        type_name = str(column[1])
+        oid = 1700 if type_name.startswith('DECIMAL') else _TYPE_OIDS.get(type_name, 25)
+        description.append((column[0], oid) + tuple(column[2:]))
+    return tuple(description)
+
+
+def _rows_as_dicts(cursor, rows: List[tuple]) -> List[Dict]:
+    names = [column[0] for column in cursor.description]
+    return [dict(zip(names, row)) for row in rows]
+
+
+class DuckDBBackend:
+    # One in-memory database per (glob, table), shared by every DatabaseService
+    _instances: Dict[tuple, "DuckDBBackend"] = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, parquet_glob: str, table_name: str, threads: Optional[int] = None):
+        if duckdb is None:
+            raise RuntimeError("DATABASE_BACKEND=duckdb requires the duckdb package")
+        self.parquet_glob = parquet_glob
+        self.table_name = table_name
+        self.database = duckdb.connect(database=":memory:")
+        if threads:
+            self.database.execute(f"SET threads = {int(threads)}")
+        # The view re-reads the glob on every query, so new files are picked up as they land
+        source = parquet_glob.replace("'", "''")
+        try:
+            self.database.execute(
+                f"CREATE VIEW {table_name} AS "
+                f"SELECT * FROM read_parquet('{source}', union_by_name = true)"
+            )
+        except duckdb.IOException as e:
+            raise RuntimeError(f"No parquet files match {parquet_glob}: {e}")
+        self._stats = {"queries": 0}
+
+    @classmethod
+    def shared(cls, parquet_dir: str, table_name: str) -> "DuckDBBackend":
+        parquet_glob = os.getenv('PARQUET_GLOB') or os.path.join(parquet_dir, '**', '*.parquet')
+        key = (parquet_glob, table_name)
+        backend = cls._instances.get(key)
+        if backend is None:
+            with cls._instances_lock:
+                backend = cls._instances.get(key)
+                if backend is None:
+                    threads = os.getenv('DUCKDB_THREADS')
+                    backend = cls._instances[key] = cls(parquet_glob, table_name,
+                                                        int(threads) if threads else None)
+        return backend
+
+    @contextmanager
+    def connection(self):
+        """A per-thread cursor on the shared in-memory database"""
+        cursor = self.database.cursor()
+        try:
+            yield cursor
+        finally:
+            cursor.close()
+
+    def _execute(self, cursor, query: str, params: Optional[list]):
+        self._stats["queries"] += 1
+        cursor.execute(translate(query), params or [])
+
+    def fetch_all(self, query: str, params: Optional[list] = None) -> List[Dict]:
+        with self.connection() as cursor:
+            self._execute(cursor, query, params)
+            return _rows_as_dicts(cursor, cursor.fetchall())
+
+    def fetch_one(self, query: str, params: Optional[list] = None) -> Optional[Dict]:
+        with self.connection() as cursor:
+            self._execute(cursor, query, params)
+            row = cursor.fetchone()
+            return _rows_as_dicts(cursor, [row])[0] if row is not None else None
+
+    def iter_rows(self, query: str, params: Optional[list] = None,
+                  itersize: int = 2000) -> Iterator[Dict]:
+        for description, rows in self.iter_batches(query, params, itersize):
+            names = [column[0] for column in description]
+            for row in rows:
+                yield dict(zip(names, row))
+
+    def iter_batches(self, query: str, params: Optional[list] = None,
+                     batch_size: int = 2000) -> Iterator[Tuple[tuple, List]]:
+        with self.connection() as cursor:
+            self._execute(cursor, query, params)
+            description = describe(cursor)
+            rows = cursor.fetchmany(batch_size)
+            yield description, rows
+            while len(rows) == batch_size:
+                rows = cursor.fetchmany(batch_size)
+                if rows:
+                    yield description, rows
+
+    def files(self) -> List[str]:
+        return glob.glob(self.parquet_glob, recursive=True)
+
+    def data_version(self) -> Optional[str]:
+        """Changes whenever a parquet file is added, removed or rewritten"""
+        files = self.files()
+        if not files:
+            return None
+        latest = max(os.stat(path).st_mtime_ns for path in files)
+        return f"{len(files)}:{latest}"
+
+    def stats(self) -> Dict:
+        return {
+            "backend": "duckdb",
+            "parquet_glob": self.parquet_glob,
+            "files": len(self.files()),
+            **self._stats,
+        }
@@ -2,16 +2,71 @@
 FastAPI Application Entry Point
 Main application file that sets up FastAPI, CORS, and includes all API routes
 """
+import asyncio
+import os
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 # Import API routes
+from api.middleware import CompressionMiddleware, ETagMiddleware
 from api.routes import dashboard, data
+from database_service import AsyncDatabaseService
+from migrations import migrate
+
+async def run_migrations():
+    """Apply pending index migrations without holding up startup"""
+    try:
+        # Idempotent; skipped when another instance is already migrating
+        await dashboard.async_db.run(migrate, dashboard.db_service, wait=False)
+    except Exception as e:
+        print(f"Error running migrations: {e}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Run migrations and the background cache refreshers while the app is up"""
+    tasks = []
+    if (os.getenv('RUN_MIGRATIONS', 'true').lower() == 'true'
+            and dashboard.db_service.backend == 'postgres'):
+        tasks.append(asyncio.create_task(run_migrations()))
+    columnar = AsyncDatabaseService.columnar_cache()
+    if columnar is not None:
+        interval = float(os.getenv('COLUMNAR_REFRESH_INTERVAL', '15'))
+        tasks.append(asyncio.create_task(columnar.run_refresher(dashboard.async_db, interval)))
+    if os.getenv('CACHE_WARM_ENABLED', 'true').lower() == 'true':
+        interval = float(os.getenv('CACHE_WARM_INTERVAL', '240'))
+        tasks.append(asyncio.create_task(dashboard.result_cache.run_warmer(interval)))
+    yield
+    for task in tasks:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
 
 # Create FastAPI app
-app = FastAPI(title="Dashboard API", version="1.0.0")
+app = FastAPI(title="Dashboard API", version="1.0.0", lifespan=lifespan)
+
+# Answer unchanged dashboard / data requests with 304 until the data version moves.
+# The watermark is the result cache's own version (already rate-limited), read on every
+# request so an ETag never moves before the cached bodies behind it are dropped
+if os.getenv('ETAG_ENABLED', 'true').lower() == 'true':
+    app.add_middleware(
+        ETagMiddleware,
+        watermark_source=dashboard.result_cache.current_version,
+        exclude=("/api/cache/stats", "/api/data/pool-stats"),
+        refresh_interval=0
+    )
+
+# Compress large responses (brotli when installed and accepted, otherwise gzip)
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=int(os.getenv('COMPRESSION_MIN_SIZE', '1024'))
+)
 
 # Configure CORS - Allow all localhost ports for development
+# Added last so it is the outermost layer: 304s from ETagMiddleware get CORS headers too
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # Allow all origins for development (change in production)
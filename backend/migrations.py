@@ -0,0 +1,361 @@
+"""
+Schema migrations for the audit table
+Versioned, idempotent migrations (indexes for the dashboard and data queries)
+recorded per table in schema_migrations. A PostgreSQL advisory lock makes sure
+only one process (API instance or operator) migrates at a time.
+
+Indexes are built with CREATE INDEX CONCURRENTLY, so loads keep writing to the
+table while they build; on a partitioned table each partition's index is built
+concurrently and attached to an index created ON ONLY the parent. The API applies
+pending migrations in the background at startup (RUN_MIGRATIONS). From the
+backend directory:
+    python migrations.py             # apply pending migrations
+    python migrations.py --status    # list applied / pending migrations
+    python migrations.py --explain   # EXPLAIN the dashboard queries and report the planner's scans
+"""
+import argparse
+import json
+import os
+import sys
+from typing import Callable, Dict, List, Optional, Tuple
+
+import psycopg2
+
+from database_service import DatabaseService
+
+MIGRATIONS_TABLE = os.getenv('MIGRATIONS_TABLE', 'schema_migrations')
+
+# Any constant shared by every process that migrates these tables
+ADVISORY_LOCK_KEY = 72430001
+
+# (version, name, columns the index needs, index suffix, index definition); indexes are
+# named idx_<table>_<suffix>, and idx_<partition>_<suffix> on each partition
+MIGRATIONS: List[Tuple[int, str, Tuple[str, ...], str, str]] = [
+    (1, "btree index on audit_datetime", ('audit_datetime',),
+     "audit_datetime", "(audit_datetime)"),
+    (2, "btree index on user_id, audit_datetime", ('user_id', 'audit_datetime'),
+     "user_id_audit_datetime", "(user_id, audit_datetime)"),
+    (3, "btree index on status, audit_datetime", ('status', 'audit_datetime'),
+     "status_audit_datetime", "(status, audit_datetime)"),
+    (4, "btree index on tenant_id, audit_datetime", ('tenant_id', 'audit_datetime'),
+     "tenant_id_audit_datetime", "(tenant_id, audit_datetime)"),
+    (5, "BRIN index on audit_datetime", ('audit_datetime',),
+     "audit_datetime_brin", "USING brin (audit_datetime)"),
+    (6, "keyset pagination index on audit_datetime, pk", ('audit_datetime', 'pk'),
+     "audit_datetime_pk", "(audit_datetime, pk)"),
+]
+
+
+def ensure_migrations_table(cursor):
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {MIGRATIONS_TABLE} (
+            table_name TEXT NOT NULL,
+            version INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            PRIMARY KEY (table_name, version)
+        )
+    """)
+
+
+def applied_versions(cursor, table_name: str) -> Dict[int, str]:
+    cursor.execute(
+        f"SELECT version, applied_at FROM {MIGRATIONS_TABLE} WHERE table_name = %s",
+        [table_name]
+    )
+    return {row[0]: str(row[1]) for row in cursor.fetchall()}
+
+
+def table_columns(cursor, table_name: str) -> List[str]:
+    cursor.execute(
+        "SELECT column_name FROM information_schema.columns "
+        "WHERE table_schema = current_schema() AND table_name = %s",
+        [table_name]
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def partitions(cursor, table_name: str) -> List[str]:
+    """Names of table_name's partitions (empty for a plain table)"""
+    cursor.execute(
+        "SELECT inhrelid::regclass::text FROM pg_inherits WHERE inhparent = to_regclass(%s) ORDER BY 1",
+        [table_name]
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def create_index_concurrently(cursor, index_name: str, table_name: str, definition: str):
+    """
+    CREATE INDEX CONCURRENTLY, outside a transaction. A build that failed earlier
+    leaves an invalid index behind, which is dropped and rebuilt.
+    """
+    cursor.execute("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(%s)", [index_name])
+    row = cursor.fetchone()
+    if row is not None and row[0]:
+        return
+    if row is not None:
+        cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name}")
+    cursor.execute(f"CREATE INDEX CONCURRENTLY {index_name} ON {table_name} {definition}")
+
+
+def create_index(cursor, table_name: str, suffix: str, definition: str):
+    """
+    Build one index without blocking writes to the table. PostgreSQL cannot build
+    a partitioned table's index concurrently, so the parent index is created ON ONLY
+    the parent (catalog-only, invalid until complete) and every partition's index is
+    built concurrently and attached to it. Partitions attached later get a matching
+    index from PostgreSQL itself.
+    """
+    index_name = f"idx_{table_name}_{suffix}"
+    children = partitions(cursor, table_name)
+    if not children:
+        create_index_concurrently(cursor, index_name, table_name, definition)
+        return
+
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON ONLY {table_name} {definition}")
+    for partition in children:
+        # Skip partitions that already have an index attached to this one
+        cursor.execute("""
+            SELECT 1 FROM pg_inherits i JOIN pg_index x ON x.indexrelid = i.inhrelid
+            WHERE i.inhparent = to_regclass(%s) AND x.indrelid = to_regclass(%s)
+        """, [index_name, partition])
+        if cursor.fetchone():
+            continue
+        child_name = f"idx_{partition}_{suffix}"
+        create_index_concurrently(cursor, child_name, partition, definition)
+        cursor.execute(f"ALTER INDEX {index_name} ATTACH PARTITION {child_name}")
+
+
+def migrate(db: Optional[DatabaseService] = None, wait: bool = True) -> List[int]:
+    """
+    Apply pending migrations to the audit table. Migrations whose columns the table
+    does not have (yet) stay pending and are retried next time. With wait=False,
+    returns immediately when another process holds the migration lock. Returns the
+    versions applied.
+    """
+    db = db or DatabaseService()
+    table = db.table_name
+    applied: List[int] = []
+    conn = db.get_connection()
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cursor:
+            if wait:
+                cursor.execute("SELECT pg_advisory_lock(%s)", [ADVISORY_LOCK_KEY])
+            else:
+                cursor.execute("SELECT pg_try_advisory_lock(%s)", [ADVISORY_LOCK_KEY])
+                if not cursor.fetchone()[0]:
+                    print("Migrations are running in another process, skipping")
+                    return applied
+
+            try:
+                ensure_migrations_table(cursor)
+                done = applied_versions(cursor, table)
+                columns = set(table_columns(cursor, table))
+                if not columns:
+                    print(f"Table {table} does not exist yet, skipping migrations")
+                    return applied
+
+                for version, name, required, suffix, definition in MIGRATIONS:
+                    if version in done:
+                        continue
+                    missing = [column for column in required if column not in columns]
+                    if missing:
+                        print(f"Migration {version} ({name}) pending: {table} has no {', '.join(missing)}")
+                        continue
+                    create_index(cursor, table, suffix, definition)
+                    cursor.execute(
+                        f"INSERT INTO {MIGRATIONS_TABLE} (table_name, version, name) VALUES (%s, %s, %s)",
+                        [table, version, name]
+                    )
+                    applied.append(version)
+                    print(f"Applied migration {version}: {name}")
+
+                if applied:
+                    cursor.execute(f"ANALYZE {table}")
+            finally:
+                cursor.execute("SELECT pg_advisory_unlock(%s)", [ADVISORY_LOCK_KEY])
+    finally:
+        conn.close()
+    return applied
+
+
+def migration_status(db: Optional[DatabaseService] = None) -> List[Dict]:
+    db = db or DatabaseService()
+    conn = db.get_connection()
+    try:
+        with conn.cursor() as cursor:
+            ensure_migrations_table(cursor)
+            conn.commit()
+            done = applied_versions(cursor, db.table_name)
+    finally:
+        conn.close()
+    return [
+        {"version": version, "name": name, "applied_at": done.get(version)}
+        for version, name, _, _, _ in MIGRATIONS
+    ]
+
+
+# EXPLAIN-based index check
+
+class ExplainingDatabaseService(DatabaseService):
+    """
+    DatabaseService whose queries are EXPLAINed instead of executed, with the
+    default planner settings unless planner_settings overrides some for the EXPLAIN
+    session, so the plans show the scans the planner actually picks for the
+    current table statistics.
+    """
+
+    def __init__(self, planner_settings: Optional[Dict[str, str]] = None):
+        super().__init__()
+        self.use_rollups = False
+        self.planner_settings = planner_settings or {}
+        self.plans: List[Tuple[str, Dict]] = []
+        self._explain_conn = None
+
+    def _explain(self, query: str, params: Optional[list]):
+        if self._explain_conn is None:
+            self._explain_conn = self.get_connection()
+            with self._explain_conn.cursor() as cursor:
+                for name, value in self.planner_settings.items():
+                    cursor.execute("SELECT set_config(%s, %s, false)", [name, value])
+        with self._explain_conn.cursor() as cursor:
+            cursor.execute("EXPLAIN (FORMAT JSON) " + query, params or [])
+            plan = cursor.fetchone()[0]
+        self.plans.append((query, plan[0]["Plan"] if isinstance(plan, list) else plan))
+
+    def _reads_table(self, query: str) -> bool:
+        return f"FROM {self.table_name}" in query
+
+    def _fetch_all(self, query: str, params: Optional[list] = None) -> List[Dict]:
+        if not self._reads_table(query):
+            return super()._fetch_all(query, params)
+        self._explain(query, params)
+        return []
+
+    def _fetch_one(self, query: str, params: Optional[list] = None) -> Optional[Dict]:
+        if not self._reads_table(query):
+            return super()._fetch_one(query, params)
+        self._explain(query, params)
+        return None
+
+    def _iter_rows(self, query: str, params: Optional[list] = None, itersize: Optional[int] = None):
+        if not self._reads_table(query):
+            return super()._iter_rows(query, params, itersize)
+        self._explain(query, params)
+        return iter([])
+
+    def close(self):
+        if self._explain_conn is not None:
+            self._explain_conn.close()
+
+
+def table_scans(plan: Dict, table_name: str) -> List[str]:
+    """Node types of every plan node that reads the audit table (or one of its partitions)"""
+    scans = []
+    if str(plan.get("Relation Name", "")).startswith(table_name):
+        scans.append(plan["Node Type"])
+    for child in plan.get("Plans", []):
+        scans.extend(table_scans(child, table_name))
+    return scans
+
+
+def dashboard_queries(db: DatabaseService, start_date: str, end_date: str) -> List[Tuple[str, Callable]]:
+    """(label, call) for every query the dashboard and data endpoints run over a date range"""
+    from api.routes.dashboard import (ACTIVE_USERS_PLAN, CONSENTS_PLAN, DELIVERY_SCHEDULE_PLAN,
+                                      SERVICE_USAGE_PLAN, STAFF_SPEAKING_PLAN)
+
+    checks = [
+        ("all-data (date range)", lambda: db.get_all_data(limit=100, start_date=start_date, end_date=end_date)),
+        ("all-data (status)", lambda: db.get_all_data(limit=100, status='completed')),
+        ("all-data (user)", lambda: db.get_all_data(limit=100, user_id='explain-user')),
+        ("all-data page", lambda: db.get_page(page_size=100, start_date=start_date, end_date=end_date)),
+        ("metrics", lambda: db.get_metrics(start_date, end_date)),
+        ("dashboard bundle", lambda: db.get_dashboard_bundle(start_date, end_date)),
+        ("sales time series", lambda: db.get_time_series('day', start_date, end_date)),
+        ("hourly activity", lambda: db.get_hourly_active_users(start_date, end_date)),
+        ("top users", lambda: db.get_top_users(10, start_date, end_date)),
+        ("top users (tenant)", lambda: db.get_top_users(10, start_date, end_date, tenant_ids=['explain-tenant'])),
+        ("filtered count", lambda: db.get_count('filtered', start_date=start_date, end_date=end_date)),
+    ]
+    plans = [("active users", ACTIVE_USERS_PLAN), ("staff speaking", STAFF_SPEAKING_PLAN),
+             ("consents", CONSENTS_PLAN), ("service usage", SERVICE_USAGE_PLAN),
+             ("delivery schedules", DELIVERY_SCHEDULE_PLAN)]
+    for name, plan in plans:
+        for mode in ('sql', 'python'):
+            checks.append((f"{name} ({mode})", lambda plan=plan, mode=mode: db.aggregate(
+                plan, mode=mode, start_date=start_date, end_date=end_date)))
+    return checks
+
+
+def explain_queries(db: ExplainingDatabaseService,
+                    checks: List[Tuple[str, Callable]]) -> List[Tuple[str, List[str], Optional[Dict]]]:
+    """Run each check on an ExplainingDatabaseService: (label, audit table scans, plan) per query"""
+    results = []
+    for label, run in checks:
+        db.plans = []
+        run()
+        for _, plan in db.plans:
+            results.append((label, table_scans(plan, db.table_name), plan))
+        if not db.plans:
+            results.append((label, [], None))
+    return results
+
+
+def uses_index(scans: List[str]) -> bool:
+    return bool(scans) and all(scan != "Seq Scan" for scan in scans)
+
+
+def explain_dashboard_queries() -> bool:
+    """
+    EXPLAIN each dashboard query over the last 30 days; True when the planner reads
+    the audit table through an index for all of them. On a small table a sequential
+    scan is the cheaper plan and is reported as FAIL, so run this against
+    production-sized data (tests/test_migrations.py checks the same queries on a
+    seeded table with sequential scans disabled).
+    """
+    from datetime import datetime, timedelta
+
+    db = ExplainingDatabaseService()
+    end_date = datetime.now().strftime("%Y-%m-%d")
+    start_date = (datetime.now() - timedelta(days=30)).strftime("%Y-%m-%d")
+    ok = True
+    try:
+        for label, scans, plan in explain_queries(db, dashboard_queries(db, start_date, end_date)):
+            indexed = uses_index(scans)
+            ok = ok and indexed
+            if plan is None:
+                print(f"FAIL {label:<28} query did not run")
+                continue
+            print(f"{'OK  ' if indexed else 'FAIL'} {label:<28} {', '.join(scans) or 'no table scan'}")
+            if not indexed:
+                print(json.dumps(plan, indent=2, default=str))
+    finally:
+        db.close()
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply and check audit table migrations")
+    parser.add_argument("--status", action="store_true", help="list applied and pending migrations")
+    parser.add_argument("--explain", action="store_true", help="check that the planner uses an index for dashboard queries")
+    args = parser.parse_args()
+
+    try:
+        if args.status:
+            for migration in migration_status():
+                state = f"applied {migration['applied_at']}" if migration['applied_at'] else "pending"
+                print(f"{migration['version']:>3}  {migration['name']:<48} {state}")
+        elif args.explain:
+            sys.exit(0 if explain_dashboard_queries() else 1)
+        else:
+            applied = migrate()
+            print(f"{len(applied)} migration(s) applied")
+    except psycopg2.Error as e:
+        print(f"Error running migrations: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
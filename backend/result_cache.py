@@ -0,0 +1,279 @@
+"""
+Dashboard Result Cache
+In-process LRU cache with per-endpoint TTLs in front of the dashboard handlers.
+Entries are keyed on the endpoint and its normalized filter set, and the whole
+cache is dropped when the data version (completed parquet loads) moves.
+
+Past its TTL an entry is still served for a stale window while one background
+task recomputes it (stale-while-revalidate), and endpoints registered with
+warm=True have their default (no-filter) view refreshed on a schedule by
+run_warmer(), so the common page loads never wait on a query.
+"""
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple
+
+# Data version before the first successful check
+_UNCHECKED = object()
+
+# Set by a handler while serving a degraded (error fallback) response so it is not cached
+_skip_cache = contextvars.ContextVar('skip_cache', default=False)
+
+
+# Per-request marker installed by the HTTP layer (ETagMiddleware); a mutable dict so a
+# handler running in a copied context can still flag its response as degraded
+_request_marker = contextvars.ContextVar('request_marker', default=None)
+
+
+def skip_cache():
+    """Mark the current request's result as uncacheable (call from error fallbacks)"""
+    _skip_cache.set(True)
+    marker = _request_marker.get()
+    if marker is not None:
+        marker["degraded"] = True
+
+
+def track_request() -> Dict[str, bool]:
+    """Start tracking whether the current request served a degraded (error fallback) result"""
+    marker = {"degraded": False}
+    _request_marker.set(marker)
+    return marker
+
+
+def normalize_filters(filters: Dict[str, Any]) -> Tuple:
+    """Canonical cache key for a filter set: empty values dropped, strings stripped, sorted"""
+    normalized = []
+    for name, value in filters.items():
+        if isinstance(value, str):
+            value = value.strip()
+        if value is None or value == '':
+            continue
+        normalized.append((name, value))
+    return tuple(sorted(normalized))
+
+
+class ResultCache:
+    def __init__(self, max_entries: int = 512, default_ttl: float = 300.0,
+                 version_check_interval: float = 15.0,
+                 version_source: Optional[Callable[[], Awaitable[Any]]] = None,
+                 stale_ttl: float = 0.0):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.version_check_interval = version_check_interval
+        self.version_source = version_source
+        self.stale_ttl = stale_ttl
+
+        # key -> (value, fresh until, served stale until)
+        self._entries: "OrderedDict[Tuple, Tuple[Any, float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = _UNCHECKED
+        self._version_checked_at = 0.0
+        self._version_lock: Optional[asyncio.Lock] = None
+        self._stats = {"hits": 0, "misses": 0, "stale_hits": 0, "evictions": 0, "expirations": 0,
+                       "invalidations": 0, "refreshes": 0, "refresh_errors": 0}
+        self._endpoint_stats: Dict[str, Dict[str, int]] = {}
+        # Endpoints whose default view is kept warm: endpoint -> (handler, ttl)
+        self._warm: Dict[str, Tuple[Callable[..., Awaitable[Any]], Optional[float]]] = {}
+        self._refreshing: Set[Tuple] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self._last_warmed_at: Optional[float] = None
+
+    def _count(self, endpoint: str, event: str):
+        self._stats[event] += 1
+        counters = self._endpoint_stats.setdefault(endpoint, {"hits": 0, "misses": 0})
+        if event in counters:
+            counters[event] += 1
+
+    def lookup(self, key: Tuple) -> Tuple[Optional[str], Any]:
+        """
+        Return (state, value) for key where state is 'fresh', 'stale' (past its TTL
+        but inside the stale window) or None on a miss; expired entries are dropped
+        """
+        endpoint = key[0]
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, fresh_until, stale_until = entry
+                now = time.monotonic()
+                if now < fresh_until:
+                    self._entries.move_to_end(key)
+                    self._count(endpoint, "hits")
+                    return 'fresh', value
+                if now < stale_until:
+                    self._entries.move_to_end(key)
+                    self._count(endpoint, "hits")
+                    self._stats["stale_hits"] += 1
+                    return 'stale', value
+                del self._entries[key]
+                self._stats["expirations"] += 1
+            self._count(endpoint, "misses")
+            return None, None
+
+    def get(self, key: Tuple) -> Tuple[bool, Any]:
+        """Return (hit, value) for key; stale entries count as hits"""
+        state, value = self.lookup(key)
+        return state is not None, value
+
+    def set(self, key: Tuple, value: Any, ttl: Optional[float] = None):
+        """Store value for ttl seconds, evicting least recently used entries over the limit"""
+        ttl = self.default_ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        with self._lock:
+            fresh_until = time.monotonic() + ttl
+            self._entries[key] = (value, fresh_until, fresh_until + self.stale_ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def invalidate(self, endpoint: Optional[str] = None) -> int:
+        """Drop every entry, or only one endpoint's entries; returns the number removed"""
+        with self._lock:
+            if endpoint is None:
+                removed = len(self._entries)
+                self._entries.clear()
+            else:
+                keys = [key for key in self._entries if key[0] == endpoint]
+                for key in keys:
+                    del self._entries[key]
+                removed = len(keys)
+            self._stats["invalidations"] += 1
+        return removed
+
+    async def check_version(self):
+        """Poll the data version at most once per interval and invalidate when it moves"""
+        if self.version_source is None:
+            return
+        if time.monotonic() - self._version_checked_at < self.version_check_interval:
+            return
+        if self._version_lock is None:
+            self._version_lock = asyncio.Lock()
+        async with self._version_lock:
+            if time.monotonic() - self._version_checked_at < self.version_check_interval:
+                return
+            try:
+                version = await self.version_source()
+            except Exception as e:
+                print(f"Error checking data version: {e}")
+                version = self._version
+            if version != self._version:
+                if self._version is not _UNCHECKED:
+                    self.invalidate()
+                    # Recompute the warm views right away instead of on the next request
+                    self._spawn(self.warm_all())
+                self._version = version
+            self._version_checked_at = time.monotonic()
+
+    async def current_version(self) -> Any:
+        """
+        The data version the cached entries belong to (None while unknown), after
+        the usual rate-limited check; validators such as ETags built from it never
+        run ahead of the cache's invalidation
+        """
+        await self.check_version()
+        return None if self._version is _UNCHECKED else self._version
+
+    def _spawn(self, coro):
+        """Run a coroutine in the background, keeping a reference until it finishes"""
+        task = asyncio.ensure_future(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _compute(self, key: Tuple, func, args: tuple, kwargs: dict, ttl: Optional[float]):
+        """Call the handler and store its result unless it marked itself uncacheable"""
+        token = _skip_cache.set(False)
+        try:
+            value = await func(*args, **kwargs)
+            if not _skip_cache.get():
+                self.set(key, value, ttl)
+        finally:
+            _skip_cache.reset(token)
+        return value
+
+    async def refresh(self, key: Tuple, func, args: tuple, kwargs: dict, ttl: Optional[float]) -> bool:
+        """Recompute one entry unless a refresh for it is already running"""
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+        try:
+            await self._compute(key, func, args, kwargs, ttl)
+            self._stats["refreshes"] += 1
+            return True
+        except Exception as e:
+            print(f"Error refreshing cached {key[0]}: {e}")
+            self._stats["refresh_errors"] += 1
+            return False
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    async def warm_all(self):
+        """Recompute the default (no-filter) view of every warm endpoint"""
+        for endpoint, (func, ttl) in list(self._warm.items()):
+            await self.refresh((endpoint, ()), func, (), {}, ttl)
+        self._last_warmed_at = time.time()
+
+    async def run_warmer(self, interval: float):
+        """Background loop: keep warm endpoints populated, refreshing every interval seconds"""
+        while True:
+            try:
+                await self.check_version()
+                await self.warm_all()
+            except Exception as e:
+                print(f"Error warming dashboard cache: {e}")
+            await asyncio.sleep(interval)
+
+    def cached(self, endpoint: str, ttl: Optional[float] = None, warm: bool = False):
+        """
+        Decorator for async route handlers: results are cached per normalized
+        keyword arguments. Handlers call skip_cache() in their error fallbacks.
+        Stale entries are returned immediately and refreshed in the background;
+        warm=True also registers the no-filter view with run_warmer().
+        """
+        def decorator(func):
+            if warm:
+                self._warm[endpoint] = (func, ttl)
+
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                await self.check_version()
+                key = (endpoint, normalize_filters(kwargs))
+                state, value = self.lookup(key)
+                if state == 'stale':
+                    self._spawn(self.refresh(key, func, args, kwargs, ttl))
+                if state is not None:
+                    return value
+                return await self._compute(key, func, args, kwargs, ttl)
+            return wrapper
+        return decorator
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "data_version": None if self._version is _UNCHECKED else self._version,
+                "stale_ttl": self.stale_ttl,
+                "warm_endpoints": sorted(self._warm),
+                "last_warmed_at": self._last_warmed_at,
+                "refreshing": len(self._refreshing),
+                "endpoints": {name: dict(counters) for name, counters in self._endpoint_stats.items()},
+            })
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        return stats
+
+
+def cache_ttl(endpoint: str, default: float) -> float:
+    """Per-endpoint TTL override from CACHE_TTL_<ENDPOINT> (e.g. CACHE_TTL_TOP_USERS)"""
+    name = 'CACHE_TTL_' + endpoint.upper().replace('-', '_')
+    return float(os.getenv(name, str(default)))
@@ -0,0 +1,66 @@
+"""
+Single-flight request coalescing
+Concurrent callers asking for the same key share one in-flight execution and its result
+"""
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+
+def freeze(value) -> Hashable:
+    """Turn lists / dicts / sets in call arguments into hashable equivalents"""
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, freeze(v)) for k, v in value.items()))
+    if isinstance(value, set):
+        return frozenset(freeze(v) for v in value)
+    return value
+
+
+class SingleFlight:
+    def __init__(self):
+        self._in_flight: Dict[Hashable, asyncio.Future] = {}
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "executions": 0, "coalesced": 0}
+
+    @staticmethod
+    def make_key(name: str, args: tuple, kwargs: dict) -> Optional[Hashable]:
+        """Key for a call, or None when its arguments cannot be hashed"""
+        key = (name, freeze(args), freeze(kwargs))
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    async def do(self, key: Optional[Hashable], func: Callable[[], Awaitable[Any]]):
+        """
+        Run func unless an identical call is already in flight, in which case wait
+        for that call's result (or exception) instead. A cancelled waiter does not
+        cancel the shared execution.
+        """
+        with self._lock:
+            self._stats["calls"] += 1
+            task = self._in_flight.get(key) if key is not None else None
+            if task is not None:
+                self._stats["coalesced"] += 1
+            else:
+                self._stats["executions"] += 1
+                task = asyncio.ensure_future(func())
+                if key is not None:
+                    self._in_flight[key] = task
+                    task.add_done_callback(lambda _: self._forget(key, task))
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Future):
+        with self._lock:
+            if self._in_flight.get(key) is task:
+                del self._in_flight[key]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["in_flight"] = len(self._in_flight)
+        stats["coalesced_ratio"] = round(stats["coalesced"] / stats["calls"], 3) if stats["calls"] else 0.0
+        return stats
@@ -0,0 +1,33 @@
+"""
+Shared fixtures. Run from the backend directory: python -m pytest tests
+Tests that need PostgreSQL use the database named by TEST_DB_HOST / TEST_DB_PORT /
+TEST_DB_NAME / TEST_DB_USER / TEST_DB_PASSWORD and are skipped when it is not set.
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The API modules build a DatabaseService at import, which only validates its settings;
+# tests that do not use postgres_db never connect
+for name, value in (('DB_HOST', '127.0.0.1'), ('DB_NAME', 'test'), ('DB_USER', 'test'),
+                    ('DB_PASSWORD', 'test')):
+    os.environ.setdefault(name, value)
+
+
+@pytest.fixture
+def postgres_db(monkeypatch):
+    """DatabaseService connected to the TEST_DB_* database"""
+    if not os.getenv('TEST_DB_HOST'):
+        pytest.skip("TEST_DB_HOST is not set")
+    monkeypatch.setenv('DATABASE_BACKEND', 'postgres')
+    monkeypatch.setenv('DB_HOST', os.getenv('TEST_DB_HOST'))
+    monkeypatch.setenv('DB_PORT', os.getenv('TEST_DB_PORT', '5432'))
+    monkeypatch.setenv('DB_NAME', os.getenv('TEST_DB_NAME', 'postgres'))
+    monkeypatch.setenv('DB_USER', os.getenv('TEST_DB_USER', 'postgres'))
+    monkeypatch.setenv('DB_PASSWORD', os.getenv('TEST_DB_PASSWORD', 'postgres'))
+
+    from database_service import DatabaseService
+    return DatabaseService()
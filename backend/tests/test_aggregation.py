@@ -0,0 +1,72 @@
+"""
+Aggregation plans and the top-k aggregator against PostgreSQL
+"""
+import uuid
+
+import pytest
+
+from aggregation import AggregationPlan, Count
+
+ROWS = [
+    # (user_id, audio_duration, audit_datetime)
+    ('u2', 60, '2025-01-01 09:00'),
+    ('u2', 120, '2025-01-02 09:00'),
+    ('u1', 30, '2025-01-01 10:00'),
+    ('u1', 30, '2025-01-03 10:00'),
+    ('u3', 600, '2025-01-02 11:00'),
+    ('', 60, '2025-01-02 12:00'),
+]
+
+
+@pytest.fixture
+def audit_db(postgres_db):
+    table = f"aggregation_test_{uuid.uuid4().hex[:8]}"
+    postgres_db.table_name = table
+    conn = postgres_db.get_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(f"""
+                CREATE TABLE {table} (
+                    pk BIGSERIAL, user_id TEXT, patient_id TEXT, tenant_id TEXT, status TEXT,
+                    audio_duration DOUBLE PRECISION, audit_datetime TIMESTAMP
+                )
+            """)
+            for row in ROWS:
+                cursor.execute(
+                    f"INSERT INTO {table} (user_id, audio_duration, audit_datetime) VALUES (%s, %s, %s)", row
+                )
+        conn.commit()
+        yield postgres_db
+    finally:
+        with conn.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {table}")
+        conn.commit()
+        conn.close()
+
+
+def test_top_users(audit_db):
+    top = audit_db.get_top_users(limit=2)
+    assert [(row['user_id'], row['visits'], row['total_duration']) for row in top] == [
+        ('u1', 2, 60.0), ('u2', 2, 180.0)
+    ]
+    assert str(top[1]['last_active']) == '2025-01-02 09:00:00'
+
+    pytest.importorskip('numpy')
+    from columnar_cache import ColumnarCache
+
+    cache = ColumnarCache()
+    cache.refresh(audit_db)
+    assert cache.snapshot.get_top_users(limit=2) == top
+
+
+def test_count_only_plan_streams_no_columns(audit_db, monkeypatch):
+    queries = []
+    iter_rows = audit_db._iter_rows
+
+    def recording(query, params=None, itersize=None):
+        queries.append(query)
+        return iter_rows(query, params, itersize)
+    monkeypatch.setattr(audit_db, '_iter_rows', recording)
+
+    assert audit_db.aggregate(AggregationPlan(Count('total')), mode='python') == {'total': len(ROWS)}
+    assert queries and all('*' not in query for query in queries)
@@ -0,0 +1,69 @@
+"""
+DatabaseService.get_count against PostgreSQL
+"""
+import uuid
+
+import pytest
+
+
+@pytest.fixture
+def audit_table(postgres_db):
+    """A throwaway audit table name; the test creates the table, dropping it drops its partitions"""
+    table = f"count_test_{uuid.uuid4().hex[:8]}"
+    postgres_db.table_name = table
+    yield table
+    conn = postgres_db.get_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {table}")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def run(db, *statements):
+    conn = db.get_connection()
+    try:
+        with conn.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def insert_rows(table: str, count: int) -> str:
+    return f"""
+        INSERT INTO {table} (pk, audit_datetime)
+        SELECT n, TIMESTAMP '2025-01-01' + (n % 59) * INTERVAL '1 day'
+        FROM generate_series(1, {count}) AS n
+    """
+
+
+def test_estimate_counts_partitioned_rows_once(postgres_db, audit_table):
+    run(
+        postgres_db,
+        f"CREATE TABLE {audit_table} (pk BIGINT, audit_datetime TIMESTAMP) PARTITION BY RANGE (audit_datetime)",
+        f"CREATE TABLE {audit_table}_default PARTITION OF {audit_table} DEFAULT",
+        f"CREATE TABLE {audit_table}_2025_01 PARTITION OF {audit_table} "
+        "FOR VALUES FROM ('2025-01-01') TO ('2025-02-01')",
+        f"CREATE TABLE {audit_table}_2025_02 PARTITION OF {audit_table} "
+        "FOR VALUES FROM ('2025-02-01') TO ('2025-03-01')",
+        insert_rows(audit_table, 5000),
+        # Fills in reltuples on the parent as well as on every partition
+        f"ANALYZE {audit_table}",
+        # Not analyzed: an exact count would now see 5100 rows
+        insert_rows(audit_table, 100),
+    )
+    assert postgres_db.get_count('estimate') == 5000
+
+
+def test_estimate_unpartitioned_table(postgres_db, audit_table):
+    run(
+        postgres_db,
+        f"CREATE TABLE {audit_table} (pk BIGINT, audit_datetime TIMESTAMP)",
+        insert_rows(audit_table, 5000),
+        f"ANALYZE {audit_table}",
+        insert_rows(audit_table, 100),
+    )
+    assert postgres_db.get_count('estimate') == 5000
@@ -0,0 +1,63 @@
+"""
+Dashboard handlers must not cache (or serve as 200) the fallback of a failed query
+"""
+import psycopg2
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from api.routes import dashboard
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(dashboard.result_cache, 'version_source', None)
+    dashboard.result_cache.invalidate()
+    app = FastAPI()
+    app.include_router(dashboard.router, prefix="/api")
+    return TestClient(app)
+
+
+def fail_queries(monkeypatch):
+    def failing(query, params=None):
+        raise psycopg2.OperationalError("could not connect to server")
+    monkeypatch.setattr(dashboard.db_service, '_fetch_all', failing)
+
+
+def test_failed_query_is_not_cached(client, monkeypatch):
+    fail_queries(monkeypatch)
+    response = client.get("/api/top-users?start_date=2025-01-01&end_date=2025-01-31")
+    assert response.status_code == 503
+    assert response.json() == []
+    assert "etag" not in response.headers
+
+    # Once the database recovers, the next request queries it instead of a cached []
+    rows = [{"key": "u1", "visits": 3, "total_duration": 600.0, "last_active": None}]
+    monkeypatch.setattr(dashboard.db_service, '_fetch_all', lambda query, params=None: rows)
+    response = client.get("/api/top-users?start_date=2025-01-01&end_date=2025-01-31")
+    assert response.status_code == 200
+    assert response.json() == [{"name": "User u1", "visits": 3, "totalTime": "10 min"}]
+
+
+def test_failed_hourly_query_is_not_cached(client, monkeypatch):
+    fail_queries(monkeypatch)
+    response = client.get("/api/activity?start_date=2025-01-01&end_date=2025-01-07&timezone=Europe/Paris")
+    assert response.status_code == 503
+    assert dashboard.result_cache.stats()["entries"] == 0
+
+
+def test_unknown_timezone_is_a_client_error(client, monkeypatch):
+    fail_queries(monkeypatch)
+    response = client.get("/api/activity?start_date=2025-01-01&end_date=2025-01-07&timezone=Not/AZone")
+    assert response.status_code == 400
+    assert response.json() == {"error": "Unknown time zone: Not/AZone"}
+    assert dashboard.result_cache.stats()["entries"] == 0
+
+
+@pytest.mark.parametrize("query", ["format=xml", "fields=no_such_column"])
+def test_invalid_all_data_parameters_are_client_errors(client, monkeypatch, query):
+    monkeypatch.setattr(dashboard.db_service, 'get_table_columns', lambda: ['user_id', 'audit_datetime'])
+    response = client.get(f"/api/all-data?{query}")
+    assert response.status_code == 400
+    assert response.json()["success"] is False
+    assert response.json()["error"]
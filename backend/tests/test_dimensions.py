@@ -0,0 +1,51 @@
+"""
+Filter options (user_id / tenant_id values) from the loaders' dimension catalog
+"""
+import uuid
+
+import pytest
+
+
+@pytest.fixture
+def audit_db(postgres_db):
+    table = f"dimensions_test_{uuid.uuid4().hex[:8]}"
+    catalog = f"{table}_catalog"
+    postgres_db.table_name = table
+    postgres_db.dimensions_table = catalog
+    conn = postgres_db.get_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(f"CREATE TABLE {table} (user_id TEXT, tenant_id TEXT)")
+            cursor.execute(f"INSERT INTO {table} VALUES ('u1', 't1'), ('u2', 't1'), ('', NULL)")
+            cursor.execute(f"""
+                CREATE TABLE {catalog} (
+                    table_name TEXT NOT NULL, dimension TEXT NOT NULL, value TEXT NOT NULL,
+                    PRIMARY KEY (table_name, dimension, value)
+                )
+            """)
+            # Another table's entries: the catalog exists but has not been backfilled for this one
+            cursor.execute(f"INSERT INTO {catalog} VALUES ('other_table', 'user_id', 'someone')")
+        conn.commit()
+        yield postgres_db
+    finally:
+        with conn.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {table}, {catalog}")
+        conn.commit()
+        conn.close()
+
+
+def test_unbackfilled_table_reads_values_from_the_table(audit_db):
+    assert audit_db._query_dimension_values() == {'user_id': ['u1', 'u2'], 'tenant_id': ['t1']}
+
+
+def test_backfilled_table_reads_values_from_the_catalog(audit_db):
+    conn = audit_db.get_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {audit_db.dimensions_table} VALUES (%s, 'user_id', 'u1')",
+                           [audit_db.table_name])
+        conn.commit()
+    finally:
+        conn.close()
+
+    assert audit_db._query_dimension_values() == {'user_id': ['u1'], 'tenant_id': []}
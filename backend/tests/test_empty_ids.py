@@ -0,0 +1,85 @@
+"""
+Empty-string user_id / patient_id values are not users or patients, in every query
+path (SQL aggregates, aggregation plans and the columnar snapshot)
+"""
+import uuid
+
+import pytest
+
+from aggregation import AggregationPlan, Distinct
+
+ROWS = [
+    # (user_id, patient_id, audit_datetime)
+    ('u1', 'p1', '2025-01-01 09:00'),
+    ('u1', 'p2', '2025-01-01 09:30'),
+    ('u2', 'p2', '2025-01-01 10:00'),
+    ('', '', '2025-01-01 10:15'),
+    (None, None, '2025-01-01 11:00'),
+]
+
+
+@pytest.fixture
+def audit_db(postgres_db):
+    table = f"empty_ids_test_{uuid.uuid4().hex[:8]}"
+    postgres_db.table_name = table
+    postgres_db.use_rollups = False
+    conn = postgres_db.get_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(f"""
+                CREATE TABLE {table} (
+                    pk BIGSERIAL, user_id TEXT, patient_id TEXT, tenant_id TEXT, status TEXT,
+                    event_name TEXT, audio_duration DOUBLE PRECISION, audit_datetime TIMESTAMP
+                )
+            """)
+            for user_id, patient_id, audit_datetime in ROWS:
+                cursor.execute(
+                    f"INSERT INTO {table} (user_id, patient_id, status, audio_duration, audit_datetime) "
+                    "VALUES (%s, %s, 'completed', 60, %s)",
+                    [user_id, patient_id, audit_datetime]
+                )
+        conn.commit()
+        yield postgres_db
+    finally:
+        with conn.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {table}")
+        conn.commit()
+        conn.close()
+
+
+def test_metrics_skip_empty_ids(audit_db):
+    metrics = audit_db.get_metrics()[0]
+    assert metrics['unique_users'] == 2
+    assert metrics['unique_patients'] == 2
+
+    plan = AggregationPlan(Distinct('unique_users', 'user_id'), Distinct('unique_patients', 'patient_id'))
+    assert audit_db.aggregate(plan, mode='sql') == {'unique_users': 2, 'unique_patients': 2}
+
+
+def test_columnar_metrics_skip_empty_ids(audit_db):
+    pytest.importorskip('numpy')
+    from columnar_cache import ColumnarCache
+
+    cache = ColumnarCache()
+    cache.refresh(audit_db)
+    metrics = cache.snapshot.get_metrics()[0]
+    assert metrics['unique_users'] == 2
+    assert metrics['unique_patients'] == 2
+
+
+def test_dashboard_bundle_skips_empty_ids(audit_db):
+    totals = audit_db.get_dashboard_bundle()["totals"]
+    assert totals['unique_users'] == 2
+    assert totals['unique_patients'] == 2
+
+
+def test_hourly_active_users_skip_empty_ids(audit_db):
+    expected = [{"hour": 9, "active_users": 1}, {"hour": 10, "active_users": 1}]
+    assert audit_db.get_hourly_active_users(timezone='UTC') == expected
+
+    pytest.importorskip('numpy')
+    from columnar_cache import ColumnarCache
+
+    cache = ColumnarCache()
+    cache.refresh(audit_db)
+    assert cache.snapshot.get_hourly_active_users(timezone='UTC') == expected
@@ -0,0 +1,56 @@
+"""
+Middleware stack of the API app
+"""
+from fastapi.testclient import TestClient
+from starlette.requests import Request
+
+from api.middleware import ETagMiddleware
+
+
+def test_not_modified_carries_cors_headers(monkeypatch):
+    async def watermark(self):
+        return "load:1"
+    monkeypatch.setattr(ETagMiddleware, 'watermark', watermark)
+    monkeypatch.setenv('RUN_MIGRATIONS', 'false')
+    import main
+
+    request = Request({"type": "http", "method": "GET", "scheme": "http", "server": ("testserver", 80),
+                       "path": "/api/metrics", "query_string": b"", "headers": []})
+    etag = ETagMiddleware.compute_etag(request, "load:1")
+
+    client = TestClient(main.app)
+    response = client.get("/api/metrics", headers={"Origin": "http://localhost:5173", "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["access-control-allow-origin"] in ("*", "http://localhost:5173")
+
+
+def test_etag_moves_with_the_result_cache_version():
+    from fastapi import FastAPI
+    from result_cache import ResultCache
+
+    data = {"version": 1, "body": "before load"}
+
+    async def version_source():
+        return data["version"]
+
+    cache = ResultCache(version_check_interval=0, version_source=version_source)
+    app = FastAPI()
+
+    @app.get("/api/metrics")
+    @cache.cached('metrics')
+    async def metrics():
+        return {"body": data["body"]}
+
+    app.add_middleware(ETagMiddleware, watermark_source=cache.current_version, refresh_interval=0)
+    client = TestClient(app)
+
+    first = client.get("/api/metrics")
+    assert first.json() == {"body": "before load"}
+    assert client.get("/api/metrics", headers={"If-None-Match": first.headers["etag"]}).status_code == 304
+
+    # A load lands: the old tag must not revalidate, and the new tag must not carry the old body
+    data.update(version=2, body="after load")
+    second = client.get("/api/metrics", headers={"If-None-Match": first.headers["etag"]})
+    assert second.status_code == 200
+    assert second.json() == {"body": "after load"}
+    assert second.headers["etag"] != first.headers["etag"]
@@ -0,0 +1,121 @@
+"""
+Index migrations on plain and partitioned audit tables
+"""
+import uuid
+
+import pytest
+
+from migrations import (MIGRATIONS, MIGRATIONS_TABLE, ExplainingDatabaseService, dashboard_queries,
+                        explain_queries, migrate, uses_index)
+
+COLUMNS = "pk BIGINT, user_id TEXT, status TEXT, tenant_id TEXT, audit_datetime TIMESTAMP"
+AUDIT_COLUMNS = (COLUMNS + ", patient_id TEXT, event_name TEXT, note_format TEXT, audio_duration TEXT")
+
+
+@pytest.fixture
+def audit_table(postgres_db):
+    table = f"migrations_test_{uuid.uuid4().hex[:8]}"
+    postgres_db.table_name = table
+    yield table
+    conn = postgres_db.get_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {table}")
+            cursor.execute(f"DELETE FROM {MIGRATIONS_TABLE} WHERE table_name = %s", [table])
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def run(db, *statements):
+    conn = db.get_connection()
+    try:
+        with conn.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+            conn.commit()
+            if cursor.description:
+                return cursor.fetchall()
+    finally:
+        conn.close()
+
+
+def indexes(db, table):
+    """(index name, valid) for every index on table"""
+    return run(db, f"""
+        SELECT c.relname, x.indisvalid FROM pg_index x JOIN pg_class c ON c.oid = x.indexrelid
+        WHERE x.indrelid = '{table}'::regclass ORDER BY 1
+    """)
+
+
+def test_migrate_plain_table(postgres_db, audit_table):
+    run(postgres_db, f"CREATE TABLE {audit_table} ({COLUMNS})")
+
+    assert migrate(postgres_db) == [version for version, *_ in MIGRATIONS]
+    found = indexes(postgres_db, audit_table)
+    assert len(found) == len(MIGRATIONS)
+    assert all(valid for _, valid in found)
+    assert migrate(postgres_db) == []
+
+
+def test_migrate_partitioned_table(postgres_db, audit_table):
+    run(
+        postgres_db,
+        f"CREATE TABLE {audit_table} ({COLUMNS}) PARTITION BY RANGE (audit_datetime)",
+        f"CREATE TABLE {audit_table}_default PARTITION OF {audit_table} DEFAULT",
+        f"CREATE TABLE {audit_table}_2025_01 PARTITION OF {audit_table} "
+        "FOR VALUES FROM ('2025-01-01') TO ('2025-02-01')",
+    )
+
+    assert migrate(postgres_db) == [version for version, *_ in MIGRATIONS]
+    parent = indexes(postgres_db, audit_table)
+    assert len(parent) == len(MIGRATIONS)
+    # The parent index only becomes valid once every partition's index is attached
+    assert all(valid for _, valid in parent)
+    for partition in (f"{audit_table}_default", f"{audit_table}_2025_01"):
+        assert len(indexes(postgres_db, partition)) == len(MIGRATIONS)
+
+    # A partition attached afterwards gets the indexes from PostgreSQL
+    run(postgres_db, f"CREATE TABLE {audit_table}_2025_02 PARTITION OF {audit_table} "
+                     "FOR VALUES FROM ('2025-02-01') TO ('2025-03-01')")
+    assert len(indexes(postgres_db, f"{audit_table}_2025_02")) == len(MIGRATIONS)
+
+
+@pytest.mark.parametrize("partitioned", [False, True])
+def test_dashboard_queries_use_an_index(postgres_db, audit_table, partitioned):
+    if partitioned:
+        run(
+            postgres_db,
+            f"CREATE TABLE {audit_table} ({AUDIT_COLUMNS}) PARTITION BY RANGE (audit_datetime)",
+            f"CREATE TABLE {audit_table}_default PARTITION OF {audit_table} DEFAULT",
+            f"CREATE TABLE {audit_table}_2025_06 PARTITION OF {audit_table} "
+            "FOR VALUES FROM ('2025-06-01') TO ('2025-07-01')",
+        )
+    else:
+        run(postgres_db, f"CREATE TABLE {audit_table} ({AUDIT_COLUMNS})")
+    run(
+        postgres_db,
+        f"""
+        INSERT INTO {audit_table}
+        SELECT n, 'user-' || (n % 50), (ARRAY['completed', 'FINALIZED', 'failed'])[n % 3 + 1],
+               'tenant-' || (n % 7), TIMESTAMP '2024-01-01' + n * INTERVAL '10 minutes',
+               'patient-' || (n % 500), 'listening', 'soap', (n % 300)::TEXT
+        FROM generate_series(1, 20000) AS n
+        """,
+    )
+    migrate(postgres_db)
+    run(postgres_db, f"ANALYZE {audit_table}")
+
+    # Sequential scans are disabled for the EXPLAIN session only: the test asserts that
+    # every query has a usable index, whatever the planner prefers on a small table
+    db = ExplainingDatabaseService(planner_settings={'enable_seqscan': 'off'})
+    db.table_name = audit_table
+    try:
+        results = explain_queries(db, dashboard_queries(db, '2025-06-01', '2025-06-30'))
+    finally:
+        db.close()
+
+    labels = {label for label, _, _ in results}
+    assert {"dashboard bundle", "metrics", "active users (sql)", "active users (python)"} <= labels
+    unindexed = [(label, scans) for label, scans, _ in results if not uses_index(scans)]
+    assert unindexed == []
@@ -72,28 +72,16 @@ function App() {
       const queryString = params.toString()
       const urlSuffix = queryString ? `?${queryString}` : ''
       
-      const [
-        metricsRes,
-        topUsersRes,
-        activeUsersRes,
-        staffSpeakingRes,
-        timesRes,
-        consentsRes
-      ] = await Promise.all([
-        axios.get(`${API_BASE_URL}/api/metrics${urlSuffix}`),
-        axios.get(`${API_BASE_URL}/api/top-users${urlSuffix}`),
-        axios.get(`${API_BASE_URL}/api/active-users${urlSuffix}`),
-        axios.get(`${API_BASE_URL}/api/staff-speaking${urlSuffix}`),
-        axios.get(`${API_BASE_URL}/api/times${urlSuffix}`),
-        axios.get(`${API_BASE_URL}/api/consents${urlSuffix}`)
-      ])
+      // All six widgets come from one bundle request computed in a single scan
+      const bundleRes = await axios.get(`${API_BASE_URL}/api/dashboard-bundle${urlSuffix}`)
+      const bundle = bundleRes.data || {}
 
-      setMetrics(metricsRes.data || [])
-      setTopUsers(topUsersRes.data || [])
-      setActiveUsers(activeUsersRes.data || { active: 0, enabled: 0 })
-      setStaffSpeaking(staffSpeakingRes.data || { staff: 0, nonStaff: 0 })
-      setTimesData(timesRes.data || [])
-      setConsentsData(consentsRes.data || { listening: 0, dictation: 0 })
+      setMetrics(bundle.metrics || [])
+      setTopUsers(bundle.topUsers || [])
+      setActiveUsers(bundle.activeUsers || { active: 0, enabled: 0 })
+      setStaffSpeaking(bundle.staffSpeaking || { staff: 0, nonStaff: 0 })
+      setTimesData(bundle.times || [])
+      setConsentsData(bundle.consents || { listening: 0, dictation: 0 })
     } catch (error) {
       console.error('Error fetching dashboard data:', error)
       // Set default values on error
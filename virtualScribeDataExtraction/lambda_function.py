@@ -13,6 +13,11 @@ from psycopg2.extras import execute_values
 from io import BytesIO
 from typing import Dict, Optional
 import logging
+from loader_tables import (
+    PARTITION_COLUMN, generate_create_table_sql, ensure_default_partition, ensure_month_partitions,
+    ensure_load_stats_table, record_load, ensure_dimensions_table, ensure_rollup_table,
+    begin_load, record_rows
+)
 
 # Configure logging
 logger = logging.getLogger()
@@ -30,6 +35,9 @@ DB_CONFIG = {
 # Table name from environment variable or default
 TABLE_NAME = os.environ.get('TABLE_NAME', 'audittrail_firehose')
 
+# New tables are range-partitioned by month on this column (one partition per month, created on load)
+PARTITION_BY_MONTH = os.environ.get('PARTITION_BY_MONTH', 'true').lower() == 'true'
+
 # Initialize S3 client
 s3_client = boto3.client('s3')
 
@@ -149,33 +157,6 @@ def analyze_parquet_schema_from_s3(bucket: str, key: str) -> Optional[Dict]:
         raise
 
 
-def generate_create_table_sql(schema_info: Dict, table_name: str) -> str:
-    """
-    Generate CREATE TABLE SQL statement from schema.
-    
-    Args:
-        schema_info: Schema information dictionary
-        table_name: Name of the table to create
-        
-    Returns:
-        CREATE TABLE SQL statement
-    """
-    columns = []
-    for col in schema_info['columns']:
-        col_def = f'    "{col["name"]}" {col["pg_type"]}'
-        if not col['nullable']:
-            col_def += ' NOT NULL'
-        columns.append(col_def)
-    
-    # Join columns with newline (can't use \n in f-string expression)
-    columns_str = ',\n'.join(columns)
-    sql = f"""CREATE TABLE IF NOT EXISTS {table_name} (
-{columns_str}
-);"""
-    
-    return sql
-
-
 def ensure_table_exists(conn, schema_info: Dict, table_name: str):
     """
     Ensure PostgreSQL table exists, create if it doesn't.
@@ -201,8 +182,11 @@ def ensure_table_exists(conn, schema_info: Dict, table_name: str):
         
         if not table_exists:
             logger.info(f"Table {table_name} does not exist. Creating...")
-            create_sql = generate_create_table_sql(schema_info, table_name)
+            create_sql = generate_create_table_sql(
+                schema_info, table_name, PARTITION_COLUMN if PARTITION_BY_MONTH else None
+            )
             cursor.execute(create_sql)
+            ensure_default_partition(cursor, table_name)
             conn.commit()
             logger.info(f"Table {table_name} created successfully")
         else:
@@ -256,6 +240,8 @@ def load_parquet_from_s3_to_postgres(conn, bucket: str, key: str, table_name: st
         
         # Insert data using execute_values for better performance
         cursor = conn.cursor()
+        ensure_month_partitions(cursor, table_name, df)
+        tracking = begin_load(cursor, table_name)
         logger.info(f"Inserting {len(values)} rows...")
         
         execute_values(
@@ -266,6 +252,10 @@ def load_parquet_from_s3_to_postgres(conn, bucket: str, key: str, table_name: st
             page_size=1000
         )
         
+        # Keep the row count, dimension catalog and rollups in the same transaction as the insert
+        record_load(cursor, table_name, len(values))
+        record_rows(cursor, table_name, df, tracking)
+        
         conn.commit()
         cursor.close()
         
@@ -322,6 +312,9 @@ def lambda_handler(event, context):
             try:
                 # Ensure table exists
                 ensure_table_exists(conn, schema_info, TABLE_NAME)
+                ensure_load_stats_table(conn, TABLE_NAME)
+                ensure_dimensions_table(conn, TABLE_NAME)
+                ensure_rollup_table(conn, TABLE_NAME)
                 
                 # Load data
                 load_parquet_from_s3_to_postgres(conn, bucket, key, TABLE_NAME)
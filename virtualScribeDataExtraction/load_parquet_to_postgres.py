@@ -3,12 +3,19 @@ Script to analyze parquet schema, create PostgreSQL table, and load data.
 """
 
 import os
+import logging
 import pyarrow.parquet as pq
 import pandas as pd
 import psycopg2
 from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
 from pathlib import Path
 from typing import Dict, List, Optional
+from loader_tables import (
+    LOAD_STATS_TABLE, DIMENSIONS_TABLE, ROLLUP_TABLE, PARTITION_COLUMN,
+    generate_create_table_sql, ensure_default_partition, ensure_month_partitions,
+    ensure_load_stats_table, record_load, ensure_dimensions_table, ensure_rollup_table,
+    begin_load, record_rows
+)
 
 
 # PostgreSQL connection configuration
@@ -23,6 +30,9 @@ DB_CONFIG = {
 # Table name for the data
 TABLE_NAME = 'audittrail_firehose'
 
+# New tables are range-partitioned by month on this column (one partition per month, created on load)
+PARTITION_BY_MONTH = True
+
 
 def map_arrow_to_postgres_type(arrow_type: str) -> str:
     """
@@ -130,31 +140,6 @@ def analyze_parquet_schema(file_path: str) -> Optional[Dict]:
         return None
 
 
-def generate_create_table_sql(schema_info: Dict, table_name: str) -> str:
-    """
-    Generate CREATE TABLE SQL statement from schema.
-    
-    Args:
-        schema_info: Schema information dictionary
-        table_name: Name of the table to create
-        
-    Returns:
-        CREATE TABLE SQL statement
-    """
-    columns = []
-    for col in schema_info['columns']:
-        col_def = f'    "{col["name"]}" {col["pg_type"]}'
-        if not col['nullable']:
-            col_def += ' NOT NULL'
-        columns.append(col_def)
-    
-    sql = f"""CREATE TABLE IF NOT EXISTS {table_name} (
-{',\n'.join(columns)}
-);"""
-    
-    return sql
-
-
 def create_postgres_table(conn, schema_info: Dict, table_name: str, drop_existing: bool = False):
     """
     Create PostgreSQL table from schema.
@@ -171,9 +156,21 @@ def create_postgres_table(conn, schema_info: Dict, table_name: str, drop_existin
         if drop_existing:
             print(f"Dropping existing table {table_name} if it exists...")
             cursor.execute(f'DROP TABLE IF EXISTS {table_name};')
+            # Forget the maintained row count so it is re-seeded for the new table
+            cursor.execute("SELECT to_regclass(%s) IS NOT NULL;", (LOAD_STATS_TABLE,))
+            if cursor.fetchone()[0]:
+                cursor.execute(f'DELETE FROM {LOAD_STATS_TABLE} WHERE table_name = %s;', (table_name,))
+            cursor.execute("SELECT to_regclass(%s) IS NOT NULL;", (DIMENSIONS_TABLE,))
+            if cursor.fetchone()[0]:
+                cursor.execute(f'DELETE FROM {DIMENSIONS_TABLE} WHERE table_name = %s;', (table_name,))
+            cursor.execute("SELECT to_regclass(%s) IS NOT NULL;", (ROLLUP_TABLE,))
+            if cursor.fetchone()[0]:
+                cursor.execute(f'DELETE FROM {ROLLUP_TABLE} WHERE table_name = %s;', (table_name,))
             conn.commit()
         
-        create_sql = generate_create_table_sql(schema_info, table_name)
+        create_sql = generate_create_table_sql(
+            schema_info, table_name, PARTITION_COLUMN if PARTITION_BY_MONTH else None
+        )
         print(f"\nCreating table {table_name}...")
         print("SQL Statement:")
         print("-" * 80)
@@ -181,6 +178,7 @@ def create_postgres_table(conn, schema_info: Dict, table_name: str, drop_existin
         print("-" * 80)
         
         cursor.execute(create_sql)
+        ensure_default_partition(cursor, table_name)
         conn.commit()
         print(f"✓ Table {table_name} created successfully!")
         
@@ -223,27 +221,36 @@ def load_parquet_to_postgres(conn, file_path: str, table_name: str, batch_size:
         # Replace NaN with None for PostgreSQL
         df = df.where(pd.notnull(df), None)
         
+        # Partitions for the months in this file, committed with the first batch
+        ensure_month_partitions(cursor, table_name, df)
+        tracking = begin_load(cursor, table_name)
+        
         # Prepare insert statement
         placeholders = ', '.join(['%s'] * len(column_names))
         insert_sql = f'INSERT INTO {table_name} ({columns_str}) VALUES ({placeholders})'
         
-        # Insert data in batches
+        # Insert data in batches; the catalog and rollups are committed with the rows they cover
         rows_to_insert = []
         for idx, row in df.iterrows():
             rows_to_insert.append(tuple(row))
             
             if len(rows_to_insert) >= batch_size:
                 cursor.executemany(insert_sql, rows_to_insert)
+                record_load(cursor, table_name, len(rows_to_insert), completed=False)
+                record_rows(cursor, table_name, df.iloc[total_rows:total_rows + len(rows_to_insert)], tracking)
                 conn.commit()
+                tracking = begin_load(cursor, table_name)
                 total_rows += len(rows_to_insert)
                 print(f"  Inserted {total_rows:,} rows...", end='\r')
                 rows_to_insert = []
         
-        # Insert remaining rows
+        # Insert remaining rows and mark the load as complete
         if rows_to_insert:
             cursor.executemany(insert_sql, rows_to_insert)
-            conn.commit()
-            total_rows += len(rows_to_insert)
+        record_load(cursor, table_name, len(rows_to_insert))
+        record_rows(cursor, table_name, df.iloc[total_rows:total_rows + len(rows_to_insert)], tracking)
+        conn.commit()
+        total_rows += len(rows_to_insert)
         
         cursor.close()
         print(f"\n✓ Successfully loaded {total_rows:,} rows from {os.path.basename(file_path)}")
@@ -291,6 +298,8 @@ def get_common_schema(parquet_files: List[str]) -> Optional[Dict]:
 
 def main():
     """Main function to orchestrate the entire process."""
+    # Show the partition / bookkeeping messages from loader_tables alongside the prints below
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
     print("=" * 80)
     print("Parquet to PostgreSQL Data Loader")
     print("=" * 80)
@@ -349,6 +358,9 @@ def main():
         print("Creating PostgreSQL Table...")
         print(f"{'='*80}")
         create_postgres_table(conn, schema_info, TABLE_NAME, drop_existing=False)
+        ensure_load_stats_table(conn, TABLE_NAME)
+        ensure_dimensions_table(conn, TABLE_NAME)
+        ensure_rollup_table(conn, TABLE_NAME)
         
         # Load data from all parquet files
         print(f"\n{'='*80}")
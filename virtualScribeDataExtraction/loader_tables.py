@@ -0,0 +1,554 @@
+"""
+Table setup and bookkeeping shared by the parquet loaders (lambda_function.py and
+load_parquet_to_postgres.py): the monthly partitions of the data table, and the
+load statistics, dimension catalog and rollup tables the dashboard API reads.
+
+Tables that already had rows when the dimension catalog / rollups were introduced
+are backfilled once, outside the load path:
+    python loader_tables.py --table audittrail_firehose
+"""
+
+import os
+import argparse
+import logging
+import pandas as pd
+import psycopg2
+from psycopg2.extras import execute_values
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Bookkeeping table holding maintained row counts and load counters per data table
+LOAD_STATS_TABLE = os.environ.get('LOAD_STATS_TABLE', 'table_load_stats')
+
+# Catalog of distinct filter values (practitioners, programs/locations) per data table
+DIMENSIONS_TABLE = os.environ.get('DIMENSIONS_TABLE', 'table_dimensions')
+DIMENSION_COLUMNS = ['user_id', 'tenant_id']
+
+# Hourly and daily pre-aggregates of each data table for the dashboard charts
+ROLLUP_TABLE = os.environ.get('ROLLUP_TABLE', 'table_rollups')
+
+# Partitioned data tables are range-partitioned by month on this column
+PARTITION_COLUMN = 'audit_datetime'
+
+
+def generate_create_table_sql(schema_info: Dict, table_name: str,
+                              partition_column: Optional[str] = None) -> str:
+    """
+    Generate CREATE TABLE SQL statement from schema.
+    
+    Args:
+        schema_info: Schema information dictionary
+        table_name: Name of the table to create
+        partition_column: Range-partition the table on this column, if the schema has it
+        
+    Returns:
+        CREATE TABLE SQL statement
+    """
+    columns = []
+    for col in schema_info['columns']:
+        col_def = f'    "{col["name"]}" {col["pg_type"]}'
+        if not col['nullable']:
+            col_def += ' NOT NULL'
+        columns.append(col_def)
+    
+    # Join columns with newline (can't use \n in f-string expression)
+    columns_str = ',\n'.join(columns)
+    partition_str = ''
+    if partition_column and any(col['name'] == partition_column for col in schema_info['columns']):
+        partition_str = f' PARTITION BY RANGE ("{partition_column}")'
+    sql = f"""CREATE TABLE IF NOT EXISTS {table_name} (
+{columns_str}
+){partition_str};"""
+    
+    return sql
+
+
+def is_partitioned(cursor, table_name: str) -> bool:
+    """Whether table_name is a partitioned table"""
+    cursor.execute("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(%s);", (table_name,))
+    row = cursor.fetchone()
+    return bool(row and row[0])
+
+
+def ensure_default_partition(cursor, table_name: str):
+    """
+    Give a partitioned table its default partition, which catches rows without a
+    usable audit_datetime; months get their own partitions as they are loaded.
+    """
+    if is_partitioned(cursor, table_name):
+        cursor.execute(f'CREATE TABLE IF NOT EXISTS {table_name}_default PARTITION OF {table_name} DEFAULT;')
+
+
+def month_partition_name(table_name: str, month: pd.Period) -> str:
+    return f"{table_name}_{month.year:04d}_{month.month:02d}"
+
+
+def month_bounds(month: pd.Period) -> tuple:
+    """[start, end) of a month as date literals, valid for TIMESTAMP and ISO TEXT columns"""
+    return month.start_time.strftime('%Y-%m-%d'), (month + 1).start_time.strftime('%Y-%m-%d')
+
+
+def create_month_partition(cursor, table_name: str, month: pd.Period):
+    """
+    Create and attach the partition for one month, in the caller's transaction.
+    Rows for that month already in the default partition are moved into it first,
+    since a new partition cannot be attached while the default still holds its rows.
+    """
+    partition = month_partition_name(table_name, month)
+    start, end = month_bounds(month)
+    cursor.execute(f'CREATE TABLE {partition} (LIKE {table_name} INCLUDING DEFAULTS INCLUDING CONSTRAINTS);')
+    cursor.execute(f"""
+        WITH moved AS (
+            DELETE FROM {table_name}_default
+            WHERE "{PARTITION_COLUMN}" >= %s AND "{PARTITION_COLUMN}" < %s
+            RETURNING *
+        )
+        INSERT INTO {partition} SELECT * FROM moved;
+    """, (start, end))
+    cursor.execute(
+        f'ALTER TABLE {table_name} ATTACH PARTITION {partition} FOR VALUES FROM (%s) TO (%s);',
+        (start, end)
+    )
+
+
+def ensure_month_partitions(cursor, table_name: str, df: pd.DataFrame):
+    """
+    Create the monthly partitions for the rows in df, in the caller's transaction,
+    so PostgreSQL routes the insert to them instead of the default partition
+    (which only keeps rows without a usable audit_datetime). Months are read from
+    the wall-clock 'YYYY-MM' prefix, which is what the partition bounds compare.
+    No-op for unpartitioned tables.
+    
+    Args:
+        cursor: Cursor in the transaction that inserts the rows
+        table_name: Name of the data table
+        df: DataFrame of the rows being loaded
+    """
+    if df.empty or PARTITION_COLUMN not in df.columns or not is_partitioned(cursor, table_name):
+        return
+    
+    prefixes = (
+        df[PARTITION_COLUMN].dropna().astype(str)
+        .str.extract(r'^(\d{4}-\d{2})-', expand=False).dropna().unique()
+    )
+    
+    for month in sorted(pd.Period(prefix, freq='M') for prefix in prefixes):
+        partition = month_partition_name(table_name, month)
+        cursor.execute("SELECT to_regclass(%s) IS NOT NULL;", (partition,))
+        if cursor.fetchone()[0]:
+            continue
+        # Serialize partition creation between concurrent loads, then re-check
+        cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s));", (table_name,))
+        cursor.execute("SELECT to_regclass(%s) IS NOT NULL;", (partition,))
+        if cursor.fetchone()[0]:
+            continue
+        create_month_partition(cursor, table_name, month)
+        logger.info(f"Created partition {partition}")
+
+
+def detach_month_partition(conn, table_name: str, year: int, month: int):
+    """
+    Detach one month's partition from table_name, e.g. to archive or drop old data
+    without a bulk DELETE. The detached table keeps its rows under the same name;
+    they are taken out of the maintained row count and the rollups.
+    
+    Args:
+        conn: PostgreSQL connection
+        table_name: Name of the data table
+        year: Year of the partition
+        month: Month of the partition (1-12)
+    """
+    period = pd.Period(year=year, month=month, freq='M')
+    partition = month_partition_name(table_name, period)
+    start, end = month_bounds(period)
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute(f'SELECT COUNT(*) FROM {partition};')
+        rows = cursor.fetchone()[0]
+        cursor.execute(f'ALTER TABLE {table_name} DETACH PARTITION {partition};')
+        cursor.execute("SELECT to_regclass(%s) IS NOT NULL;", (LOAD_STATS_TABLE,))
+        if cursor.fetchone()[0]:
+            record_load(cursor, table_name, -rows)
+        cursor.execute("SELECT to_regclass(%s) IS NOT NULL;", (ROLLUP_TABLE,))
+        if cursor.fetchone()[0]:
+            cursor.execute(
+                f'DELETE FROM {ROLLUP_TABLE} WHERE table_name = %s AND bucket >= %s AND bucket < %s;',
+                (table_name, start, end)
+            )
+        conn.commit()
+        logger.info(f"Detached partition {partition} ({rows:,} rows)")
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Error detaching partition {partition}: {e}")
+        raise
+    finally:
+        cursor.close()
+
+
+def ensure_load_stats_table(conn, table_name: str):
+    """
+    Ensure the load statistics table exists and has a row for table_name.
+    The row is seeded with an exact COUNT(*) the first time, after which
+    every load keeps it current without rescanning the data table.
+    
+    Args:
+        conn: PostgreSQL connection
+        table_name: Name of the data table
+    """
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {LOAD_STATS_TABLE} (
+                table_name TEXT PRIMARY KEY,
+                row_count BIGINT NOT NULL DEFAULT 0,
+                load_count BIGINT NOT NULL DEFAULT 0,
+                last_loaded_at TIMESTAMP
+            );
+        """)
+        cursor.execute(f"""
+            INSERT INTO {LOAD_STATS_TABLE} (table_name, row_count)
+            SELECT %s, COUNT(*) FROM {table_name}
+            WHERE NOT EXISTS (SELECT 1 FROM {LOAD_STATS_TABLE} WHERE table_name = %s)
+            ON CONFLICT (table_name) DO NOTHING;
+        """, (table_name, table_name))
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Error ensuring load stats table exists: {e}")
+        raise
+    finally:
+        cursor.close()
+
+
+def record_load(cursor, table_name: str, rows_loaded: int, completed: bool = True):
+    """
+    Add loaded rows to the maintained row count, in the caller's transaction.
+    
+    Args:
+        cursor: Cursor in the transaction that inserted the rows
+        table_name: Name of the data table
+        rows_loaded: Number of rows inserted
+        completed: Whether this call finishes a load (bumps load_count)
+    """
+    cursor.execute(f"""
+        UPDATE {LOAD_STATS_TABLE}
+        SET row_count = row_count + %s,
+            load_count = load_count + %s,
+            last_loaded_at = NOW()
+        WHERE table_name = %s;
+    """, (rows_loaded, 1 if completed else 0, table_name))
+
+
+def ensure_dimensions_table(conn, table_name: str):
+    """
+    Ensure the dimension catalog exists. Values already in table_name are added by
+    backfill_dimensions(), not here, so loads never scan the table.
+    
+    Args:
+        conn: PostgreSQL connection
+        table_name: Name of the data table
+    """
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {DIMENSIONS_TABLE} (
+                table_name TEXT NOT NULL,
+                dimension TEXT NOT NULL,
+                value TEXT NOT NULL,
+                first_seen TIMESTAMP NOT NULL DEFAULT NOW(),
+                PRIMARY KEY (table_name, dimension, value)
+            );
+        """)
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Error ensuring dimensions table exists: {e}")
+        raise
+    finally:
+        cursor.close()
+
+
+def record_dimensions(cursor, table_name: str, df: pd.DataFrame):
+    """
+    Add any new user_id / tenant_id values in df to the dimension catalog,
+    in the caller's transaction.
+    
+    Args:
+        cursor: Cursor in the transaction that inserted the rows
+        table_name: Name of the data table
+        df: DataFrame of the rows being loaded
+    """
+    rows = []
+    for column in DIMENSION_COLUMNS:
+        if column not in df.columns:
+            continue
+        for value in df[column].dropna().unique():
+            value = str(value)
+            if value:
+                rows.append((table_name, column, value))
+    
+    if rows:
+        execute_values(
+            cursor,
+            f'INSERT INTO {DIMENSIONS_TABLE} (table_name, dimension, value) VALUES %s ON CONFLICT DO NOTHING',
+            rows
+        )
+
+
+ROLLUP_GRAINS = {'hour': 'h', 'day': 'D'}
+ROLLUP_DIMENSIONS = ['tenant_id', 'user_id', 'status', 'note_format']
+
+
+def ensure_rollup_table(conn, table_name: str):
+    """
+    Ensure the rollup table exists. Rows already in table_name are rolled up by
+    backfill_rollups(), not here, so loads never scan the table.
+    
+    Args:
+        conn: PostgreSQL connection
+        table_name: Name of the data table
+    """
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {ROLLUP_TABLE} (
+                table_name TEXT NOT NULL,
+                grain TEXT NOT NULL,
+                bucket TIMESTAMP NOT NULL,
+                tenant_id TEXT NOT NULL,
+                user_id TEXT NOT NULL,
+                status TEXT NOT NULL,
+                note_format TEXT NOT NULL,
+                event_count BIGINT NOT NULL,
+                audio_duration_sum DOUBLE PRECISION NOT NULL,
+                PRIMARY KEY (table_name, grain, bucket, tenant_id, user_id, status, note_format)
+            );
+        """)
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Error ensuring rollup table exists: {e}")
+        raise
+    finally:
+        cursor.close()
+
+
+def record_rollups(cursor, table_name: str, df: pd.DataFrame):
+    """
+    Add the rows in df to the hourly and daily rollups, in the caller's transaction.
+    Buckets use the wall-clock audit_datetime, matching CAST(... AS TIMESTAMP).
+    
+    Args:
+        cursor: Cursor in the transaction that inserted the rows
+        table_name: Name of the data table
+        df: DataFrame of the rows being loaded
+    """
+    if df.empty or 'audit_datetime' not in df.columns:
+        return
+    
+    timestamps = pd.to_datetime(df['audit_datetime'], errors='coerce')
+    if getattr(timestamps.dt, 'tz', None) is not None:
+        timestamps = timestamps.dt.tz_localize(None)
+    frame = pd.DataFrame({
+        column: (df[column].astype(object).where(df[column].notna(), '').astype(str)
+                 if column in df.columns else '')
+        for column in ROLLUP_DIMENSIONS
+    }, index=df.index)
+    frame['audio_duration'] = (
+        pd.to_numeric(df['audio_duration'], errors='coerce').fillna(0.0)
+        if 'audio_duration' in df.columns else 0.0
+    )
+    
+    rows = []
+    for grain, freq in ROLLUP_GRAINS.items():
+        frame['bucket'] = timestamps.dt.floor(freq)
+        grouped = (
+            frame.dropna(subset=['bucket'])
+            .groupby(['bucket'] + ROLLUP_DIMENSIONS)['audio_duration']
+            .agg(event_count='count', audio_duration_sum='sum')
+            .reset_index()
+        )
+        for record in grouped.itertuples(index=False):
+            rows.append((
+                table_name, grain, record.bucket.to_pydatetime(),
+                record.tenant_id, record.user_id, record.status, record.note_format,
+                int(record.event_count), float(record.audio_duration_sum)
+            ))
+    
+    if rows:
+        execute_values(
+            cursor,
+            f"""
+            INSERT INTO {ROLLUP_TABLE} (table_name, grain, bucket, tenant_id, user_id, status,
+                                        note_format, event_count, audio_duration_sum)
+            VALUES %s
+            ON CONFLICT (table_name, grain, bucket, tenant_id, user_id, status, note_format)
+            DO UPDATE SET event_count = {ROLLUP_TABLE}.event_count + EXCLUDED.event_count,
+                          audio_duration_sum = {ROLLUP_TABLE}.audio_duration_sum + EXCLUDED.audio_duration_sum
+            """,
+            rows,
+            page_size=1000
+        )
+
+
+def begin_load(cursor, table_name: str) -> Dict[str, bool]:
+    """
+    Lock table_name against a running backfill and decide which bookkeeping this
+    load keeps up. The dimension catalog and rollups are only recorded when they
+    already cover the table (it has rows there, from a backfill or from its first
+    load) or the table has no rows yet; otherwise they are left for the backfill,
+    and the API keeps reading the table itself until then. Call in the load's
+    transaction, after ensure_month_partitions() and before inserting.
+    
+    Args:
+        cursor: Cursor in the transaction that will insert the rows
+        table_name: Name of the data table
+    
+    Returns:
+        {'dimensions': bool, 'rollups': bool} for record_rows()
+    """
+    cursor.execute(f'LOCK TABLE {table_name} IN ROW EXCLUSIVE MODE;')
+    tracking = {}
+    for name, bookkeeping_table, unseen in (
+            ('dimensions', DIMENSIONS_TABLE, ''),
+            ('rollups', ROLLUP_TABLE, ' WHERE audit_datetime IS NOT NULL')):
+        cursor.execute(f"""
+            SELECT EXISTS (SELECT 1 FROM {bookkeeping_table} WHERE table_name = %s)
+                OR NOT EXISTS (SELECT 1 FROM {table_name}{unseen});
+        """, (table_name,))
+        tracking[name] = cursor.fetchone()[0]
+    return tracking
+
+
+def record_rows(cursor, table_name: str, df: pd.DataFrame, tracking: Dict[str, bool]):
+    """
+    Add the rows in df to the dimension catalog and rollups that begin_load()
+    chose to keep up, in the caller's transaction.
+    
+    Args:
+        cursor: Cursor in the transaction that inserted the rows
+        table_name: Name of the data table
+        df: DataFrame of the rows being loaded
+        tracking: Result of begin_load() in the same transaction
+    """
+    if tracking['dimensions']:
+        record_dimensions(cursor, table_name, df)
+    if tracking['rollups']:
+        record_rollups(cursor, table_name, df)
+
+
+def backfill_dimensions(conn, table_name: str) -> bool:
+    """
+    Seed the dimension catalog from the rows already in table_name, unless it has
+    entries for the table. Loads wait until it commits.
+    
+    Args:
+        conn: PostgreSQL connection
+        table_name: Name of the data table
+    
+    Returns:
+        True when the catalog was seeded
+    """
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute(f'LOCK TABLE {table_name} IN SHARE MODE;')
+        cursor.execute(f'SELECT EXISTS (SELECT 1 FROM {DIMENSIONS_TABLE} WHERE table_name = %s);', (table_name,))
+        if cursor.fetchone()[0]:
+            conn.commit()
+            return False
+        for column in DIMENSION_COLUMNS:
+            cursor.execute(f"""
+                INSERT INTO {DIMENSIONS_TABLE} (table_name, dimension, value)
+                SELECT DISTINCT %s, %s, CAST("{column}" AS TEXT) FROM {table_name}
+                WHERE NULLIF(CAST("{column}" AS TEXT), '') IS NOT NULL
+                ON CONFLICT DO NOTHING;
+            """, (table_name, column))
+        conn.commit()
+        logger.info(f"Backfilled the dimension catalog for {table_name}")
+        return True
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Error backfilling dimensions: {e}")
+        raise
+    finally:
+        cursor.close()
+
+
+def backfill_rollups(conn, table_name: str) -> bool:
+    """
+    Roll up the rows already in table_name, unless the rollup table has rows for
+    it. Loads wait until it commits.
+    
+    Args:
+        conn: PostgreSQL connection
+        table_name: Name of the data table
+    
+    Returns:
+        True when the rollups were backfilled
+    """
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute(f'LOCK TABLE {table_name} IN SHARE MODE;')
+        cursor.execute(f'SELECT EXISTS (SELECT 1 FROM {ROLLUP_TABLE} WHERE table_name = %s);', (table_name,))
+        if cursor.fetchone()[0]:
+            conn.commit()
+            return False
+        dimensions = ', '.join(f"COALESCE(CAST({d} AS TEXT), '')" for d in ROLLUP_DIMENSIONS)
+        for grain in ROLLUP_GRAINS:
+            cursor.execute(f"""
+                INSERT INTO {ROLLUP_TABLE}
+                SELECT %s, %s, date_trunc(%s, CAST(audit_datetime AS TIMESTAMP)), {dimensions},
+                       COUNT(*), COALESCE(SUM(CAST(audio_duration AS DOUBLE PRECISION)), 0)
+                FROM {table_name}
+                WHERE audit_datetime IS NOT NULL
+                GROUP BY 3, 4, 5, 6, 7;
+            """, (table_name, grain, grain))
+        conn.commit()
+        logger.info(f"Backfilled rollups for {table_name}")
+        return True
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Error backfilling rollups: {e}")
+        raise
+    finally:
+        cursor.close()
+
+
+def main():
+    """
+    One-off backfill of the dimension catalog and rollups for a table that already
+    had rows when they were introduced. Connects with the DB_* environment variables.
+    """
+    parser = argparse.ArgumentParser(description="Backfill the dimension catalog and rollups of a data table")
+    parser.add_argument("--table", default=os.environ.get('TABLE_NAME', 'audittrail_firehose'),
+                        help="data table to backfill (default: TABLE_NAME or audittrail_firehose)")
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    conn = psycopg2.connect(
+        host=os.environ.get('DB_HOST', 'localhost'),
+        database=os.environ.get('DB_NAME', 'postgres'),
+        port=int(os.environ.get('DB_PORT', '5432')),
+        user=os.environ.get('DB_USER', 'postgres'),
+        password=os.environ.get('DB_PASSWORD', '')
+    )
+    try:
+        ensure_dimensions_table(conn, args.table)
+        ensure_rollup_table(conn, args.table)
+        if not backfill_dimensions(conn, args.table):
+            logger.info(f"Dimension catalog already covers {args.table}")
+        if not backfill_rollups(conn, args.table):
+            logger.info(f"Rollups already cover {args.table}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()